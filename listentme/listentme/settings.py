@@ -42,6 +42,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'jquery',
 ]
 
@@ -53,6 +54,10 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'playlistapp.middleware.MemoryMiddleware',
+    'playlistapp.middleware.AdmissionControlMiddleware',
+    'playlistapp.middleware.SpotifyDeadlineMiddleware',
+    'playlistapp.middleware.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'listentme.urls'
@@ -90,6 +95,37 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.0/topics/cache/
+# Redis and database caches are shared by all uWSGI workers
+
+CACHES = {
+    # Catalog responses, profiles and playlists of users, in Redis evicting the least
+    # recently used entries when it reaches its maxmemory (see docker-compose files)
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.redis.RedisCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'redis://redis:6379/0'),
+    },
+    # Locks, admission slots, idempotency keys and counters coordinating workers, in a table
+    # of their own, so they are never culled to make room for cached responses
+    'coordination': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': os.environ.get('COORDINATION_CACHE_LOCATION', 'listentme_coordination'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 10 ** 9,
+        },
+    },
+    # Memory of the worker process, for data which doesn't have to be shared between workers
+    'local': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'listentme_local',
+    },
+}
+
+# Seconds for which pages rendered for visitors without a session are cached
+ANONYMOUS_PAGE_CACHE_TIMEOUT = int(os.environ.get('ANONYMOUS_PAGE_CACHE_TIMEOUT', 60))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
 
@@ -130,7 +166,166 @@ MEDIA_URL = '/static/media/'
 MEDIA_ROOT = '/vol/web/media'
 STATIC_ROOT = '/vol/web/static'
 
+# collectstatic adds content hash to names of static files and writes their gzip
+# and brotli compressed copies, served by the proxy with long-lived cache headers
+STATICFILES_STORAGE = 'playlistapp.storage.CompressedManifestStaticFilesStorage'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.0/ref/settings/#default-auto-field
 
-DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
\ No newline at end of file
+DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Spotify API
+
+# Seconds after which a single Spotify API request times out
+SPOTIFY_REQUEST_TIMEOUT = float(os.environ.get('SPOTIFY_REQUEST_TIMEOUT', 5))
+
+# Seconds all Spotify API requests made while handling one request may take together
+SPOTIFY_REQUEST_BUDGET = float(os.environ.get('SPOTIFY_REQUEST_BUDGET', 10))
+
+# Budgets of views and tasks making more Spotify API requests than usual
+SPOTIFY_CREATE_BUDGET = float(os.environ.get('SPOTIFY_CREATE_BUDGET', 25))
+SPOTIFY_BATCH_BUDGET = float(os.environ.get('SPOTIFY_BATCH_BUDGET', 120))
+SPOTIFY_BACKGROUND_BUDGET = float(os.environ.get('SPOTIFY_BACKGROUND_BUDGET', 30))
+
+# Seconds before expiration when the app-wide Client Credentials token is renewed
+SPOTIFY_APP_TOKEN_EXPIRY_MARGIN = 60
+
+# Seconds for which catalog responses (search, artists' top tracks) are cached
+SPOTIFY_CATALOG_CACHE_TIMEOUT = int(os.environ.get('SPOTIFY_CATALOG_CACHE_TIMEOUT', 60 * 60 * 24))
+
+# Identical catalog requests in flight are coalesced within a worker; when set, also across
+# workers, which then wait for the one making the request to put its response in the cache
+SPOTIFY_COALESCE_ACROSS_WORKERS = bool(int(os.environ.get('SPOTIFY_COALESCE_ACROSS_WORKERS', 0)))
+
+# Seconds for which tracks of a playlist snapshot are cached, snapshots never change
+SPOTIFY_PLAYLIST_TRACKS_CACHE_TIMEOUT = int(os.environ.get('SPOTIFY_PLAYLIST_TRACKS_CACHE_TIMEOUT', 60 * 60 * 24))
+
+# Artists are resolved from the local catalog before searching Spotify, by names searched before
+SPOTIFY_ARTIST_CATALOG = bool(int(os.environ.get('SPOTIFY_ARTIST_CATALOG', 1)))
+
+# Lookups of artists and catalog hits and misses are counted in memory of the worker
+# and written after this many lookups or this many seconds, whichever comes first
+SPOTIFY_ARTIST_LOOKUPS_FLUSH_SIZE = 100
+SPOTIFY_ARTIST_LOOKUPS_FLUSH_INTERVAL = 60
+
+# Bounds of the walk through related artists adding artists to short playlists
+SPOTIFY_EXPANSION_MAX_DEPTH = 2
+SPOTIFY_EXPANSION_RELATED_PER_ARTIST = 5
+SPOTIFY_EXPANSION_MAX_REQUESTS = int(os.environ.get('SPOTIFY_EXPANSION_MAX_REQUESTS', 20))
+
+# Seconds after which names and images of stored artists are loaded from Spotify again
+SPOTIFY_ARTIST_REFRESH_AGE = int(os.environ.get('SPOTIFY_ARTIST_REFRESH_AGE', 60 * 60 * 24 * 7))
+
+# Number of the most looked up artists kept in the in-memory autocomplete index
+# and seconds after which the index is rebuilt from the catalog
+SPOTIFY_AUTOCOMPLETE_INDEX_SIZE = int(os.environ.get('SPOTIFY_AUTOCOMPLETE_INDEX_SIZE', 50000))
+SPOTIFY_AUTOCOMPLETE_REBUILD_INTERVAL = 60 * 5
+
+# Seconds for which profile of the user logged in with Spotify is cached for the session
+SPOTIFY_PROFILE_CACHE_TIMEOUT = int(os.environ.get('SPOTIFY_PROFILE_CACHE_TIMEOUT', 60 * 30))
+
+# Seconds for which playlists of the user are cached
+SPOTIFY_PLAYLISTS_CACHE_TIMEOUT = int(os.environ.get('SPOTIFY_PLAYLISTS_CACHE_TIMEOUT', 60))
+
+# Seconds for which expired profile and playlists are still served when Spotify is slow or down
+SPOTIFY_STALE_TIMEOUT = int(os.environ.get('SPOTIFY_STALE_TIMEOUT', 60 * 60 * 24))
+
+# Seconds after which stale data is served instead of waiting for Spotify
+SPOTIFY_STALE_LATENCY_THRESHOLD = float(os.environ.get('SPOTIFY_STALE_LATENCY_THRESHOLD', 1))
+
+# Seconds for which home page data prefetched after logging in is kept
+SPOTIFY_HOME_PREFETCH_TIMEOUT = 60
+
+# Seconds the home page waits for prefetch still running in the same worker
+SPOTIFY_HOME_PREFETCH_WAIT = 5
+
+# Seconds for which browsers may reuse responses of the JSON API
+SPOTIFY_API_CACHE_MAX_AGE = 60
+
+# Seconds after which latency of the last Spotify API requests is no longer considered recent
+SPOTIFY_LATENCY_WINDOW = 30
+
+
+# Decoder of Spotify API responses: 'json' or 'orjson' (faster, used when the orjson package is installed)
+SPOTIFY_JSON_DECODER = os.environ.get('SPOTIFY_JSON_DECODER', 'json')
+
+# Record Spotify API interactions to the cassette (fixture file) or replay them from it
+# without network: 'off', 'record' or 'replay'. Replayed responses are delayed
+# by their recorded latencies multiplied by SPOTIFY_REPLAY_LATENCY_SCALE
+SPOTIFY_REPLAY_MODE = os.environ.get('SPOTIFY_REPLAY_MODE', 'off')
+SPOTIFY_REPLAY_CASSETTE = os.environ.get('SPOTIFY_REPLAY_CASSETTE', BASE_DIR / 'spotify_cassette.json')
+SPOTIFY_REPLAY_LATENCY_SCALE = float(os.environ.get('SPOTIFY_REPLAY_LATENCY_SCALE', 1))
+
+# Seconds for which outcomes of playlist creation are kept to answer repeated submits
+IDEMPOTENCY_TIMEOUT = int(os.environ.get('IDEMPOTENCY_TIMEOUT', 60 * 10))
+
+# Admission control
+
+# Limits of expensive requests by URL name of playlistapp/urls.py:
+# methods - limited HTTP methods, max_in_flight - requests processed at once by all workers,
+# queue_timeout - seconds a request waits for a free slot, max_spotify_latency - average
+# latency of recent Spotify API requests above which requests are shed right away
+ADMISSION_CONTROL_LIMITS = {
+    'create': {
+        'methods': ('POST',),
+        'max_in_flight': int(os.environ.get('ADMISSION_CREATE_MAX_IN_FLIGHT', 2)),
+        'queue_timeout': 2,
+        'max_spotify_latency': 3,
+    },
+    'api_playlist_refresh': {
+        'methods': ('POST',),
+        'max_in_flight': int(os.environ.get('ADMISSION_REFRESH_MAX_IN_FLIGHT', 2)),
+        'queue_timeout': 2,
+        'max_spotify_latency': 3,
+    },
+    'api_playlists_batch': {
+        'methods': ('POST',),
+        'max_in_flight': int(os.environ.get('ADMISSION_BATCH_MAX_IN_FLIGHT', 1)),
+        'queue_timeout': 0,
+        'max_spotify_latency': 2,
+        'retry_after': 60,
+    },
+}
+
+# Seconds after which slot of a request that never released it is freed
+ADMISSION_CONTROL_SLOT_TIMEOUT = 150
+
+# Default seconds sent in Retry-After header of shed requests
+ADMISSION_CONTROL_RETRY_AFTER = 10
+
+
+# Profiling
+
+# Requests sent with X-Profile-Token header equal to PROFILING_TOKEN are profiled,
+# as well as PROFILING_SAMPLE_RATE (0-1) fraction of all requests. Profiling middleware
+# is not loaded when the token is empty and the rate is 0
+PROFILING_TOKEN = os.environ.get('PROFILING_TOKEN', '')
+PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', 0))
+
+# 'pstats' (cProfile) or 'collapsed' (stacks for flamegraphs sampled every PROFILING_SAMPLE_INTERVAL seconds)
+PROFILING_FORMAT = os.environ.get('PROFILING_FORMAT', 'pstats')
+PROFILING_SAMPLE_INTERVAL = 0.005
+
+# Directory of profiles, only PROFILING_MAX_FILES newest ones are kept
+PROFILING_DIR = os.environ.get('PROFILING_DIR', BASE_DIR / 'profiles')
+PROFILING_MAX_FILES = int(os.environ.get('PROFILING_MAX_FILES', 50))
+
+
+# Memory
+
+# Every MEMORY_CHECK_INTERVAL requests a worker measures its RSS and publishes it
+# to the memory report (0 turns it off). The first measurement is the worker's baseline
+MEMORY_CHECK_INTERVAL = int(os.environ.get('MEMORY_CHECK_INTERVAL', 100))
+MEMORY_REPORT_TIMEOUT = 60 * 60
+
+# Frames of allocation tracebacks kept by tracemalloc, 0 doesn't trace allocations.
+# Tracing makes workers slower and bigger, enable it while looking for a leak
+MEMORY_TRACEMALLOC_FRAMES = int(os.environ.get('MEMORY_TRACEMALLOC_FRAMES', 0))
+MEMORY_TOP_ALLOCATORS = 10
+
+# MB of growth above the baseline logged as warning, and after which uWSGI worker
+# is replaced with a new one once it finishes its requests (0 never recycles)
+MEMORY_GROWTH_ALARM = int(os.environ.get('MEMORY_GROWTH_ALARM', 100))
+MEMORY_RECYCLE_GROWTH = int(os.environ.get('MEMORY_RECYCLE_GROWTH', 0))
@@ -0,0 +1,38 @@
+"""Fast path for visitors without a session, who can't be logged in with Spotify"""
+from functools import wraps
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+
+ANONYMOUS_PAGE_CACHE_KEY = 'anonymous_page:{path}'
+
+
+def is_anonymous(request):
+    """Check if request comes from a visitor without a session,
+    without loading the session or Spotify tokens from the database
+    """
+    return settings.SESSION_COOKIE_NAME not in request.COOKIES
+
+def anonymous_page_cache(view_func):
+    """Serve GET requests of anonymous visitors with a page rendered once and kept
+    in memory of the worker for ANONYMOUS_PAGE_CACHE_TIMEOUT seconds.
+    X-Accel-Expires lets nginx microcache the page too, without browsers caching it
+    """
+    @wraps(view_func)
+    def wrapped_view(request, *args, **kwargs):
+        if request.method != 'GET' or not is_anonymous(request):
+            return view_func(request, *args, **kwargs)
+
+        page_cache = caches['local']
+        cache_key = ANONYMOUS_PAGE_CACHE_KEY.format(path=request.path)
+        content = page_cache.get(cache_key)
+        if content is None:
+            response = view_func(request, *args, **kwargs)
+            if response.status_code != 200 or response.cookies:
+                return response
+            page_cache.set(cache_key, response.content, timeout=settings.ANONYMOUS_PAGE_CACHE_TIMEOUT)
+        else:
+            response = HttpResponse(content)
+        response['X-Accel-Expires'] = str(settings.ANONYMOUS_PAGE_CACHE_TIMEOUT)
+        return response
+    return wrapped_view
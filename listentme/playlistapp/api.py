@@ -0,0 +1,206 @@
+"""JSON API of playlistapp for pages loading data asynchronously and for automation"""
+import hashlib
+import json
+from django.conf import settings
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from rest_framework import status
+from rest_framework.authentication import BaseAuthentication, CSRFCheck, SessionAuthentication
+from rest_framework.exceptions import PermissionDenied
+from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from .idempotency import make_idempotency_key, run_once
+from .memory import get_workers_memory
+from .serializers import PlaylistRefreshSerializer, PlaylistsBatchSerializer
+from .spotifyService.autocomplete import complete_artist
+from .spotifyService.deadline import spotify_budget
+from .spotifyService.util import (
+    is_spotify_authenticated,
+    get_current_user,
+    get_current_users_playlists_page,
+    create_playlists_batch,
+    refresh_playlist,
+    SpotifyAPIError
+)
+
+
+class SpotifySession:
+    """User of the API identified by session authenticated with Spotify"""
+    is_authenticated = True
+
+    def __init__(self, session_key):
+        self.session_key = session_key
+
+class SpotifySessionAuthentication(BaseAuthentication):
+    """Authenticate requests of sessions logged in with Spotify
+    Session key is taken from the session cookie (browser, CSRF protected)
+    or from `Authorization: Session <session key>` header (automation)
+    """
+    keyword = 'Session'
+
+    def authenticate(self, request):
+        session_key = self.get_header_session_key(request)
+        from_cookie = session_key is None
+        if from_cookie:
+            session_key = request._request.session.session_key
+        if not session_key or not is_spotify_authenticated(session_key):
+            return None
+        if from_cookie:
+            self.enforce_csrf(request)
+        return SpotifySession(session_key), session_key
+
+    def authenticate_header(self, request):
+        return self.keyword
+
+    def get_header_session_key(self, request):
+        """Return session key sent in Authorization header or None"""
+        keyword, _, session_key = request.META.get('HTTP_AUTHORIZATION', '').partition(' ')
+        if keyword != self.keyword or not session_key:
+            return None
+        return session_key.strip()
+
+    def enforce_csrf(self, request):
+        """Enforce CSRF validation for cookie based authentication"""
+        def dummy_get_response(request):
+            return None
+
+        check = CSRFCheck(dummy_get_response)
+        check.process_request(request)
+        reason = check.process_view(request, None, (), {})
+        if reason:
+            raise PermissionDenied(f'CSRF Failed: {reason}')
+
+class SpotifyLimitOffsetPagination(LimitOffsetPagination):
+    """Limit-offset pagination of lists paginated by Spotify API itself"""
+    default_limit = 20
+    max_limit = 50
+
+    def paginate_spotify_page(self, fetch_page, request):
+        """Load requested page with fetch_page(limit, offset) returning items and total"""
+        self.request = request
+        self.limit = self.get_limit(request)
+        self.offset = self.get_offset(request)
+        page = fetch_page(self.limit, self.offset)
+        if page is None:
+            return None
+        self.count = page['total']
+        return page['items']
+
+
+def cached_response(request, data, status_code=status.HTTP_200_OK):
+    """Return response allowed to be cached privately by the browser,
+    with ETag letting it revalidate the data without transferring it again
+    """
+    etag = '"{}"'.format(hashlib.md5(
+        json.dumps(data, sort_keys=True, default=str).encode('utf-8')
+    ).hexdigest())
+    if etag in request.META.get('HTTP_IF_NONE_MATCH', ''):
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        response = Response(data, status=status_code)
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, max_age=settings.SPOTIFY_API_CACHE_MAX_AGE)
+    patch_vary_headers(response, ['Cookie', 'Authorization'])
+    return response
+
+
+class ArtistAutocompleteView(APIView):
+    """Suggestions of artists for names being typed, from the in-memory index only"""
+    authentication_classes = []
+    permission_classes = [AllowAny]
+    max_limit = 20
+
+    def get(self, request, format=None):
+        """Return artists whose name starts with `q`"""
+        try:
+            limit = min(int(request.query_params.get('limit', 10)), self.max_limit)
+        except ValueError:
+            limit = 10
+        response = Response({'results': complete_artist(request.query_params.get('q', ''), limit=limit)})
+        patch_cache_control(response, public=True, max_age=settings.SPOTIFY_API_CACHE_MAX_AGE)
+        return response
+
+class CurrentUserView(APIView):
+    """Profile of the user logged in with Spotify"""
+    authentication_classes = [SpotifySessionAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, format=None):
+        """Return profile of the current user"""
+        current_user = get_current_user(request.auth)
+        if current_user is None:
+            return Response({'detail': 'Spotify profile unavailable.'}, status=status.HTTP_502_BAD_GATEWAY)
+        return cached_response(request, current_user)
+
+class UsersPlaylistsView(APIView):
+    """Paginated playlists of the user logged in with Spotify"""
+    authentication_classes = [SpotifySessionAuthentication]
+    permission_classes = [IsAuthenticated]
+    pagination_class = SpotifyLimitOffsetPagination
+
+    def get(self, request, format=None):
+        """Return requested page of current user's playlists"""
+        paginator = self.pagination_class()
+        users_playlists = paginator.paginate_spotify_page(
+            lambda limit, offset: get_current_users_playlists_page(request.auth, limit=limit, offset=offset),
+            request
+        )
+        if users_playlists is None:
+            return Response({'detail': 'Spotify playlists unavailable.'}, status=status.HTTP_502_BAD_GATEWAY)
+        return cached_response(request, paginator.get_paginated_response(users_playlists).data)
+
+class PlaylistsBatchView(APIView):
+    """Creating many playlists with one request, e.g. by automation
+    Repeated request (the same Idempotency-Key header or the same payload) returns results
+    of the first one instead of creating the playlists again
+    """
+    authentication_classes = [SpotifySessionAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    @spotify_budget(settings.SPOTIFY_BATCH_BUDGET)
+    def post(self, request, format=None):
+        """Create every playlist of the batch and return result of each one"""
+        serializer = PlaylistsBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        idempotency_key = make_idempotency_key(
+            request.auth,
+            request.META.get('HTTP_IDEMPOTENCY_KEY'),
+            serializer.validated_data
+        )
+        results = run_once(
+            idempotency_key,
+            lambda: create_playlists_batch(request.auth, serializer.validated_data['playlists']),
+            lock_timeout=settings.SPOTIFY_BATCH_BUDGET
+        )
+        return Response({'results': results})
+
+class PlaylistRefreshView(APIView):
+    """Updating existing playlist with current top tracks of artists"""
+    authentication_classes = [SpotifySessionAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    @spotify_budget(settings.SPOTIFY_CREATE_BUDGET)
+    def post(self, request, playlist_id, format=None):
+        """Refresh the playlist and return numbers of added and removed tracks"""
+        serializer = PlaylistRefreshSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            result = refresh_playlist(request.auth, playlist_id, serializer.validated_data['artists'])
+        except SpotifyAPIError as error:
+            return Response({'detail': str(error)}, status=status.HTTP_502_BAD_GATEWAY)
+        result.pop('timings')
+        return Response(result)
+
+class MemoryReportView(APIView):
+    """Memory footprint of application workers, for staff logged in to the admin"""
+    authentication_classes = [SessionAuthentication]
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, format=None):
+        """Return the latest memory reports of workers, the biggest first"""
+        workers = sorted(get_workers_memory().values(), key=lambda report: report['rss'], reverse=True)
+        return Response({
+            'workers': workers,
+            'total_rss': sum(report['rss'] for report in workers),
+        })
@@ -1,9 +1,16 @@
 """Forms for collecting user preferences"""
+import uuid
 from django import forms
 
 class NewPlaylistDataForm(forms.Form):
     """New Playlist preferences"""
     img = forms.ImageField(label='Img', required=False)
+    idempotency_key = forms.CharField(
+        max_length=64,
+        required=False,
+        initial=lambda: uuid.uuid4().hex,
+        widget=forms.HiddenInput
+    )
     name = forms.CharField(
         label='Name',
         max_length=30,
@@ -17,6 +24,19 @@ class NewPlaylistDataForm(forms.Form):
         widget=forms.Textarea(attrs={'rows': 5, 'placeholder': 'Desciprion','autocomplete': 'off'})
     )
     public = forms.BooleanField(required=False)
+    expand_to_tracks = forms.IntegerField(
+        label='Grow to',
+        required=False,
+        min_value=10,
+        max_value=100,
+        help_text='Add related artists until the playlist has this many tracks',
+        widget=forms.NumberInput(attrs={'placeholder': 'Grow to ... tracks (related artists)'})
+    )
+    order_tracks = forms.BooleanField(
+        label='Smooth order',
+        required=False,
+        help_text='Interleave artists and order tracks by tempo and energy'
+    )
 
 class ArtistForm(forms.Form):
     """Artist information"""
@@ -24,5 +44,5 @@ class ArtistForm(forms.Form):
         label='',
         max_length=30,
         required=True,
-        widget=forms.TextInput(attrs={'autocomplete': 'off'})
+        widget=forms.TextInput(attrs={'autocomplete': 'off', 'list': 'artist-suggestions'})
     )
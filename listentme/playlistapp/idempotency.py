@@ -0,0 +1,39 @@
+"""Idempotency of operations repeated by double-submits and retries"""
+import hashlib
+import json
+from django.conf import settings
+from django.core.cache import caches
+from .spotifyService.coalesce import coalesce_across_workers
+
+IDEMPOTENCY_CACHE_KEY = 'idempotency:{key}'
+
+
+def make_idempotency_key(session_id, client_key=None, payload=None):
+    """Return key identifying the operation of the session by the payload and the key sent
+    by the client, so a key reused for a different payload (e.g. a form resubmitted after
+    going back and editing it) starts a new operation instead of returning the old result
+    """
+    if client_key:
+        source = ['key', session_id, client_key, payload]
+    else:
+        source = ['payload', session_id, payload]
+    return hashlib.sha256(json.dumps(source, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+def run_once(key, func, lock_timeout):
+    """Call func() once for the key within IDEMPOTENCY_TIMEOUT seconds and return its result,
+    repeated calls get the stored result, waiting for the first call while it is still running
+    (at most lock_timeout seconds). Failed calls raising an exception are not remembered
+    Outcomes are kept in the coordination cache, so they are not culled before they expire
+    """
+    cache = caches['coordination']
+    cache_key = IDEMPOTENCY_CACHE_KEY.format(key=key)
+    outcome = cache.get(cache_key)
+    if outcome is not None:
+        return outcome['result']
+
+    def call():
+        outcome = {'result': func()}
+        cache.set(cache_key, outcome, timeout=settings.IDEMPOTENCY_TIMEOUT)
+        return outcome
+
+    return coalesce_across_workers(cache_key, call, lock_timeout=lock_timeout, cache_alias='coordination')['result']
@@ -0,0 +1,22 @@
+"""
+Django command to report how many artists were resolved from the local catalog
+"""
+from django.core.management.base import BaseCommand
+
+from playlistapp.spotifyService.catalog import get_artist_catalog_stats, reset_artist_catalog_stats
+
+class Command(BaseCommand):
+    """Django command to report artist catalog hit rate"""
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Start counting hits and misses again')
+
+    def handle(self, *args, **options):
+        """Entrypoint for command"""
+        stats = get_artist_catalog_stats()
+        hit_rate = 'n/a' if stats['hit_rate'] is None else f'{stats["hit_rate"]:.1%}'
+        self.stdout.write(f'Artists in catalog: {stats["artists"]}')
+        self.stdout.write(f'Hits: {stats["hits"]}, misses: {stats["misses"]}, hit rate: {hit_rate}')
+        if options['reset']:
+            reset_artist_catalog_stats()
+            self.stdout.write(self.style.SUCCESS('Counters reset'))
@@ -0,0 +1,111 @@
+"""
+Django command to resolve popular artists and cache their top tracks before users ask for them
+"""
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from playlistapp.spotifyService.models import Artist
+from playlistapp.spotifyService.pipeline import run_concurrently
+from playlistapp.spotifyService.util import (
+    search_artist,
+    get_artist_top_tracks_uris,
+    refresh_stale_artists,
+    get_rate_limit_wait
+)
+
+class RateLimiter:
+    """Spread calls of all threads to at most `rate` per second
+    and stop them while Spotify rate limits the app
+    """
+
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate else 0
+        self.lock = threading.Lock()
+        self.next_call = time.monotonic()
+
+    def wait(self):
+        """Block until the next call is allowed"""
+        with self.lock:
+            now = time.monotonic()
+            call_at = max(self.next_call, now)
+            self.next_call = call_at + self.interval
+        time.sleep(max(call_at - now, 0))
+        rate_limit_wait = get_rate_limit_wait()
+        while rate_limit_wait:
+            time.sleep(rate_limit_wait)
+            rate_limit_wait = get_rate_limit_wait()
+
+class Command(BaseCommand):
+    """Django command to warm caches of popular artists"""
+    help = 'Resolve popular artists and cache their top tracks, e.g. after deploy or cache flush'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--file',
+            help='File with names of artists to warm, one per line'
+        )
+        parser.add_argument(
+            '--top', type=int, default=200,
+            help='Number of the most looked up artists of the catalog to warm (default: 200)'
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=4,
+            help='Number of requests sent at once (default: 4)'
+        )
+        parser.add_argument(
+            '--rate', type=float, default=5,
+            help='Maximum number of requests per second, 0 for no limit (default: 5)'
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint for command"""
+        limiter = RateLimiter(options['rate'])
+        concurrency = max(options['concurrency'], 1)
+
+        def limited(func):
+            def call(*args):
+                limiter.wait()
+                return func(*args)
+            return call
+
+        names = []
+        if options['file']:
+            try:
+                with open(options['file'], encoding='utf-8') as artists_file:
+                    names = [line.strip() for line in artists_file if line.strip()]
+            except OSError as error:
+                raise CommandError(f'Cannot read {options["file"]}: {error}') from error
+
+        self.stdout.write(f'Resolving {len(names)} artists...')
+        # Warming is not a lookup of users, it must not change popularity of artists or catalog stats
+        resolved = run_concurrently(
+            limited(lambda name: search_artist(None, name, record=False)),
+            names,
+            concurrency
+        )
+        artists_ids = [artist['id'] for artist in resolved if artist]
+        for name, artist in zip(names, resolved):
+            if artist is None:
+                self.stdout.write(self.style.WARNING(f'Artist not found: {name}'))
+
+        if options['top'] > 0:
+            artists_ids.extend(
+                Artist.objects.order_by('-lookups').values_list('spotify_id', flat=True)[:options['top']]
+            )
+        artists_ids = list(dict.fromkeys(artists_ids))
+
+        self.stdout.write(f'Caching top tracks of {len(artists_ids)} artists...')
+        top_tracks = run_concurrently(
+            limited(lambda artist_id: get_artist_top_tracks_uris(None, artist_id)),
+            artists_ids,
+            concurrency
+        )
+        self.stdout.write('Refreshing stale artists...')
+        refreshed = refresh_stale_artists(artists_ids)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Warmed {len(artists_ids)} artists, {sum(map(len, top_tracks))} top tracks, '
+            f'refreshed {len(refreshed)} artists'
+        ))
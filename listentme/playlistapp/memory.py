@@ -0,0 +1,164 @@
+"""Memory footprint of worker processes
+
+Every worker measures its RSS every MEMORY_CHECK_INTERVAL requests and publishes
+a report in the coordination cache, so footprints of all workers can be compared
+(see api.MemoryReportView). The first measurement is the baseline of the worker,
+growth above it raises an alarm in logs and may recycle the worker.
+With MEMORY_TRACEMALLOC_FRAMES set, reports list the top allocation sites
+and the sites which grew the most since the baseline.
+"""
+import logging
+import os
+import resource
+import signal
+import sys
+import threading
+import time
+import tracemalloc
+from django.conf import settings
+from django.core.cache import caches
+
+try:
+    import uwsgi
+except ImportError:
+    uwsgi = None
+
+MEMORY_REPORT_CACHE_KEY = 'memory:worker:{pid}'
+MEMORY_WORKERS_CACHE_KEY = 'memory:workers'
+MB = 1024 * 1024
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_baseline = None
+_baseline_snapshot = None
+_recycling = False
+
+
+def get_rss():
+    """Return resident set size of this process in bytes"""
+    try:
+        with open('/proc/self/statm', encoding='ascii') as statm:
+            return int(statm.read().split()[1]) * resource.getpagesize()
+    except (OSError, IndexError, ValueError):
+        # Peak instead of current RSS where /proc is not available, kilobytes on Linux, bytes on macOS
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return max_rss if sys.platform == 'darwin' else max_rss * 1024
+
+def start_tracing():
+    """Start tracing allocations when MEMORY_TRACEMALLOC_FRAMES is set"""
+    if settings.MEMORY_TRACEMALLOC_FRAMES and not tracemalloc.is_tracing():
+        tracemalloc.start(settings.MEMORY_TRACEMALLOC_FRAMES)
+
+def get_allocation_sites(snapshot, baseline_snapshot=None):
+    """Return top MEMORY_TOP_ALLOCATORS allocation sites of the snapshot,
+    by size or by growth since baseline_snapshot
+    """
+    if baseline_snapshot is None:
+        statistics = snapshot.statistics('lineno')
+    else:
+        statistics = snapshot.compare_to(baseline_snapshot, 'lineno')
+    sites = []
+    for statistic in statistics[:settings.MEMORY_TOP_ALLOCATORS]:
+        frame = statistic.traceback[0]
+        site = {
+            'site': f'{frame.filename}:{frame.lineno}',
+            'size': statistic.size,
+            'count': statistic.count,
+        }
+        if baseline_snapshot is not None:
+            site['size_diff'] = statistic.size_diff
+            site['count_diff'] = statistic.count_diff
+        sites.append(site)
+    return sites
+
+def measure_memory(requests):
+    """Return memory report of this worker after it served requests"""
+    global _baseline, _baseline_snapshot
+    rss = get_rss()
+    snapshot = None
+    if tracemalloc.is_tracing():
+        snapshot = tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+    with _lock:
+        if _baseline is None:
+            _baseline = rss
+            _baseline_snapshot = snapshot
+        baseline, baseline_snapshot = _baseline, _baseline_snapshot
+
+    report = {
+        'pid': os.getpid(),
+        'worker_id': uwsgi.worker_id() if uwsgi else None,
+        'requests': requests,
+        'rss': rss,
+        'baseline_rss': baseline,
+        'growth': rss - baseline,
+        'measured_at': time.time(),
+    }
+    if snapshot is not None:
+        traced, peak = tracemalloc.get_traced_memory()
+        report['traced'] = traced
+        report['traced_peak'] = peak
+        report['top_allocators'] = get_allocation_sites(snapshot)
+        if baseline_snapshot is not None and baseline_snapshot is not snapshot:
+            report['top_growth'] = get_allocation_sites(snapshot, baseline_snapshot)
+    return report
+
+def publish_report(report):
+    """Store the report in the coordination cache, where reports of all workers are read from"""
+    cache = caches['coordination']
+    pid = report['pid']
+    cache.set(MEMORY_REPORT_CACHE_KEY.format(pid=pid), report, timeout=settings.MEMORY_REPORT_TIMEOUT)
+    workers = cache.get(MEMORY_WORKERS_CACHE_KEY, [])
+    if pid not in workers:
+        cache.set(MEMORY_WORKERS_CACHE_KEY, workers + [pid], timeout=None)
+
+def get_workers_memory():
+    """Return the latest memory reports of workers, by pid"""
+    cache = caches['coordination']
+    workers = cache.get(MEMORY_WORKERS_CACHE_KEY, [])
+    reports = cache.get_many([MEMORY_REPORT_CACHE_KEY.format(pid=pid) for pid in workers])
+    alive = sorted(report['pid'] for report in reports.values())
+    if alive != sorted(workers):
+        cache.set(MEMORY_WORKERS_CACHE_KEY, alive, timeout=None)
+    return {report['pid']: report for report in reports.values()}
+
+def check_memory(requests):
+    """Measure memory of this worker, publish the report and react to its growth
+    Returns the report
+    """
+    report = measure_memory(requests)
+    publish_report(report)
+
+    growth = report['growth'] / MB
+    if settings.MEMORY_GROWTH_ALARM and growth > settings.MEMORY_GROWTH_ALARM:
+        logger.warning(
+            'Worker %s grew by %.1f MB to %.1f MB RSS after %s requests, top growth: %s',
+            report['pid'], growth, report['rss'] / MB, requests,
+            report.get('top_growth', 'set MEMORY_TRACEMALLOC_FRAMES to trace allocations')
+        )
+    if settings.MEMORY_RECYCLE_GROWTH and growth > settings.MEMORY_RECYCLE_GROWTH:
+        recycle_worker(report)
+    return report
+
+def recycle_worker(report):
+    """Ask uWSGI to replace this worker once it finishes the requests in progress"""
+    global _recycling
+    with _lock:
+        if _recycling:
+            return
+        _recycling = uwsgi is not None
+    if uwsgi is None:
+        logger.warning('Worker %s should be recycled, but it is not running under uWSGI', report['pid'])
+        return
+    logger.warning('Recycling worker %s grown by %.1f MB', report['pid'], report['growth'] / MB)
+    caches['coordination'].delete(MEMORY_REPORT_CACHE_KEY.format(pid=report['pid']))
+    # uWSGI worker receiving SIGHUP exits gracefully and the master spawns a new one
+    os.kill(os.getpid(), signal.SIGHUP)
+
+def reset_memory():
+    """Forget the baseline of this worker"""
+    global _baseline, _baseline_snapshot, _recycling
+    with _lock:
+        _baseline = None
+        _baseline_snapshot = None
+        _recycling = False
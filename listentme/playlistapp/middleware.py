@@ -0,0 +1,164 @@
+"""Middleware of playlistapp"""
+import hmac
+import itertools
+import logging
+import random
+import time
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse, JsonResponse
+from .memory import check_memory, start_tracing
+from .profiling import make_profiler, save_profile
+from .spotifyService.deadline import deadline_budget
+from .spotifyService.latency import get_spotify_latency
+from .spotifyService.pipeline import profile_stages
+
+ADMISSION_SLOT_CACHE_KEY = 'admission:{url_name}:{number}'
+ADMISSION_QUEUE_POLL_INTERVAL = 0.1
+PROFILING_HEADER = 'HTTP_X_PROFILE_TOKEN'
+
+logger = logging.getLogger(__name__)
+
+
+class SpotifyDeadlineMiddleware:
+    """Give every request a deadline budget shared by all Spotify API calls it makes,
+    so a stalled connection to Spotify can't pin the worker
+    Views may use their own budget with spotifyService.deadline.spotify_budget
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with deadline_budget(settings.SPOTIFY_REQUEST_BUDGET):
+            return self.get_response(request)
+
+class AdmissionControlMiddleware:
+    """Shed or queue expensive requests when too many of them are in flight
+    or Spotify is slow, so cheap requests (pages, anonymous traffic) keep being served
+    Limits are configured per URL name in settings.ADMISSION_CONTROL_LIMITS.
+    In-flight requests take slots in the coordination cache, so limits apply to all workers
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            return self.get_response(request)
+        finally:
+            slot = getattr(request, 'admission_slot', None)
+            if slot is not None:
+                caches['coordination'].delete(slot)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        url_name = request.resolver_match.url_name
+        limits = settings.ADMISSION_CONTROL_LIMITS.get(url_name)
+        if limits is None or request.method not in limits.get('methods', ('POST',)):
+            return None
+
+        max_latency = limits.get('max_spotify_latency')
+        latency = get_spotify_latency()
+        if max_latency is not None and latency is not None and latency > max_latency:
+            return self.overloaded(request, limits, 'Spotify is responding slowly at the moment.')
+
+        slot = self.acquire_slot(url_name, limits)
+        if slot is None:
+            return self.overloaded(request, limits, 'Too many requests like this one are being processed.')
+        request.admission_slot = slot
+        return None
+
+    def acquire_slot(self, url_name, limits):
+        """Take one of max_in_flight slots, waiting for a free one at most queue_timeout seconds
+        Returns cache key of the slot or None if all of them stayed taken
+        """
+        slots = caches['coordination']
+        deadline = time.monotonic() + limits.get('queue_timeout', 0)
+        while True:
+            for number in range(limits['max_in_flight']):
+                slot = ADMISSION_SLOT_CACHE_KEY.format(url_name=url_name, number=number)
+                if slots.add(slot, True, timeout=settings.ADMISSION_CONTROL_SLOT_TIMEOUT):
+                    return slot
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(ADMISSION_QUEUE_POLL_INTERVAL)
+
+    def overloaded(self, request, limits, reason):
+        """Return 503 response telling the client when to try again"""
+        retry_after = limits.get('retry_after', settings.ADMISSION_CONTROL_RETRY_AFTER)
+        message = f'{reason} Please try again in {retry_after} seconds.'
+        if request.accepts('text/html'):
+            response = HttpResponse(message, status=503, content_type='text/plain; charset=utf-8')
+        else:
+            response = JsonResponse({'detail': message}, status=503)
+        response['Retry-After'] = str(retry_after)
+        return response
+
+class ProfilingMiddleware:
+    """Profile requests sent with X-Profile-Token header matching settings.PROFILING_TOKEN
+    and a PROFILING_SAMPLE_RATE fraction of the other ones, writing profiles
+    to PROFILING_DIR (see playlistapp.profiling)
+    Middleware is not loaded at all when both are off, so it costs nothing then
+    """
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_TOKEN and not settings.PROFILING_SAMPLE_RATE:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not self.should_profile(request):
+            return self.get_response(request)
+
+        profiler = make_profiler(settings.PROFILING_FORMAT)
+        profiler.enable()
+        try:
+            with profile_stages(profiler):
+                return self.get_response(request)
+        finally:
+            profiler.disable()
+            self.save(request, profiler)
+
+    def should_profile(self, request):
+        token = request.META.get(PROFILING_HEADER)
+        if token and settings.PROFILING_TOKEN:
+            return hmac.compare_digest(token.encode('utf-8'), settings.PROFILING_TOKEN.encode('utf-8'))
+        return random.random() < settings.PROFILING_SAMPLE_RATE
+
+    def save(self, request, profiler):
+        resolver_match = request.resolver_match
+        session = getattr(request, 'session', None)
+        try:
+            path = save_profile(
+                profiler,
+                resolver_match.view_name if resolver_match else None,
+                session.session_key if session is not None else None,
+                settings.PROFILING_FORMAT
+            )
+        except OSError:
+            logger.exception('Profile of %s could not be saved', request.path)
+            return
+        logger.info('Profile of %s saved to %s', request.path, path)
+
+class MemoryMiddleware:
+    """Check memory footprint of the worker every MEMORY_CHECK_INTERVAL requests
+    (see playlistapp.memory), not loaded when the interval is 0
+    """
+
+    def __init__(self, get_response):
+        if not settings.MEMORY_CHECK_INTERVAL:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.requests = itertools.count(1)
+        start_tracing()
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        requests = next(self.requests)
+        if requests % settings.MEMORY_CHECK_INTERVAL == 0:
+            try:
+                check_memory(requests)
+            except Exception:
+                logger.exception('Memory of the worker could not be checked')
+        return response
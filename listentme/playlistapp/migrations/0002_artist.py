@@ -0,0 +1,33 @@
+# Generated by Django 4.0.6 on 2026-10-19 01:39
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('playlistapp', '0001_initial'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.CreateModel(
+            name='Artist',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('spotify_id', models.CharField(max_length=50, unique=True)),
+                ('name', models.CharField(max_length=200)),
+                ('normalized_name', models.CharField(db_index=True, max_length=200)),
+                ('external_url', models.URLField(blank=True, default='', max_length=500)),
+                ('image_url', models.URLField(blank=True, default='', max_length=500)),
+                ('lookups', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='artist',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['normalized_name'], name='artist_name_trgm', opclasses=['gin_trgm_ops']),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.0.6 on 2026-10-19 01:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('playlistapp', '0002_artist'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='artist',
+            name='hydrated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.0.6 on 2026-10-19 02:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('playlistapp', '0003_artist_hydrated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArtistAlias',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('query', models.CharField(max_length=200, unique=True)),
+                ('artist', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='aliases', to='playlistapp.artist')),
+            ],
+        ),
+    ]
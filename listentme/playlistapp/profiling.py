@@ -0,0 +1,159 @@
+"""Profiles of single requests written to a bounded directory
+
+Profiles are written as pstats dumps of cProfile (open them with `python -m pstats`
+or snakeviz) or as collapsed stacks sampled from the request thread
+(render them with flamegraph.pl or speedscope).
+Threads running pipeline stages of the request are profiled too, see
+spotifyService.pipeline.profile_stages.
+"""
+import cProfile
+import hashlib
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from django.conf import settings
+
+PROFILE_EXTENSIONS = {
+    'pstats': 'prof',
+    'collapsed': 'collapsed',
+}
+
+
+class CallProfiler:
+    """cProfile of the thread which enabled it and of threads added by profile_thread,
+    merged into one pstats dump
+    """
+
+    def __init__(self):
+        self.profiles = [cProfile.Profile()]
+        self.lock = threading.Lock()
+
+    def enable(self):
+        self.profiles[0].enable()
+
+    def disable(self):
+        self.profiles[0].disable()
+
+    @contextmanager
+    def profile_thread(self):
+        """Profile calls of the current thread made inside"""
+        profile = cProfile.Profile()
+        with self.lock:
+            self.profiles.append(profile)
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+
+    def dump_stats(self, path):
+        with self.lock:
+            profiles = list(self.profiles)
+        stats = pstats.Stats(profiles[0])
+        for profile in profiles[1:]:
+            stats.add(profile)
+        stats.dump_stats(path)
+
+class StackSampler:
+    """Sample call stacks of the thread which created it and of threads added by profile_thread
+    every interval seconds and count how many times every stack was seen
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.thread_ids = {threading.get_ident()}
+        self.lock = threading.Lock()
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def enable(self):
+        self.thread.start()
+
+    def disable(self):
+        self.stopped.set()
+        self.thread.join()
+
+    @contextmanager
+    def profile_thread(self):
+        """Sample stacks of the current thread while inside"""
+        thread_id = threading.get_ident()
+        with self.lock:
+            self.thread_ids.add(thread_id)
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.thread_ids.discard(thread_id)
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frames = sys._current_frames()
+            with self.lock:
+                thread_ids = list(self.thread_ids)
+            for thread_id in thread_ids:
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    self.stacks[self.collapse(frame)] += 1
+
+    @staticmethod
+    def collapse(frame):
+        """Return stack of the frame as semicolon separated functions, outermost first"""
+        functions = []
+        while frame is not None:
+            code = frame.f_code
+            functions.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+            frame = frame.f_back
+        return ';'.join(reversed(functions))
+
+    def dump_stats(self, path):
+        """Write stacks in collapsed format, one 'stack count' line each"""
+        with open(path, 'w', encoding='utf-8') as profile_file:
+            for stack, count in self.stacks.most_common():
+                profile_file.write(f'{stack} {count}\n')
+
+def make_profiler(profile_format):
+    """Return a new profiler writing profiles of the format"""
+    if profile_format == 'collapsed':
+        return StackSampler(settings.PROFILING_SAMPLE_INTERVAL)
+    return CallProfiler()
+
+def get_profile_path(view_name, session_key, profile_format):
+    """Return path of a new profile tagged with the view name and the session
+    Session key is hashed, so profiles can't be used to hijack sessions
+    """
+    if session_key:
+        session_tag = hashlib.sha256(session_key.encode('utf-8')).hexdigest()[:12]
+    else:
+        session_tag = 'anonymous'
+    view_tag = ''.join(char if char.isalnum() or char in '-_' else '_' for char in view_name or 'unresolved')
+    filename = f'{time.time():.6f}-{view_tag}-{session_tag}.{PROFILE_EXTENSIONS[profile_format]}'
+    return os.path.join(settings.PROFILING_DIR, filename)
+
+def save_profile(profiler, view_name, session_key, profile_format):
+    """Write the profile and remove the oldest ones above PROFILING_MAX_FILES
+    Returns path of the written profile
+    """
+    os.makedirs(settings.PROFILING_DIR, exist_ok=True)
+    path = get_profile_path(view_name, session_key, profile_format)
+    profiler.dump_stats(path)
+    prune_profiles()
+    return path
+
+def prune_profiles():
+    """Keep only PROFILING_MAX_FILES newest profiles in PROFILING_DIR"""
+    profiles = []
+    for entry in os.scandir(settings.PROFILING_DIR):
+        if entry.is_file() and entry.name.rsplit('.', 1)[-1] in PROFILE_EXTENSIONS.values():
+            profiles.append(entry.path)
+    # Names start with the timestamp, so they sort from the oldest one
+    profiles.sort(key=os.path.basename)
+    for path in profiles[:max(len(profiles) - settings.PROFILING_MAX_FILES, 0)]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,34 @@
+"""Serializers validating data sent to the JSON API"""
+from rest_framework import serializers
+
+PLAYLISTS_BATCH_MAX_SIZE = 100
+PLAYLIST_MAX_ARTISTS = 10
+
+
+class PlaylistDataSerializer(serializers.Serializer):
+    """New Playlist preferences, the same as in NewPlaylistDataForm and ArtistFormSet"""
+    name = serializers.CharField(max_length=30)
+    description = serializers.CharField(max_length=200, required=False, allow_blank=True, default='')
+    public = serializers.BooleanField(required=False, default=False)
+    order_tracks = serializers.BooleanField(required=False, default=False)
+    artists = serializers.ListField(
+        child=serializers.CharField(max_length=30),
+        min_length=1,
+        max_length=PLAYLIST_MAX_ARTISTS
+    )
+
+class PlaylistRefreshSerializer(serializers.Serializer):
+    """Artists whose top tracks the refreshed playlist should contain"""
+    artists = serializers.ListField(
+        child=serializers.CharField(max_length=30),
+        min_length=1,
+        max_length=PLAYLIST_MAX_ARTISTS
+    )
+
+class PlaylistsBatchSerializer(serializers.Serializer):
+    """Batch of playlists created with one request"""
+    playlists = serializers.ListField(
+        child=PlaylistDataSerializer(),
+        min_length=1,
+        max_length=PLAYLISTS_BATCH_MAX_SIZE
+    )
@@ -0,0 +1,138 @@
+"""In-memory prefix index of artists for autocomplete, answering without Spotify or the database
+The index is a sorted array of normalized names searched with bisect. It is built in background
+from the most looked up artists of the local catalog on first use, rebuilt every
+SPOTIFY_AUTOCOMPLETE_REBUILD_INTERVAL seconds and extended with every artist resolved in between.
+Until the first build finishes, suggestions are queried from the catalog
+"""
+import bisect
+import threading
+import time
+from django.conf import settings
+from django.db.models import Q
+from . import background
+from .catalog import normalize_artist_name
+from .models import Artist
+
+AUTOCOMPLETE_MAX_CANDIDATES = 200
+
+_lock = threading.Lock()
+_keys = []
+_entries = []
+_artists = {}
+_built_at = None
+_rebuilding = False
+# Incremented by reset_index, so builds started before it don't bring the old index back
+_generation = 0
+
+
+def _index_keys(artist_data):
+    """Return keys the artist is found under: its name and every word of it onwards,
+    so 'Thom Yorke' is suggested for 'thom' as well as for 'yorke'
+    """
+    words = normalize_artist_name(artist_data['name']).split(' ')
+    return {' '.join(words[start:]) for start in range(len(words))}
+
+def _build_index(artists):
+    """Return sorted keys and entries of the artists"""
+    pairs = sorted(
+        (key, artist_data['id'])
+        for artist_data in artists.values()
+        for key in _index_keys(artist_data)
+    )
+    return [key for key, _ in pairs], [artist_id for _, artist_id in pairs]
+
+def rebuild_index(generation=None):
+    """Replace the index with the most looked up artists of the catalog
+    generation: value of _generation when the build was scheduled, the index is not replaced
+    when it was reset since then
+    """
+    global _keys, _entries, _artists, _built_at, _rebuilding
+    artists = {}
+    queryset = Artist.objects.order_by('-lookups')[:settings.SPOTIFY_AUTOCOMPLETE_INDEX_SIZE]
+    for artist in queryset:
+        artists[artist.spotify_id] = dict(artist.to_payload(), lookups=artist.lookups)
+    keys, entries = _build_index(artists)
+    with _lock:
+        if generation is not None and generation != _generation:
+            return
+        _keys, _entries, _artists = keys, entries, artists
+        _built_at = time.monotonic()
+        _rebuilding = False
+
+def _ensure_index():
+    """Schedule building of the index when it is missing or old, one build at a time
+    Returns True when the index is built
+    """
+    global _rebuilding
+    with _lock:
+        built = _built_at is not None
+        fresh = built and time.monotonic() - _built_at < settings.SPOTIFY_AUTOCOMPLETE_REBUILD_INTERVAL
+        if _rebuilding or fresh:
+            return built
+        _rebuilding = True
+        generation = _generation
+    background.submit(rebuild_index, generation).add_done_callback(_rebuild_done)
+    return built
+
+def _rebuild_done(future):
+    global _rebuilding
+    if future.exception() is not None:
+        with _lock:
+            _rebuilding = False
+
+def remember_artist(artist_data):
+    """Add resolved artist to the index until it is rebuilt"""
+    if _built_at is None:
+        return
+    with _lock:
+        if artist_data['id'] in _artists:
+            _artists[artist_data['id']]['lookups'] += 1
+            return
+        _artists[artist_data['id']] = dict(artist_data, lookups=1)
+        for key in _index_keys(artist_data):
+            position = bisect.bisect_left(_keys, key)
+            _keys.insert(position, key)
+            _entries.insert(position, artist_data['id'])
+
+def complete_artist(prefix, limit=10):
+    """Return up to limit artists whose name or one of its words starts with prefix,
+    the most looked up first
+    """
+    prefix = normalize_artist_name(prefix)
+    if not prefix:
+        return []
+    if not _ensure_index():
+        return _complete_from_catalog(prefix, limit)
+    with _lock:
+        found = {}
+        position = bisect.bisect_left(_keys, prefix)
+        while (position < len(_keys) and _keys[position].startswith(prefix)
+               and len(found) < AUTOCOMPLETE_MAX_CANDIDATES):
+            artist_id = _entries[position]
+            found[artist_id] = _artists[artist_id]
+            position += 1
+    suggestions = sorted(found.values(), key=lambda artist_data: -artist_data['lookups'])[:limit]
+    return [
+        {key: value for key, value in artist_data.items() if key != 'lookups'}
+        for artist_data in suggestions
+    ]
+
+def _complete_from_catalog(prefix, limit):
+    """Return suggestions like complete_artist does, queried from the catalog
+    Both conditions are answered by indexes of normalized_name (btree and trigram)
+    """
+    artists = (
+        Artist.objects
+        .filter(Q(normalized_name__startswith=prefix) | Q(normalized_name__contains=' ' + prefix))
+        .order_by('-lookups')[:limit]
+    )
+    return [dict(artist.to_payload()) for artist in artists]
+
+def reset_index():
+    """Forget the index, it is built again on next use"""
+    global _keys, _entries, _artists, _built_at, _rebuilding, _generation
+    with _lock:
+        _keys, _entries, _artists = [], [], {}
+        _built_at = None
+        _rebuilding = False
+        _generation += 1
@@ -0,0 +1,30 @@
+"""Background tasks executed in threads of the worker process (uWSGI runs with --enable-threads)"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import connections
+from .deadline import deadline_budget
+
+logger = logging.getLogger(__name__)
+
+BACKGROUND_MAX_WORKERS = 4
+
+_executor = ThreadPoolExecutor(max_workers=BACKGROUND_MAX_WORKERS, thread_name_prefix='spotify-background')
+
+
+def _run_task(func, args, kwargs):
+    """Run task with its own deadline budget, log its failure
+    and release database connections of the thread
+    """
+    try:
+        with deadline_budget(settings.SPOTIFY_BACKGROUND_BUDGET, override=True):
+            return func(*args, **kwargs)
+    except Exception:
+        logger.exception('Background task %s failed', getattr(func, '__name__', func))
+        raise
+    finally:
+        connections.close_all()
+
+def submit(func, *args, **kwargs):
+    """Schedule func to be run in background thread and return its Future"""
+    return _executor.submit(_run_task, func, args, kwargs)
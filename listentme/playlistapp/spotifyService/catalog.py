@@ -0,0 +1,173 @@
+"""Local catalog of artists, resolving names users typed before with a single indexed query
+instead of searching Spotify
+A name resolves only to the artist Spotify search returned for it (ArtistAlias), similar
+names and names of artists stored from tracks are left to Spotify, they may be other artists
+Lookups are counted in memory of the worker and written in batches (see flush_artist_lookups),
+counts of the last batch of a worker are lost when it exits
+"""
+import threading
+import time
+from collections import Counter
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import caches
+from django.db import IntegrityError
+from django.db.models import Case, F, Q, Value, When
+from django.utils import timezone
+from .models import Artist, ArtistAlias
+
+ARTIST_CATALOG_HITS_CACHE_KEY = 'spotify:artist_catalog:hits'
+ARTIST_CATALOG_MISSES_CACHE_KEY = 'spotify:artist_catalog:misses'
+
+_lock = threading.Lock()
+_pending_lookups = Counter()
+_pending_hits = 0
+_pending_misses = 0
+_flushed_at = time.monotonic()
+
+
+def normalize_artist_name(artist):
+    """Return artist name used to recognize the same artist typed differently"""
+    return ' '.join(artist.split()).casefold()
+
+def find_artist(name, record=True):
+    """Return artist Spotify search returned for the name before, None if it was not searched
+    record: count the lookup as a catalog hit or miss and as a lookup of the found artist,
+    False for lookups not made by users
+    """
+    normalized_name = normalize_artist_name(name)
+    artist = Artist.objects.filter(aliases__query=normalized_name).first()
+    if record:
+        record_artist_lookup(hit=artist is not None, artist_pk=artist.pk if artist else None)
+    if artist is None:
+        return None
+    return artist.to_payload()
+
+def store_artist(artist_data, query=None):
+    """Save or update artist found in Spotify (as returned by util.search_artist)
+    query: name the artist was searched by, resolved to it by find_artist from now on
+    """
+    store_artists([artist_data])
+    if query is None:
+        return
+    artist = Artist.objects.get(spotify_id=artist_data['id'])
+    try:
+        ArtistAlias.objects.update_or_create(query=normalize_artist_name(query), defaults={'artist': artist})
+    except IntegrityError:
+        # The same name was searched concurrently and stored first
+        pass
+
+def store_artists(artists_data):
+    """Save or update many artists loaded from Spotify with full data, with three queries at most"""
+    now = timezone.now()
+    artists_data = {artist_data['id']: artist_data for artist_data in artists_data}
+    existing = Artist.objects.in_bulk(list(artists_data), field_name='spotify_id')
+    new_artists = []
+    for spotify_id, artist_data in artists_data.items():
+        artist = existing.get(spotify_id) or Artist(spotify_id=spotify_id)
+        artist.name = artist_data['name']
+        artist.normalized_name = normalize_artist_name(artist_data['name'])
+        artist.external_url = artist_data.get('external_url') or ''
+        artist.image_url = artist_data.get('image_url') or ''
+        artist.updated_at = now
+        artist.hydrated_at = now
+        if artist.pk is None:
+            new_artists.append(artist)
+    if existing:
+        Artist.objects.bulk_update(
+            existing.values(),
+            ['name', 'normalized_name', 'external_url', 'image_url', 'updated_at', 'hydrated_at']
+        )
+    Artist.objects.bulk_create(new_artists, ignore_conflicts=True)
+
+def get_stale_artists_ids(spotify_ids=None, limit=None):
+    """Return ids of stored artists never hydrated or hydrated more than
+    SPOTIFY_ARTIST_REFRESH_AGE seconds ago, the most looked up first
+    spotify_ids: consider only these artists
+    """
+    stale_before = timezone.now() - timedelta(seconds=settings.SPOTIFY_ARTIST_REFRESH_AGE)
+    queryset = Artist.objects.filter(Q(hydrated_at__isnull=True) | Q(hydrated_at__lt=stale_before))
+    if spotify_ids is not None:
+        queryset = queryset.filter(spotify_id__in=list(spotify_ids))
+    spotify_ids = queryset.order_by('-lookups').values_list('spotify_id', flat=True)
+    if limit is not None:
+        spotify_ids = spotify_ids[:limit]
+    return list(spotify_ids)
+
+def store_simplified_artists(artists_data):
+    """Save Artists loaded without images (e.g. artists of tracks)
+    Already stored ones are left as they are
+    """
+    Artist.objects.bulk_create([
+        Artist(
+            spotify_id=artist_data['id'],
+            name=artist_data['name'],
+            normalized_name=normalize_artist_name(artist_data['name']),
+            external_url=artist_data.get('external_url') or '',
+        )
+        for artist_data in artists_data
+        if artist_data.get('id') and artist_data.get('name')
+    ], ignore_conflicts=True)
+
+def record_artist_lookup(hit, artist_pk=None):
+    """Count artist resolved from the catalog (hit) or searched in Spotify (miss)
+    artist_pk: stored artist which was looked up
+    Counts are written once SPOTIFY_ARTIST_LOOKUPS_FLUSH_SIZE lookups are pending
+    or SPOTIFY_ARTIST_LOOKUPS_FLUSH_INTERVAL seconds passed since they were written
+    """
+    global _pending_hits, _pending_misses
+    with _lock:
+        if hit:
+            _pending_hits += 1
+        else:
+            _pending_misses += 1
+        if artist_pk is not None:
+            _pending_lookups[artist_pk] += 1
+        flush = (
+            _pending_hits + _pending_misses >= settings.SPOTIFY_ARTIST_LOOKUPS_FLUSH_SIZE
+            or time.monotonic() - _flushed_at >= settings.SPOTIFY_ARTIST_LOOKUPS_FLUSH_INTERVAL
+        )
+    if flush:
+        flush_artist_lookups()
+
+def flush_artist_lookups():
+    """Write lookups counted by this worker: lookups of artists with one UPDATE
+    and catalog hits and misses to the coordination cache
+    """
+    global _pending_lookups, _pending_hits, _pending_misses, _flushed_at
+    with _lock:
+        lookups, hits, misses = _pending_lookups, _pending_hits, _pending_misses
+        _pending_lookups, _pending_hits, _pending_misses = Counter(), 0, 0
+        _flushed_at = time.monotonic()
+    if lookups:
+        Artist.objects.filter(pk__in=list(lookups)).update(lookups=F('lookups') + Case(
+            *(When(pk=artist_pk, then=Value(count)) for artist_pk, count in lookups.items()),
+            default=Value(0)
+        ))
+    counters = caches['coordination']
+    for cache_key, count in ((ARTIST_CATALOG_HITS_CACHE_KEY, hits), (ARTIST_CATALOG_MISSES_CACHE_KEY, misses)):
+        if count:
+            counters.add(cache_key, 0, timeout=None)
+            counters.incr(cache_key, count)
+
+def get_artist_catalog_stats():
+    """Return numbers of catalog hits and misses, its hit rate and number of stored artists
+    Lookups still pending in other workers are not counted yet
+    """
+    flush_artist_lookups()
+    counters = caches['coordination']
+    hits = counters.get(ARTIST_CATALOG_HITS_CACHE_KEY, 0)
+    misses = counters.get(ARTIST_CATALOG_MISSES_CACHE_KEY, 0)
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': hits / (hits + misses) if hits + misses else None,
+        'artists': Artist.objects.count(),
+    }
+
+def reset_artist_catalog_stats():
+    """Start counting hits and misses again"""
+    global _pending_hits, _pending_misses
+    with _lock:
+        _pending_hits, _pending_misses = 0, 0
+    caches['coordination'].delete_many([ARTIST_CATALOG_HITS_CACHE_KEY, ARTIST_CATALOG_MISSES_CACHE_KEY])
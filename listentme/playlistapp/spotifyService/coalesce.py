@@ -0,0 +1,73 @@
+"""Coalescing of identical Spotify API requests in flight,
+so concurrent callers share one upstream call instead of sending their own
+"""
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from django.core.cache import caches
+from .deadline import SpotifyDeadlineExceeded, get_remaining_budget
+
+COALESCE_LOCK_CACHE_KEY = '{key}:lock'
+COALESCE_POLL_INTERVAL = 0.1
+
+_lock = threading.Lock()
+# Calls in flight in this worker process, by key
+_in_flight = {}
+
+
+def coalesce(key, func):
+    """Call func() once for all callers with the same key running concurrently in this process
+    and return its result to each of them. Waiting callers respect their own deadline budget
+    """
+    with _lock:
+        future = _in_flight.get(key)
+        leader = future is None
+        if leader:
+            future = Future()
+            _in_flight[key] = future
+    if not leader:
+        try:
+            return future.result(timeout=get_remaining_budget())
+        except FutureTimeoutError:
+            raise SpotifyDeadlineExceeded('Spotify API deadline budget exceeded') from None
+
+    try:
+        result = func()
+    except BaseException as error:
+        future.set_exception(error)
+        raise
+    else:
+        future.set_result(result)
+        return result
+    finally:
+        with _lock:
+            _in_flight.pop(key, None)
+
+def coalesce_across_workers(cache_key, func, lock_timeout, cache_alias='default'):
+    """Let only one worker call func(), which stores its result in the cache cache_alias
+    under cache_key, while others wait for the result to appear there. When it doesn't
+    (the call failed or took longer than lock_timeout seconds) the waiting worker calls func() itself
+    The lock is taken in the coordination cache
+    """
+    cache = caches[cache_alias]
+    locks = caches['coordination']
+    lock_key = COALESCE_LOCK_CACHE_KEY.format(key=cache_key)
+    if locks.add(lock_key, True, timeout=lock_timeout):
+        try:
+            return func()
+        finally:
+            locks.delete(lock_key)
+
+    wait = lock_timeout
+    remaining = get_remaining_budget()
+    if remaining is not None:
+        wait = min(wait, remaining)
+    deadline = time.monotonic() + wait
+    while time.monotonic() < deadline:
+        time.sleep(COALESCE_POLL_INTERVAL)
+        result = cache.get(cache_key)
+        if result is not None:
+            return result
+        if locks.get(lock_key) is None:
+            break
+    return func()
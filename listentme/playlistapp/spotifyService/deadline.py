@@ -0,0 +1,56 @@
+"""Deadline budget shared by all Spotify API calls made while handling a request"""
+import contextvars
+import time
+from contextlib import contextmanager
+from functools import wraps
+from django.conf import settings
+
+_deadline = contextvars.ContextVar('spotify_deadline', default=None)
+
+
+class SpotifyDeadlineExceeded(Exception):
+    """Raised when there is no time left in the budget for another Spotify API call"""
+
+
+@contextmanager
+def deadline_budget(seconds, override=False):
+    """Limit total time of Spotify API calls made inside to `seconds`
+    Nested budget can only shorten the outer one, unless override is set
+    """
+    deadline = time.monotonic() + seconds
+    current_deadline = _deadline.get()
+    if current_deadline is not None and not override:
+        deadline = min(deadline, current_deadline)
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+def spotify_budget(seconds):
+    """Decorator giving a view its own budget instead of the default one set by middleware"""
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapped_view(*args, **kwargs):
+            with deadline_budget(seconds, override=True):
+                return view_func(*args, **kwargs)
+        return wrapped_view
+    return decorator
+
+def get_remaining_budget():
+    """Return seconds left in the current budget or None if there is no budget"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+def get_request_timeout():
+    """Return timeout of the next Spotify API call
+    It is never longer than SPOTIFY_REQUEST_TIMEOUT nor than the remaining budget
+    """
+    remaining = get_remaining_budget()
+    if remaining is None:
+        return settings.SPOTIFY_REQUEST_TIMEOUT
+    if remaining <= 0:
+        raise SpotifyDeadlineExceeded('Spotify API deadline budget exceeded')
+    return min(settings.SPOTIFY_REQUEST_TIMEOUT, remaining)
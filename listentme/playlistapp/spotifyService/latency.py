@@ -0,0 +1,56 @@
+"""Latency of recent Spotify API requests made by this worker process,
+used to detect Spotify slowdowns
+"""
+import threading
+import time
+from contextlib import contextmanager
+from django.conf import settings
+
+# Weight of the newest request in the moving average
+LATENCY_SMOOTHING = 0.2
+
+_lock = threading.Lock()
+_average = None
+_updated_at = None
+
+
+def record_latency(seconds):
+    """Add duration of a Spotify API request to the exponentially weighted moving average"""
+    global _average, _updated_at
+    with _lock:
+        if _average is None or get_latency_age() > settings.SPOTIFY_LATENCY_WINDOW:
+            _average = seconds
+        else:
+            _average += LATENCY_SMOOTHING * (seconds - _average)
+        _updated_at = time.monotonic()
+
+@contextmanager
+def measure_latency():
+    """Record how long the Spotify API request made inside took, failed ones included"""
+    started = time.monotonic()
+    try:
+        yield
+    finally:
+        record_latency(time.monotonic() - started)
+
+def get_latency_age():
+    """Return seconds since the last recorded request"""
+    if _updated_at is None:
+        return float('inf')
+    return time.monotonic() - _updated_at
+
+def get_spotify_latency():
+    """Return average latency of recent Spotify API requests in seconds
+    or None when no request was made within SPOTIFY_LATENCY_WINDOW
+    """
+    with _lock:
+        if _average is None or get_latency_age() > settings.SPOTIFY_LATENCY_WINDOW:
+            return None
+        return _average
+
+def reset_latency():
+    """Forget recorded latency"""
+    global _average, _updated_at
+    with _lock:
+        _average = None
+        _updated_at = None
@@ -1,5 +1,7 @@
 """SpotifyService Models"""
+from django.contrib.postgres.indexes import GinIndex
 from django.db import models
+from . import payloads
 
 class SpotifyToken(models.Model):
     """Model of Spotify Token needed to use api"""
@@ -9,3 +11,35 @@ class SpotifyToken(models.Model):
     access_token = models.CharField(max_length=500)
     expires_in = models.DateTimeField()
     token_type = models.CharField(max_length=50)
+
+class Artist(models.Model):
+    """Artist found in Spotify catalog, stored to resolve names without searching Spotify"""
+    spotify_id = models.CharField(max_length=50, unique=True)
+    name = models.CharField(max_length=200)
+    normalized_name = models.CharField(max_length=200, db_index=True)
+    external_url = models.URLField(max_length=500, blank=True, default='')
+    image_url = models.URLField(max_length=500, blank=True, default='')
+    lookups = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    # When full data (with images) was loaded from Spotify, None for artists of tracks
+    hydrated_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            GinIndex(name='artist_name_trgm', fields=['normalized_name'], opclasses=['gin_trgm_ops']),
+        ]
+
+    def to_payload(self):
+        """Return artist in the same form as util.search_artist"""
+        return payloads.Artist(
+            name=self.name,
+            id=self.spotify_id,
+            external_url=self.external_url,
+            image_url=self.image_url,
+        )
+
+class ArtistAlias(models.Model):
+    """Name typed by a user, resolved to the artist Spotify search returned for it"""
+    # Normalized the same way as Artist.normalized_name
+    query = models.CharField(max_length=200, unique=True)
+    artist = models.ForeignKey(Artist, on_delete=models.CASCADE, related_name='aliases')
@@ -0,0 +1,50 @@
+"""Ordering of playlist tracks by their audio features"""
+
+# Tempo difference (BPM) weighing as much as the whole range of energy
+TEMPO_RANGE = 60
+
+
+def track_id_from_uri(uri):
+    """Return Spotify id of a track from its uri (spotify:track:<id>)"""
+    return uri.rsplit(':', 1)[-1]
+
+def interleave(artists_tracks):
+    """Return tracks of artists taking one of each artist in turn"""
+    tracks = []
+    for position in range(max((len(artist_tracks) for artist_tracks in artists_tracks), default=0)):
+        tracks.extend(
+            artist_tracks[position] for artist_tracks in artists_tracks if position < len(artist_tracks)
+        )
+    return list(dict.fromkeys(tracks))
+
+def order_by_features(artists_tracks, features):
+    """Order tracks so every next one is the closest in tempo and energy to the previous one,
+    preferably by another artist, starting with the calmest one.
+    artists_tracks: list of lists of tracks uris, one list per artist
+    features: audio features by track uri, tracks without them are appended interleaved
+    """
+    artist_of = {}
+    for artist_number, artist_tracks in enumerate(artists_tracks):
+        for uri in artist_tracks:
+            artist_of.setdefault(uri, artist_number)
+    tracks = interleave(artists_tracks)
+    remaining = [uri for uri in tracks if features.get(uri)]
+    without_features = [uri for uri in tracks if not features.get(uri)]
+    if not remaining:
+        return without_features
+
+    def distance(uri, other):
+        return (
+            abs(features[uri]['tempo'] - features[other]['tempo']) / TEMPO_RANGE
+            + abs(features[uri]['energy'] - features[other]['energy'])
+        )
+
+    current = min(remaining, key=lambda uri: (features[uri]['energy'], features[uri]['tempo']))
+    ordered = [current]
+    remaining.remove(current)
+    while remaining:
+        candidates = [uri for uri in remaining if artist_of[uri] != artist_of[current]] or remaining
+        current = min(candidates, key=lambda uri: distance(current, uri))
+        ordered.append(current)
+        remaining.remove(current)
+    return ordered + without_features
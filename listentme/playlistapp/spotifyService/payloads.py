@@ -0,0 +1,157 @@
+"""Compact models of Spotify API payloads
+
+Spotify responses carry many fields the app never reads (markets, followers, full
+album objects...). They are projected to the used fields as soon as they are decoded,
+so only small frozen models are kept in memory and in the cache.
+Models can be read like the dicts used before them (`artist['id']`, `user.get('id')`),
+so templates, DRF rendering and item access keep working.
+
+Responses are decoded with orjson instead of json when SPOTIFY_JSON_DECODER is 'orjson'
+and orjson is installed.
+"""
+import re
+from dataclasses import dataclass
+from django.conf import settings
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Fields read by the app from objects of Spotify API, True keeps the whole value
+ARTIST_FIELDS = {'id': True, 'name': True, 'external_urls': {'spotify': True}, 'images': {'url': True}}
+SIMPLIFIED_ARTIST_FIELDS = {'id': True, 'name': True, 'external_urls': {'spotify': True}}
+TRACK_FIELDS = {'id': True, 'uri': True, 'artists': SIMPLIFIED_ARTIST_FIELDS}
+AUDIO_FEATURES_FIELDS = {'id': True, 'tempo': True, 'energy': True}
+
+# Fields of responses of catalog endpoints, the first matching pattern is used
+CATALOG_FIELDS = [
+    (re.compile(r'search/?$'), {'artists': {'items': ARTIST_FIELDS}}),
+    (re.compile(r'artists/[^/]+/top-tracks'), {'tracks': TRACK_FIELDS}),
+    (re.compile(r'artists/[^/]+/related-artists'), {'artists': ARTIST_FIELDS}),
+    (re.compile(r'artists/?$'), {'artists': ARTIST_FIELDS}),
+    (re.compile(r'audio-features/?$'), {'audio_features': AUDIO_FEATURES_FIELDS}),
+]
+
+
+def decode_json(response):
+    """Return decoded JSON body of requests' response"""
+    if settings.SPOTIFY_JSON_DECODER == 'orjson' and orjson is not None:
+        return orjson.loads(response.content)
+    return response.json()
+
+def project(data, spec):
+    """Return data with only fields of the spec, lists are projected item by item"""
+    if spec is True or data is None:
+        return data
+    if isinstance(data, list):
+        return [project(item, spec) for item in data]
+    if not isinstance(data, dict):
+        return data
+    return {key: project(data[key], field_spec) for key, field_spec in spec.items() if key in data}
+
+def project_catalog_response(endpoint, response):
+    """Return response of the catalog endpoint with only fields read by the app,
+    unknown endpoints and errors are returned whole
+    """
+    if 'error' in response or 'Error' in response:
+        return response
+    for pattern, spec in CATALOG_FIELDS:
+        if pattern.match(endpoint.split('?', 1)[0]):
+            return project(response, spec)
+    return response
+
+def _first_image_url(data):
+    images = data.get('images') or []
+    return images[0].get('url') if images else None
+
+
+class Payload:
+    """Read access to fields of models by key, like to dicts"""
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        if key not in self.__dataclass_fields__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __contains__(self, key):
+        return key in self.__dataclass_fields__
+
+    def __iter__(self):
+        return iter(self.__dataclass_fields__)
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in self.__dataclass_fields__ else default
+
+    def keys(self):
+        return list(self.__dataclass_fields__)
+
+    def to_dict(self):
+        return {key: getattr(self, key) for key in self.keys()}
+
+@dataclass(frozen=True, slots=True)
+class User(Payload):
+    """Spotify user profile"""
+    id: str
+    display_name: str | None = None
+    external_url: str | None = None
+    image_url: str | None = None
+
+    @classmethod
+    def from_spotify(cls, data):
+        return cls(
+            id=data.get('id'),
+            display_name=data.get('display_name'),
+            external_url=(data.get('external_urls') or {}).get('spotify'),
+            image_url=_first_image_url(data),
+        )
+
+@dataclass(frozen=True, slots=True)
+class Artist(Payload):
+    """Spotify artist"""
+    name: str
+    id: str
+    external_url: str | None = None
+    image_url: str | None = None
+
+    @classmethod
+    def from_spotify(cls, data):
+        return cls(
+            name=data.get('name'),
+            id=data.get('id'),
+            external_url=(data.get('external_urls') or {}).get('spotify'),
+            image_url=_first_image_url(data),
+        )
+
+@dataclass(frozen=True, slots=True)
+class PlaylistSummary(Payload):
+    """Playlist as listed among playlists of the user"""
+    name: str
+    id: str
+    external_url: str | None = None
+    image_url: str | None = None
+
+    @classmethod
+    def from_spotify(cls, data):
+        return cls(
+            name=data.get('name'),
+            id=data.get('id'),
+            external_url=(data.get('external_urls') or {}).get('spotify'),
+            image_url=_first_image_url(data),
+        )
+
+@dataclass(frozen=True, slots=True)
+class TrackRef(Payload):
+    """Track with its artists, without album and audio details"""
+    uri: str
+    id: str | None = None
+    artists: tuple = ()
+
+    @classmethod
+    def from_spotify(cls, data):
+        return cls(
+            uri=data.get('uri'),
+            id=data.get('id'),
+            artists=tuple(Artist.from_spotify(artist) for artist in data.get('artists') or []),
+        )
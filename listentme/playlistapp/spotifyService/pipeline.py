@@ -0,0 +1,98 @@
+"""Dependency-driven pipeline running independent Spotify calls concurrently"""
+import contextvars
+import logging
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from contextlib import contextmanager, nullcontext
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+PIPELINE_MAX_WORKERS = 4
+
+Stage = namedtuple('Stage', ['func', 'requires'], defaults=[()])
+Stage.__doc__ = """Pipeline step, func is called with results of the required stages"""
+
+_stage_profiler = contextvars.ContextVar('stage_profiler', default=None)
+
+
+@contextmanager
+def profile_stages(profiler):
+    """Profile stages run inside in their worker threads with the profiler of the caller
+    profiler: object with profile_thread() context manager (see playlistapp.profiling)
+    """
+    token = _stage_profiler.set(profiler)
+    try:
+        yield
+    finally:
+        _stage_profiler.reset(token)
+
+def _run_stage(func, args):
+    """Run a single stage in a worker thread and measure its duration
+    Stages are run in copy of the caller's context, so they share its deadline budget
+    and its profiler
+    """
+    profiler = _stage_profiler.get()
+    started = time.perf_counter()
+    try:
+        with profiler.profile_thread() if profiler is not None else nullcontext():
+            return func(*args), time.perf_counter() - started
+    finally:
+        connections.close_all()
+
+def run_pipeline(stages, max_workers=PIPELINE_MAX_WORKERS):
+    """Run stages as soon as all of their requirements are finished
+    stages: dict of stage name and Stage
+    Returns results and timings (in seconds) of every stage keyed by stage name,
+    timings contain also 'total' - the critical path of the whole pipeline
+    """
+    for name, stage in stages.items():
+        missing = set(stage.requires) - set(stages)
+        if missing:
+            raise ValueError(f'Stage {name} requires unknown stages: {", ".join(sorted(missing))}')
+
+    results = {}
+    timings = {}
+    pending = dict(stages)
+    running = {}
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while pending or running:
+            for name, stage in list(pending.items()):
+                if all(required in results for required in stage.requires):
+                    args = [results[required] for required in stage.requires]
+                    running[executor.submit(contextvars.copy_context().run, _run_stage, stage.func, args)] = name
+                    del pending[name]
+            if not running:
+                raise ValueError(f'Stages with circular requirements: {", ".join(sorted(pending))}')
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    results[name], timings[name] = future.result()
+                except Exception:
+                    for other in running:
+                        other.cancel()
+                    raise
+    timings['total'] = time.perf_counter() - started
+    logger.debug(
+        'Pipeline finished in %.3fs (%s)',
+        timings['total'],
+        ', '.join(f'{name}: {seconds:.3f}s' for name, seconds in timings.items() if name != 'total')
+    )
+    return results, timings
+
+def run_concurrently(func, items, max_workers=PIPELINE_MAX_WORKERS):
+    """Call func for every item using at most max_workers threads
+    Returns results in order of items
+    """
+    items = list(items)
+    if not items:
+        return []
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as executor:
+        futures = [
+            executor.submit(contextvars.copy_context().run, _run_stage, func, [item])
+            for item in items
+        ]
+        return [future.result()[0] for future in futures]
@@ -0,0 +1,175 @@
+"""Record and replay of Spotify API interactions, so tests and benchmarks can run offline
+with real-shaped responses and production-like latencies.
+
+Interactions are stored in cassettes - JSON fixture files with method, url, params and data
+of every request, its response and how long it took. Secrets (tokens, client credentials)
+are never written. In replay mode requests are matched by method, url, params and data,
+repeated identical requests get recorded responses in order (the last one is reused),
+and every response is delayed by its recorded latency multiplied by latency_scale.
+
+Cassette is used inside `recording(path)` / `replaying(path)` blocks or for the whole process
+with SPOTIFY_REPLAY_MODE ('record' or 'replay') and SPOTIFY_REPLAY_CASSETTE settings.
+"""
+import hashlib
+import json
+import threading
+import time
+from contextlib import contextmanager
+from django.conf import settings
+from requests import Response
+
+REDACTED = '<redacted>'
+SECRET_FIELDS = {'client_id', 'client_secret', 'code', 'refresh_token', 'access_token'}
+
+_active_cassette = None
+_settings_cassette = None
+_settings_lock = threading.Lock()
+
+
+class ReplayMissError(Exception):
+    """Raised when replayed cassette has no response recorded for a request"""
+
+
+def _redact(values):
+    """Return dict without values of secret fields"""
+    return {key: REDACTED if key in SECRET_FIELDS else value for key, value in values.items()}
+
+def _serialize_data(data):
+    """Return request body in a form stored in the cassette"""
+    if data is None:
+        return None
+    if isinstance(data, dict):
+        return _redact(data)
+    if isinstance(data, bytes):
+        return 'sha256:' + hashlib.sha256(data).hexdigest()
+    return data
+
+class Cassette:
+    """Spotify API interactions recorded to or replayed from a fixture file"""
+
+    def __init__(self, path, mode, latency_scale=1.0):
+        self.path = path
+        self.mode = mode
+        self.latency_scale = latency_scale
+        self.lock = threading.Lock()
+        self.interactions = []
+        self.unused = {}
+        if mode == 'replay':
+            with open(path, encoding='utf-8') as cassette_file:
+                self.interactions = json.load(cassette_file)['interactions']
+            for interaction in self.interactions:
+                key = self.request_key(
+                    interaction['method'], interaction['url'], interaction['params'], interaction['data']
+                )
+                self.unused.setdefault(key, []).append(interaction)
+
+    @staticmethod
+    def request_key(method, url, params, data):
+        """Return key matching replayed request with the recorded one"""
+        params = sorted([str(key), str(value)] for key, value in (params or {}).items())
+        return json.dumps([method, url, params, data], sort_keys=True)
+
+    def play(self, method, url, params, data):
+        """Return response recorded for the request after its recorded latency"""
+        key = self.request_key(method, url, params, _serialize_data(data))
+        with self.lock:
+            recorded = self.unused.get(key)
+            if not recorded:
+                raise ReplayMissError(f'No response recorded in {self.path} for {method} {url} {params}')
+            interaction = recorded.pop(0) if len(recorded) > 1 else recorded[0]
+        time.sleep(interaction['latency'] * self.latency_scale)
+
+        response = Response()
+        response.status_code = interaction['status']
+        response.url = url
+        response.encoding = 'utf-8'
+        response.headers.update(interaction.get('headers', {}))
+        body = interaction['body']
+        response._content = b'' if body is None else json.dumps(body).encode('utf-8')
+        return response
+
+    def record(self, method, url, params, data, response, latency):
+        """Add interaction to the cassette"""
+        try:
+            body = response.json()
+        except ValueError:
+            body = None
+        if isinstance(body, dict):
+            body = _redact(body)
+        headers = {
+            name: response.headers[name] for name in ('Retry-After',) if name in response.headers
+        }
+        with self.lock:
+            self.interactions.append({
+                'method': method,
+                'url': url,
+                'params': params,
+                'data': _serialize_data(data),
+                'status': response.status_code,
+                'headers': headers,
+                'body': body,
+                'latency': round(latency, 4),
+            })
+
+    def save(self):
+        """Write recorded interactions to the fixture file"""
+        with self.lock:
+            with open(self.path, 'w', encoding='utf-8') as cassette_file:
+                json.dump({'interactions': self.interactions}, cassette_file, indent=2, default=str)
+
+@contextmanager
+def recording(path):
+    """Record Spotify API interactions made inside to the fixture file"""
+    global _active_cassette
+    cassette = Cassette(path, 'record')
+    previous, _active_cassette = _active_cassette, cassette
+    try:
+        yield cassette
+    finally:
+        _active_cassette = previous
+        cassette.save()
+
+@contextmanager
+def replaying(path, latency_scale=None):
+    """Answer Spotify API requests made inside from the fixture file without network
+    latency_scale: multiplier of recorded latencies, SPOTIFY_REPLAY_LATENCY_SCALE by default
+    """
+    global _active_cassette
+    if latency_scale is None:
+        latency_scale = settings.SPOTIFY_REPLAY_LATENCY_SCALE
+    cassette = Cassette(path, 'replay', latency_scale)
+    previous, _active_cassette = _active_cassette, cassette
+    try:
+        yield cassette
+    finally:
+        _active_cassette = previous
+
+def get_cassette():
+    """Return cassette of the current recording or replaying block or the one set up in settings"""
+    global _settings_cassette
+    if _active_cassette is not None:
+        return _active_cassette
+    if settings.SPOTIFY_REPLAY_MODE not in ('record', 'replay'):
+        return None
+    with _settings_lock:
+        if _settings_cassette is None:
+            _settings_cassette = Cassette(
+                settings.SPOTIFY_REPLAY_CASSETTE,
+                settings.SPOTIFY_REPLAY_MODE,
+                settings.SPOTIFY_REPLAY_LATENCY_SCALE
+            )
+    return _settings_cassette
+
+def send(request_func, method, url, **kwargs):
+    """Send request with request_func (requests.get, post...) or replay it, recording it if needed"""
+    cassette = get_cassette()
+    if cassette is None:
+        return request_func(url, **kwargs)
+    if cassette.mode == 'replay':
+        return cassette.play(method, url, kwargs.get('params'), kwargs.get('data'))
+    started = time.monotonic()
+    response = request_func(url, **kwargs)
+    cassette.record(method, url, kwargs.get('params'), kwargs.get('data'), response, time.monotonic() - started)
+    if cassette is _settings_cassette:
+        cassette.save()
+    return response
@@ -0,0 +1,55 @@
+"""Stale-while-revalidate cache keeping the last good Spotify responses"""
+import logging
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from django.core.cache import cache
+from . import background
+
+logger = logging.getLogger(__name__)
+
+# Revalidations running in this worker process, by cache key
+_revalidations = {}
+
+
+def get_or_revalidate(cache_key, fetch, fresh_timeout, stale_timeout, latency_threshold):
+    """Return cached value, fetching it again with fetch() when it is no longer fresh
+    fetch() returns None when the value can't be loaded, then nothing is cached.
+    Fresh value is returned right away. Stale one is revalidated in background
+    and returned when the new value doesn't arrive within latency_threshold seconds
+    or can't be loaded. Missing value is fetched synchronously
+    """
+    entry = cache.get(cache_key)
+    if entry is None:
+        return _revalidate(cache_key, fetch, fresh_timeout, stale_timeout)
+    if entry['fresh_until'] > time.time():
+        return entry['value']
+
+    future = _revalidations.get(cache_key)
+    if future is None:
+        future = background.submit(_revalidate, cache_key, fetch, fresh_timeout, stale_timeout)
+        _revalidations[cache_key] = future
+        future.add_done_callback(
+            lambda done: _revalidations.pop(cache_key, None) if _revalidations.get(cache_key) is done else None
+        )
+    try:
+        value = future.result(timeout=latency_threshold)
+    except FutureTimeoutError:
+        logger.info('Serving stale %s, Spotify did not respond in %ss', cache_key, latency_threshold)
+        return entry['value']
+    except Exception:
+        return entry['value']
+    if value is None:
+        logger.info('Serving stale %s, Spotify request failed', cache_key)
+        return entry['value']
+    return value
+
+def _revalidate(cache_key, fetch, fresh_timeout, stale_timeout):
+    """Fetch value and keep it fresh for fresh_timeout seconds and stale for stale_timeout more"""
+    value = fetch()
+    if value is not None:
+        cache.set(
+            cache_key,
+            {'value': value, 'fresh_until': time.time() + fresh_timeout},
+            timeout=fresh_timeout + stale_timeout
+        )
+    return value
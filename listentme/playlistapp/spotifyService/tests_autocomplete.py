@@ -0,0 +1,64 @@
+"""Tests for autocomplete.py"""
+from unittest.mock import patch
+from django.test import TestCase
+from .autocomplete import complete_artist, rebuild_index, remember_artist, reset_index
+from .models import Artist
+
+class CompleteArtistTestCase(TestCase):
+
+    def setUp(self):
+        reset_index()
+        self.addCleanup(reset_index)
+        for spotify_id, name, lookups in [
+            ('1', 'Radiohead', 10),
+            ('2', 'Rammstein', 20),
+            ('3', 'Thom Yorke', 5),
+            ('4', 'Portishead', 1),
+        ]:
+            Artist.objects.create(spotify_id=spotify_id, name=name, normalized_name=name.casefold(), lookups=lookups)
+        rebuild_index()
+
+    def test_complete_artist_prefix(self):
+        suggestions = complete_artist('  RA')
+        self.assertEqual([artist['name'] for artist in suggestions], ['Rammstein', 'Radiohead'])
+        self.assertEqual(set(suggestions[0]), {'name', 'id', 'external_url', 'image_url'})
+
+    def test_complete_artist_word(self):
+        self.assertEqual([artist['name'] for artist in complete_artist('york')], ['Thom Yorke'])
+
+    def test_complete_artist_limit(self):
+        self.assertEqual(len(complete_artist('r', limit=1)), 1)
+
+    def test_complete_artist_no_match(self):
+        self.assertEqual(complete_artist('zz'), [])
+        self.assertEqual(complete_artist(' '), [])
+
+    def test_complete_artist_without_database(self):
+        complete_artist('ra')
+        with self.assertNumQueries(0):
+            complete_artist('por')
+
+    @patch('playlistapp.spotifyService.autocomplete.background.submit')
+    def test_complete_artist_while_building(self, mock_submit):
+        reset_index()
+        self.assertEqual([artist['name'] for artist in complete_artist('ra')], ['Rammstein', 'Radiohead'])
+        self.assertEqual([artist['name'] for artist in complete_artist('york')], ['Thom Yorke'])
+        mock_submit.assert_called_once()
+        rebuild_index(*mock_submit.call_args.args[1:])
+        with self.assertNumQueries(0):
+            self.assertEqual(len(complete_artist('r')), 2)
+
+    @patch('playlistapp.spotifyService.autocomplete.background.submit')
+    def test_build_scheduled_before_reset_discarded(self, mock_submit):
+        reset_index()
+        complete_artist('ra')
+        reset_index()
+        rebuild_index(*mock_submit.call_args.args[1:])
+        with self.assertNumQueries(1):
+            complete_artist('ra')
+
+    def test_remember_artist(self):
+        complete_artist('ra')
+        remember_artist({'name': 'Radio Moscow', 'id': '5', 'external_url': '', 'image_url': None})
+        self.assertIn('Radio Moscow', [artist['name'] for artist in complete_artist('radio')])
+        self.assertEqual([artist['name'] for artist in complete_artist('mosc')], ['Radio Moscow'])
@@ -0,0 +1,227 @@
+"""Tests for catalog.py"""
+from dataclasses import replace
+from datetime import timedelta
+import tempfile
+from io import StringIO
+from unittest.mock import patch
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from .catalog import (
+    find_artist,
+    store_artist,
+    store_simplified_artists,
+    get_stale_artists_ids,
+    record_artist_lookup,
+    flush_artist_lookups,
+    get_artist_catalog_stats,
+    reset_artist_catalog_stats
+)
+from . import payloads
+from .models import Artist, ArtistAlias
+from .util import (
+    APP_TOKEN_CACHE_KEY,
+    search_artist,
+    hydrate_artists,
+    get_artist_top_tracks_uris,
+    set_rate_limited,
+    get_rate_limit_wait
+)
+
+class ArtistCatalogTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        caches['coordination'].clear()
+        reset_artist_catalog_stats()
+        self.artist_data = payloads.Artist(
+            name='Radiohead',
+            id='4Z8W4fKeB5YxbusRsdQVPb',
+            external_url='https://open.spotify.com/artist/4Z8W4fKeB5YxbusRsdQVPb',
+            image_url='https://i.scdn.co/image/radiohead',
+        )
+        store_artist(self.artist_data, query='Radiohead')
+
+    def test_find_artist_exact(self):
+        self.assertEqual(find_artist('  RADIOHEAD '), self.artist_data)
+        flush_artist_lookups()
+        self.assertEqual(Artist.objects.get().lookups, 1)
+
+    @override_settings(SPOTIFY_ARTIST_LOOKUPS_FLUSH_SIZE=3, SPOTIFY_ARTIST_LOOKUPS_FLUSH_INTERVAL=3600)
+    def test_find_artist_lookups_batched(self):
+        flush_artist_lookups()
+        with self.assertNumQueries(1):
+            find_artist('radiohead')
+        with self.assertNumQueries(1):
+            find_artist('portishead')
+        self.assertEqual(Artist.objects.get().lookups, 0)
+        find_artist('radiohead')
+        self.assertEqual(Artist.objects.get().lookups, 2)
+        stats = get_artist_catalog_stats()
+        self.assertEqual((stats['hits'], stats['misses']), (2, 1))
+
+    def test_find_artist_similar_missing(self):
+        self.assertIsNone(find_artist('radioheads'))
+
+    def test_find_artist_of_tracks_missing(self):
+        store_simplified_artists([{'id': 'the_national_id', 'name': 'The National'}])
+        self.assertIsNone(find_artist('The National'))
+
+    def test_store_artist_alias(self):
+        store_artist(self.artist_data, query='  radio HEAD')
+        store_artist(replace(self.artist_data, name='Radiohead Tribute', id='tribute_id'), query='Radiohead')
+        self.assertEqual(find_artist('radio head'), self.artist_data)
+        self.assertEqual(find_artist('radiohead')['id'], 'tribute_id')
+        self.assertEqual(ArtistAlias.objects.count(), 2)
+
+    def test_find_artist_missing(self):
+        self.assertIsNone(find_artist('Portishead'))
+
+    def test_store_artist_updates(self):
+        store_artist(dict(self.artist_data, image_url='https://i.scdn.co/image/new'))
+        self.assertEqual(Artist.objects.get().image_url, 'https://i.scdn.co/image/new')
+
+    def test_store_simplified_artists_keeps_stored(self):
+        store_simplified_artists([
+            payloads.Artist(name='Radiohead', id=self.artist_data['id']),
+            payloads.Artist(name='Thom Yorke', id='new_id', external_url='https://open.spotify.com/artist/new_id'),
+        ])
+        self.assertEqual(Artist.objects.count(), 2)
+        self.assertEqual(Artist.objects.get(spotify_id=self.artist_data['id']).image_url, self.artist_data['image_url'])
+
+    def test_get_stale_artists_ids(self):
+        store_simplified_artists([{'id': 'new_id', 'name': 'Thom Yorke'}])
+        self.assertEqual(get_stale_artists_ids(), ['new_id'])
+        Artist.objects.filter(spotify_id=self.artist_data['id']).update(
+            hydrated_at=timezone.now() - timedelta(days=30)
+        )
+        self.assertEqual(set(get_stale_artists_ids()), {'new_id', self.artist_data['id']})
+        self.assertEqual(get_stale_artists_ids(['new_id', 'other_id']), ['new_id'])
+
+    @patch('playlistapp.spotifyService.util.execute_spotify_catalog_request')
+    def test_hydrate_artists(self, mock_execute_spotify_catalog_request):
+        def artists_response(endpoint, params=None, session_id=None):
+            return {'artists': [
+                {
+                    'id': artist_id,
+                    'name': f'Artist {artist_id}',
+                    'external_urls': {'spotify': f'https://open.spotify.com/artist/{artist_id}'},
+                    'images': [{'url': f'https://i.scdn.co/image/{artist_id}'}],
+                }
+                for artist_id in params['ids'].split(',')
+            ]}
+        mock_execute_spotify_catalog_request.side_effect = artists_response
+        artists_ids = [self.artist_data['id']] + [str(number) for number in range(119)]
+
+        artists = hydrate_artists(artists_ids + ['1'])
+
+        self.assertEqual(mock_execute_spotify_catalog_request.call_count, 3)
+        self.assertEqual(len(artists), 120)
+        self.assertEqual(Artist.objects.count(), 120)
+        artist = Artist.objects.get(spotify_id=self.artist_data['id'])
+        self.assertEqual(artist.name, f'Artist {self.artist_data["id"]}')
+        self.assertIsNotNone(artist.hydrated_at)
+        self.assertEqual(get_stale_artists_ids(), [])
+
+    @patch('playlistapp.spotifyService.util.store_simplified_artists')
+    @patch('playlistapp.spotifyService.util.get')
+    def test_top_tracks_artists_stored_when_fetched(self, mock_get, mock_store_simplified_artists):
+        cache.set(APP_TOKEN_CACHE_KEY, 'app_token')
+        mock_get.return_value.status_code = 200
+        mock_get.return_value.json.return_value = {'tracks': [
+            {'uri': 'spotify:track:1', 'id': '1', 'artists': [{'id': 'thom_id', 'name': 'Thom Yorke'}]},
+        ]}
+        self.assertEqual(get_artist_top_tracks_uris(None, 'thom_id'), ['spotify:track:1'])
+        self.assertEqual(get_artist_top_tracks_uris(None, 'thom_id'), ['spotify:track:1'])
+        mock_get.assert_called_once()
+        mock_store_simplified_artists.assert_called_once()
+        self.assertEqual([artist['id'] for artist in mock_store_simplified_artists.call_args.args[0]], ['thom_id'])
+
+    def test_artist_catalog_stats(self):
+        record_artist_lookup(hit=True)
+        record_artist_lookup(hit=True)
+        record_artist_lookup(hit=False)
+        stats = get_artist_catalog_stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['artists']), (2, 1, 1))
+        self.assertAlmostEqual(stats['hit_rate'], 2 / 3)
+        out = StringIO()
+        call_command('artist_catalog_stats', '--reset', stdout=out)
+        self.assertIn('hit rate: 66.7%', out.getvalue())
+        self.assertEqual(get_artist_catalog_stats()['hits'], 0)
+
+    @patch('playlistapp.spotifyService.util.search_spotify_artist')
+    def test_search_artist_catalog_hit(self, mock_search_spotify_artist):
+        self.assertEqual(search_artist('session_id', 'Radiohead'), self.artist_data)
+        mock_search_spotify_artist.assert_not_called()
+
+    @patch('playlistapp.spotifyService.util.search_spotify_artist')
+    def test_search_artist_catalog_miss(self, mock_search_spotify_artist):
+        portishead = replace(self.artist_data, name='Portishead', id='portishead_id')
+        mock_search_spotify_artist.return_value = portishead
+        self.assertEqual(search_artist('session_id', 'Portishead'), portishead)
+        self.assertEqual(search_artist('session_id', 'Portishead'), portishead)
+        mock_search_spotify_artist.assert_called_once()
+        self.assertEqual(get_artist_catalog_stats()['hit_rate'], 0.5)
+
+class WarmArtistCacheCommandTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        caches['coordination'].clear()
+        Artist.objects.create(spotify_id='popular_id', name='Popular', normalized_name='popular', lookups=10)
+
+    @patch('playlistapp.management.commands.warm_artist_cache.refresh_stale_artists')
+    @patch('playlistapp.management.commands.warm_artist_cache.get_artist_top_tracks_uris')
+    @patch('playlistapp.management.commands.warm_artist_cache.search_artist')
+    def test_warm_artist_cache(self, mock_search_artist, mock_get_artist_top_tracks_uris,
+                               mock_refresh_stale_artists):
+        mock_search_artist.side_effect = lambda session_id, name, record: (
+            {'name': name, 'id': f'{name}_id'} if name != 'Unknown' else None
+        )
+        mock_get_artist_top_tracks_uris.return_value = ['uri1', 'uri2']
+        mock_refresh_stale_artists.return_value = {}
+        with tempfile.NamedTemporaryFile('w', suffix='.txt') as artists_file:
+            artists_file.write('Radiohead\n\nUnknown\npopular\n')
+            artists_file.flush()
+            out = StringIO()
+            call_command('warm_artist_cache', file=artists_file.name, rate=0, stdout=out)
+
+        self.assertEqual(mock_search_artist.call_count, 3)
+        warmed_ids = {call.args[1] for call in mock_get_artist_top_tracks_uris.call_args_list}
+        self.assertEqual(warmed_ids, {'Radiohead_id', 'popular_id'})
+        self.assertIn('Artist not found: Unknown', out.getvalue())
+        self.assertIn('Warmed 2 artists, 4 top tracks', out.getvalue())
+
+    def test_rate_limit_wait(self):
+        self.assertEqual(get_rate_limit_wait(), 0)
+        set_rate_limited('30')
+        self.assertGreater(get_rate_limit_wait(), 25)
+
+class WarmArtistCacheStatsTestCase(TransactionTestCase):
+    """Artists are resolved in threads, which see only committed data"""
+
+    def setUp(self):
+        cache.clear()
+        caches['coordination'].clear()
+        reset_artist_catalog_stats()
+        artist = Artist.objects.create(spotify_id='popular_id', name='Popular', normalized_name='popular', lookups=10)
+        ArtistAlias.objects.create(query='popular', artist=artist)
+
+    @patch('playlistapp.management.commands.warm_artist_cache.refresh_stale_artists')
+    @patch('playlistapp.management.commands.warm_artist_cache.get_artist_top_tracks_uris')
+    @patch('playlistapp.spotifyService.util.search_spotify_artist')
+    def test_warm_artist_cache_not_recorded(self, mock_search_spotify_artist, mock_get_artist_top_tracks_uris,
+                                            mock_refresh_stale_artists):
+        mock_search_spotify_artist.return_value = None
+        mock_get_artist_top_tracks_uris.return_value = []
+        mock_refresh_stale_artists.return_value = {}
+        with tempfile.NamedTemporaryFile('w', suffix='.txt') as artists_file:
+            artists_file.write('Popular\nUnknown\n')
+            artists_file.flush()
+            call_command('warm_artist_cache', file=artists_file.name, rate=0, stdout=StringIO())
+
+        mock_search_spotify_artist.assert_called_once_with(None, 'Unknown')
+        self.assertEqual(Artist.objects.get(spotify_id='popular_id').lookups, 10)
+        stats = get_artist_catalog_stats()
+        self.assertEqual((stats['hits'], stats['misses']), (0, 0))
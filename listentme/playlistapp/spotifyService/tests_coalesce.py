@@ -0,0 +1,74 @@
+"""Tests for coalesce.py"""
+import threading
+from unittest.mock import MagicMock
+from django.core.cache import cache, caches
+from django.test import SimpleTestCase, override_settings
+from .coalesce import COALESCE_LOCK_CACHE_KEY, coalesce, coalesce_across_workers
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'coordination': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'coordination'},
+})
+class CoalesceTestCase(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        caches['coordination'].clear()
+        self.cache_key = 'test:coalesce'
+
+    def test_concurrent_calls_coalesced(self):
+        release = threading.Event()
+        calls = []
+
+        def slow_func():
+            calls.append(True)
+            release.wait(5)
+            return 'value'
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(coalesce(self.cache_key, slow_func)))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        threading.Timer(0.2, release.set).start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['value'] * 5)
+
+    def test_sequential_calls_not_coalesced(self):
+        func = MagicMock(return_value='value')
+        coalesce(self.cache_key, func)
+        coalesce(self.cache_key, func)
+        self.assertEqual(func.call_count, 2)
+
+    def test_exception_raised(self):
+        func = MagicMock(side_effect=ValueError)
+        with self.assertRaises(ValueError):
+            coalesce(self.cache_key, func)
+
+    def test_across_workers_waits_for_cached_result(self):
+        caches['coordination'].add(COALESCE_LOCK_CACHE_KEY.format(key=self.cache_key), True)
+        func = MagicMock(return_value='own_value')
+        timer = threading.Timer(0.2, lambda: cache.set(self.cache_key, 'value'))
+        timer.start()
+        self.assertEqual(coalesce_across_workers(self.cache_key, func, lock_timeout=5), 'value')
+        timer.join()
+        func.assert_not_called()
+
+    def test_across_workers_calls_func_when_lock_released(self):
+        lock_key = COALESCE_LOCK_CACHE_KEY.format(key=self.cache_key)
+        caches['coordination'].add(lock_key, True)
+        func = MagicMock(return_value='own_value')
+        timer = threading.Timer(0.2, lambda: caches['coordination'].delete(lock_key))
+        timer.start()
+        self.assertEqual(coalesce_across_workers(self.cache_key, func, lock_timeout=5), 'own_value')
+        timer.join()
+        func.assert_called_once()
+
+    def test_across_workers_lock_released(self):
+        func = MagicMock(return_value='value')
+        self.assertEqual(coalesce_across_workers(self.cache_key, func, lock_timeout=5), 'value')
+        self.assertIsNone(caches['coordination'].get(COALESCE_LOCK_CACHE_KEY.format(key=self.cache_key)))
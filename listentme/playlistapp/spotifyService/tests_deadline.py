@@ -0,0 +1,44 @@
+"""Tests for deadline.py"""
+from django.test import SimpleTestCase, override_settings
+from .deadline import (
+    SpotifyDeadlineExceeded,
+    deadline_budget,
+    spotify_budget,
+    get_remaining_budget,
+    get_request_timeout,
+)
+
+@override_settings(SPOTIFY_REQUEST_TIMEOUT=5)
+class DeadlineBudgetTestCase(SimpleTestCase):
+
+    def test_no_budget(self):
+        self.assertIsNone(get_remaining_budget())
+        self.assertEqual(get_request_timeout(), 5)
+
+    def test_request_timeout_limited_by_budget(self):
+        with deadline_budget(2):
+            self.assertLessEqual(get_request_timeout(), 2)
+        with deadline_budget(10):
+            self.assertEqual(get_request_timeout(), 5)
+        self.assertIsNone(get_remaining_budget())
+
+    def test_nested_budget_shortens_outer_one(self):
+        with deadline_budget(1):
+            with deadline_budget(10):
+                self.assertLessEqual(get_remaining_budget(), 1)
+            with deadline_budget(10, override=True):
+                self.assertGreater(get_remaining_budget(), 9)
+            self.assertLessEqual(get_remaining_budget(), 1)
+
+    def test_budget_exceeded(self):
+        with deadline_budget(0):
+            with self.assertRaises(SpotifyDeadlineExceeded):
+                get_request_timeout()
+
+    def test_spotify_budget_decorator(self):
+        @spotify_budget(20)
+        def view():
+            return get_remaining_budget()
+
+        with deadline_budget(1):
+            self.assertGreater(view(), 19)
@@ -0,0 +1,37 @@
+"""Tests for ordering.py"""
+from django.test import SimpleTestCase
+from .ordering import interleave, order_by_features, track_id_from_uri
+
+class OrderingTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.artists_tracks = [
+            ['spotify:track:a1', 'spotify:track:a2', 'spotify:track:a3'],
+            ['spotify:track:b1', 'spotify:track:b2'],
+        ]
+        self.features = {
+            'spotify:track:a1': {'tempo': 170, 'energy': 0.9},
+            'spotify:track:a2': {'tempo': 90, 'energy': 0.2},
+            'spotify:track:a3': {'tempo': 120, 'energy': 0.5},
+            'spotify:track:b1': {'tempo': 125, 'energy': 0.6},
+            'spotify:track:b2': {'tempo': 95, 'energy': 0.3},
+        }
+
+    def test_track_id_from_uri(self):
+        self.assertEqual(track_id_from_uri('spotify:track:a1'), 'a1')
+
+    def test_interleave(self):
+        self.assertEqual(interleave(self.artists_tracks), [
+            'spotify:track:a1', 'spotify:track:b1', 'spotify:track:a2', 'spotify:track:b2', 'spotify:track:a3',
+        ])
+
+    def test_order_by_features(self):
+        self.assertEqual(order_by_features(self.artists_tracks, self.features), [
+            'spotify:track:a2', 'spotify:track:b2', 'spotify:track:a3', 'spotify:track:b1', 'spotify:track:a1',
+        ])
+
+    def test_order_by_features_missing_features(self):
+        del self.features['spotify:track:a1']
+        ordered = order_by_features(self.artists_tracks, self.features)
+        self.assertEqual(ordered[-1], 'spotify:track:a1')
+        self.assertEqual(order_by_features(self.artists_tracks, {}), interleave(self.artists_tracks))
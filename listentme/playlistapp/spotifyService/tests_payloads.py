@@ -0,0 +1,95 @@
+"""Tests for payloads.py"""
+import json
+import pickle
+from unittest import skipIf
+from unittest.mock import patch, MagicMock
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+from requests import Response
+from .payloads import Artist, TrackRef, User, decode_json, orjson, project_catalog_response
+from .util import execute_spotify_catalog_request, get_catalog_cache_key
+
+SPOTIFY_ARTIST = {
+    'external_urls': {'spotify': 'https://open.spotify.com/artist/4Z8W4fKeB5YxbusRsdQVPb'},
+    'followers': {'href': None, 'total': 8129312},
+    'genres': ['alternative rock', 'art rock'],
+    'href': 'https://api.spotify.com/v1/artists/4Z8W4fKeB5YxbusRsdQVPb',
+    'id': '4Z8W4fKeB5YxbusRsdQVPb',
+    'images': [
+        {'height': 640, 'url': 'https://i.scdn.co/image/radiohead_640', 'width': 640},
+        {'height': 320, 'url': 'https://i.scdn.co/image/radiohead_320', 'width': 320},
+    ],
+    'name': 'Radiohead',
+    'popularity': 79,
+    'type': 'artist',
+    'uri': 'spotify:artist:4Z8W4fKeB5YxbusRsdQVPb',
+}
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class PayloadsTestCase(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.artist = Artist.from_spotify(SPOTIFY_ARTIST)
+
+    def test_artist_from_spotify(self):
+        self.assertEqual(self.artist, Artist(
+            name='Radiohead',
+            id='4Z8W4fKeB5YxbusRsdQVPb',
+            external_url='https://open.spotify.com/artist/4Z8W4fKeB5YxbusRsdQVPb',
+            image_url='https://i.scdn.co/image/radiohead_640',
+        ))
+
+    def test_read_like_dict(self):
+        self.assertEqual(self.artist['name'], 'Radiohead')
+        self.assertEqual(self.artist.get('popularity', 0), 0)
+        self.assertIn('image_url', self.artist)
+        self.assertEqual(dict(self.artist), self.artist.to_dict())
+        with self.assertRaises(KeyError):
+            self.artist['popularity']
+
+    def test_compact(self):
+        self.assertFalse(hasattr(self.artist, '__dict__'))
+        self.assertEqual(pickle.loads(pickle.dumps(self.artist)), self.artist)
+
+    def test_user_without_image(self):
+        user = User.from_spotify({'id': 'test_id', 'display_name': 'Test', 'external_urls': {}, 'images': []})
+        self.assertIsNone(user.image_url)
+        self.assertIsNone(user.external_url)
+
+    def test_track_ref(self):
+        track = TrackRef.from_spotify({
+            'uri': 'spotify:track:1', 'id': '1', 'album': {'name': 'OK Computer'}, 'artists': [SPOTIFY_ARTIST],
+        })
+        self.assertEqual(track.artists, (self.artist,))
+
+    def test_catalog_response_projected(self):
+        response = project_catalog_response('search/', {'artists': {'items': [SPOTIFY_ARTIST], 'total': 1}})
+        self.assertEqual(response, {'artists': {'items': [{
+            'external_urls': SPOTIFY_ARTIST['external_urls'],
+            'id': SPOTIFY_ARTIST['id'],
+            'images': [{'url': image['url']} for image in SPOTIFY_ARTIST['images']],
+            'name': 'Radiohead',
+        }]}})
+        error = {'error': {'status': 404, 'message': 'Not found'}}
+        self.assertEqual(project_catalog_response('search/', error), error)
+        self.assertEqual(project_catalog_response('markets', {'markets': ['PL']}), {'markets': ['PL']})
+
+    @patch('playlistapp.spotifyService.util.get_app_access_token', MagicMock(return_value='TestAppAccessToken'))
+    @patch('playlistapp.spotifyService.util.get')
+    def test_projected_response_cached(self, mock_get):
+        mock_get.return_value.json.return_value = {
+            'tracks': [{'uri': 'spotify:track:1', 'id': '1', 'popularity': 80, 'artists': [SPOTIFY_ARTIST]}],
+        }
+        endpoint = 'artists/4Z8W4fKeB5YxbusRsdQVPb/top-tracks?market=US'
+        execute_spotify_catalog_request(endpoint)
+        cached = cache.get(get_catalog_cache_key(endpoint))
+        self.assertEqual(set(cached['tracks'][0]), {'uri', 'id', 'artists'})
+        self.assertEqual(set(cached['tracks'][0]['artists'][0]), {'id', 'name', 'external_urls'})
+
+    @skipIf(orjson is None, 'orjson is not installed')
+    @override_settings(SPOTIFY_JSON_DECODER='orjson')
+    def test_orjson_decoder(self):
+        response = Response()
+        response._content = json.dumps({'artists': {'items': [SPOTIFY_ARTIST]}}).encode('utf-8')
+        self.assertEqual(decode_json(response)['artists']['items'][0]['name'], 'Radiohead')
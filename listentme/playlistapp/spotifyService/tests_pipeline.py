@@ -0,0 +1,49 @@
+"""Tests for pipeline.py"""
+import time
+from django.test import SimpleTestCase
+from .pipeline import Stage, run_pipeline
+
+class RunPipelineTestCase(SimpleTestCase):
+
+    def test_run_pipeline_passes_required_results(self):
+        stages = {
+            'add': Stage(lambda a, b: a + b, requires=['a', 'b']),
+            'a': Stage(lambda: 1),
+            'b': Stage(lambda: 2),
+            'double': Stage(lambda value: value * 2, requires=['add']),
+        }
+        results, timings = run_pipeline(stages)
+        self.assertEqual(results, {'a': 1, 'b': 2, 'add': 3, 'double': 6})
+        self.assertEqual(set(timings), {'a', 'b', 'add', 'double', 'total'})
+
+    def test_run_pipeline_runs_independent_stages_concurrently(self):
+        stages = {
+            'first': Stage(lambda: time.sleep(0.2)),
+            'second': Stage(lambda: time.sleep(0.2)),
+            'third': Stage(lambda: time.sleep(0.2)),
+        }
+        _, timings = run_pipeline(stages)
+        self.assertLess(timings['total'], 0.5)
+        self.assertGreaterEqual(timings['first'], 0.2)
+
+    def test_run_pipeline_stage_error(self):
+        def failing_stage():
+            raise KeyError('test')
+        stages = {
+            'failing': Stage(failing_stage),
+            'dependent': Stage(lambda value: value, requires=['failing']),
+        }
+        with self.assertRaises(KeyError):
+            run_pipeline(stages)
+
+    def test_run_pipeline_unknown_requirement(self):
+        with self.assertRaises(ValueError):
+            run_pipeline({'stage': Stage(lambda value: value, requires=['missing'])})
+
+    def test_run_pipeline_circular_requirements(self):
+        stages = {
+            'first': Stage(lambda value: value, requires=['second']),
+            'second': Stage(lambda value: value, requires=['first']),
+        }
+        with self.assertRaises(ValueError):
+            run_pipeline(stages)
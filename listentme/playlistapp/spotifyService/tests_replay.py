@@ -0,0 +1,80 @@
+"""Tests for replay.py"""
+import json
+import os
+import tempfile
+import time
+from datetime import datetime
+from requests import Response
+from unittest.mock import patch
+from django.core.cache import cache, caches
+from django.test import TransactionTestCase, override_settings
+from django.utils import timezone
+from .models import SpotifyToken
+from .replay import ReplayMissError, recording, replaying
+from .util import create_a_playlist, execute_spotify_api_request, search_spotify_artist
+
+CASSETTE = os.path.join(os.path.dirname(__file__), 'fixtures', 'replay', 'create_playlist.json')
+
+
+@override_settings(SPOTIFY_ARTIST_CATALOG=False)
+class ReplayTestCase(TransactionTestCase):
+    reset_sequences = True
+
+    def setUp(self):
+        cache.clear()
+        caches['coordination'].clear()
+        self.session_id = 'Valid_ID'
+        SpotifyToken.objects.create(
+            user = self.session_id,
+            refresh_token = 'TestRefreshToken',
+            access_token = 'TestAccessToken',
+            expires_in = datetime(2023, 3, 11, 16, 0, 0, microsecond=0, tzinfo=timezone.utc),
+            token_type = 'Bearer'
+        )
+
+    def test_create_a_playlist_replayed(self):
+        form_data = {
+            'name': 'Replayed playlist',
+            'description': 'French touch',
+            'public': True,
+            'artists': ['Daft Punk', 'Justice'],
+        }
+        with patch('playlistapp.spotifyService.util.post') as mock_post, \
+                patch('playlistapp.spotifyService.util.get') as mock_get, \
+                replaying(CASSETTE, latency_scale=0):
+            result = create_a_playlist(self.session_id, form_data)
+        self.assertEqual(result['playlist_id'], '37i9dQZF1DX0ReplayA')
+        mock_post.assert_not_called()
+        mock_get.assert_not_called()
+
+    def test_recorded_latency_scaled(self):
+        with replaying(CASSETTE, latency_scale=0.5):
+            started = time.monotonic()
+            artist = search_spotify_artist(self.session_id, 'Daft Punk')
+            elapsed = time.monotonic() - started
+        self.assertEqual(artist['id'], '4tZwfgrHOc3mvqYlEYSvVi')
+        # app token (0.1832s) and search (0.1421s) at half of the recorded latency
+        self.assertGreaterEqual(elapsed, 0.16)
+
+    def test_unrecorded_request(self):
+        with replaying(CASSETTE, latency_scale=0):
+            with self.assertRaises(ReplayMissError):
+                execute_spotify_api_request(self.session_id, 'me/playlists', request_method='GET')
+
+    @patch('playlistapp.spotifyService.util.get')
+    def test_recording_redacts_secrets(self, mock_get):
+        response = Response()
+        response.status_code = 200
+        response._content = json.dumps({'display_name': 'Test Listener', 'id': 'testlistener'}).encode()
+        mock_get.return_value = response
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'cassette.json')
+            with recording(path):
+                execute_spotify_api_request(self.session_id, 'me/', request_method='GET')
+            with open(path, encoding='utf-8') as cassette_file:
+                content = cassette_file.read()
+        self.assertNotIn('TestAccessToken', content)
+        interaction = json.loads(content)['interactions'][0]
+        self.assertEqual(interaction['method'], 'GET')
+        self.assertTrue(interaction['url'].endswith('me/'))
+        self.assertEqual(interaction['body']['id'], 'testlistener')
@@ -0,0 +1,70 @@
+"""Tests for stale.py"""
+import threading
+import time
+from unittest.mock import MagicMock
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+from .stale import get_or_revalidate
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class GetOrRevalidateTestCase(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.cache_key = 'test:stale'
+
+    def get(self, fetch, latency_threshold=0.5):
+        return get_or_revalidate(
+            self.cache_key,
+            fetch,
+            fresh_timeout=60,
+            stale_timeout=60,
+            latency_threshold=latency_threshold
+        )
+
+    def make_stale(self):
+        entry = cache.get(self.cache_key)
+        entry['fresh_until'] = time.time() - 1
+        cache.set(self.cache_key, entry)
+
+    def test_missing_value_fetched(self):
+        fetch = MagicMock(return_value='value')
+        self.assertEqual(self.get(fetch), 'value')
+        self.assertEqual(self.get(fetch), 'value')
+        fetch.assert_called_once()
+
+    def test_failed_fetch_not_cached(self):
+        fetch = MagicMock(return_value=None)
+        self.assertIsNone(self.get(fetch))
+        self.assertIsNone(self.get(fetch))
+        self.assertEqual(fetch.call_count, 2)
+
+    def test_stale_value_revalidated(self):
+        self.get(MagicMock(return_value='old_value'))
+        self.make_stale()
+        self.assertEqual(self.get(MagicMock(return_value='new_value')), 'new_value')
+        self.assertEqual(cache.get(self.cache_key)['value'], 'new_value')
+
+    def test_stale_value_served_when_fetch_fails(self):
+        self.get(MagicMock(return_value='old_value'))
+        self.make_stale()
+        self.assertEqual(self.get(MagicMock(return_value=None)), 'old_value')
+
+    def test_stale_value_served_when_fetch_is_slow(self):
+        self.get(MagicMock(return_value='old_value'))
+        self.make_stale()
+        release = threading.Event()
+
+        def slow_fetch():
+            release.wait(5)
+            return 'new_value'
+
+        started = time.monotonic()
+        self.assertEqual(self.get(slow_fetch, latency_threshold=0.1), 'old_value')
+        self.assertLess(time.monotonic() - started, 1)
+        release.set()
+        for _ in range(50):
+            if cache.get(self.cache_key)['value'] == 'new_value':
+                break
+            time.sleep(0.05)
+        self.assertEqual(cache.get(self.cache_key)['value'], 'new_value')
@@ -1,35 +1,55 @@
 """Tests for util.py"""
 import os
 import json
+import time
 import base64
 from datetime import datetime, timedelta
 from requests import Response
-from unittest.mock import patch, MagicMock, call
+from requests.exceptions import Timeout
+from unittest.mock import patch, MagicMock, call, ANY
 from PIL import Image
 import tempfile
+from django.core.cache import cache, caches
 from django.utils import timezone
 from django.test import TestCase, TransactionTestCase
+from .deadline import deadline_budget
 from .models import SpotifyToken
+from .payloads import Artist, User
 from .util import (
+    APP_TOKEN_CACHE_KEY,
+    APP_TOKEN_LOCK_CACHE_KEY,
     get_user_tokens,
     update_or_create_user_tokens,
     is_spotify_authenticated,
     refresh_spotify_token,
     delete_spotify_token,
     execute_spotify_api_request,
+    get_app_access_token,
+    execute_spotify_catalog_request,
     get_current_user,
+    delete_session_cache,
     add_custom_image_to_playlist,
     get_artists,
     get_artists_top_tracks_uris,
     add_tracks_to_playlist,
     create_a_playlist,
+    create_playlists_batch,
+    refresh_playlist,
+    get_audio_features,
+    expand_artists,
     get_current_users_playlists,
+    get_current_users_playlists_page,
+    prefetch_home_data,
+    get_prefetched_home_data,
+    SpotifyAPIError,
 )
 
 class BaseTestCase(TransactionTestCase):
     reset_sequences = True
 
     def setUp(self):
+        cache.clear()
+        caches['coordination'].clear()
         self.user_id = 'Valid_ID'
         self.token = SpotifyToken.objects.create(
             user = self.user_id,
@@ -98,6 +118,14 @@ class UpdateOrCreateUserTokenTestCase(BaseTestCase):
             delta=1
         )
 
+    def test_update_or_create_user_tokens_single_query(self):
+        with self.assertNumQueries(1):
+            update_or_create_user_tokens(self.user_id, 'UpdatedAccessToken', 'Bearer', 3600, 'UpdatedRefreshToken')
+        with self.assertNumQueries(1):
+            update_or_create_user_tokens('Non_Existing_ID', 'NewAccessToken', 'Bearer', 3600, 'NewRefreshToken')
+        self.assertEqual(SpotifyToken.objects.count(), 2)
+        self.assertEqual(SpotifyToken.objects.get(user=self.user_id).created_at, self.token.created_at)
+
 class RefreshSpotifyTokenTestCase(BaseTestCase):
 
     @patch('playlistapp.spotifyService.util.post')
@@ -130,7 +158,8 @@ class RefreshSpotifyTokenTestCase(BaseTestCase):
                 'refresh_token': refresh_token,
                 'client_id': 'test_client_id',
                 'client_secret': 'test_client_secret'
-            }
+            },
+            timeout=ANY
         )
         refreshed_token = SpotifyToken.objects.get(user=session_id)
         self.assertEqual(refreshed_token.access_token, access_token_response)
@@ -200,7 +229,8 @@ class ExecuteSpotifyApiRequestTestCase(BaseTestCase):
             data=self.data,
             params=self.params,
             headers = {'Content-Type': 'application/json',
-               'Authorization': 'Bearer ' + self.token.access_token}
+               'Authorization': 'Bearer ' + self.token.access_token},
+            timeout=ANY
         )
         self.assertIsInstance(response, dict)
         self.assertEqual(response['name'], 'test_name_response')
@@ -218,7 +248,8 @@ class ExecuteSpotifyApiRequestTestCase(BaseTestCase):
             data=self.data,
             params=self.params,
             headers = {'Content-Type': 'application/json',
-               'Authorization': 'Bearer ' + self.token.access_token}
+               'Authorization': 'Bearer ' + self.token.access_token},
+            timeout=ANY
         )
         self.assertIsInstance(response, dict)
         self.assertEqual(response['name'], 'test_name_response')
@@ -236,7 +267,8 @@ class ExecuteSpotifyApiRequestTestCase(BaseTestCase):
             data=self.data,
             params=self.params,
             headers = {'Content-Type': 'application/json',
-               'Authorization': 'Bearer ' + self.token.access_token}
+               'Authorization': 'Bearer ' + self.token.access_token},
+            timeout=ANY
         )
         self.assertIsInstance(response, dict)
         self.assertEqual(response['name'], 'test_name_response')
@@ -254,11 +286,130 @@ class ExecuteSpotifyApiRequestTestCase(BaseTestCase):
             data=self.data,
             params=self.params,
             headers = {'Content-Type': 'application/json',
-               'Authorization': 'Bearer ' + self.token.access_token}
+               'Authorization': 'Bearer ' + self.token.access_token},
+            timeout=ANY
         )
         self.assertIsInstance(response, dict)
         self.assertEqual(response['Error'], 'Issue with request')
 
+    @patch('playlistapp.spotifyService.util.get')
+    def test_execute_spotify_api_request_deadline_exceeded(self, mock_get):
+        with deadline_budget(0):
+            response = execute_spotify_api_request(self.user_id, 'test/get/endpoint', 'GET')
+        mock_get.assert_not_called()
+        self.assertEqual(response, {'Error': 'Deadline exceeded'})
+
+    @patch('playlistapp.spotifyService.util.get')
+    def test_execute_spotify_api_request_timeout(self, mock_get):
+        mock_get.side_effect = Timeout()
+        with deadline_budget(2):
+            response = execute_spotify_api_request(self.user_id, 'test/get/endpoint', 'GET')
+        self.assertLessEqual(mock_get.call_args.kwargs['timeout'], 2)
+        self.assertEqual(response, {'Error': 'Issue with request'})
+
+class GetAppAccessTokenTestCase(BaseTestCase):
+
+    @patch('playlistapp.spotifyService.util.post')
+    def test_get_app_access_token(self, mock_post):
+        os.environ['CLIENT_ID'] = 'test_client_id'
+        os.environ['CLIENT_SECRET'] = 'test_client_secret'
+        mock_post.return_value.json.return_value = {
+            'access_token': 'TestAppAccessToken',
+            'token_type': 'Bearer',
+            'expires_in': 3600
+        }
+        self.assertEqual(get_app_access_token(), 'TestAppAccessToken')
+        self.assertEqual(get_app_access_token(), 'TestAppAccessToken')
+        mock_post.assert_called_once_with(
+            'https://accounts.spotify.com/api/token',
+            data={
+                'grant_type': 'client_credentials',
+                'client_id': 'test_client_id',
+                'client_secret': 'test_client_secret'
+            },
+            timeout=ANY
+        )
+
+    @patch('playlistapp.spotifyService.util.post')
+    def test_get_app_access_token_invalid_client(self, mock_post):
+        mock_post.return_value.json.return_value = {'error': 'invalid_client'}
+        self.assertIsNone(get_app_access_token())
+        self.assertIsNone(get_app_access_token())
+        mock_post.assert_called_once()
+        self.assertIsNone(caches['coordination'].get(APP_TOKEN_LOCK_CACHE_KEY))
+
+    @patch('playlistapp.spotifyService.util.post')
+    def test_get_app_access_token_waiter_within_budget(self, mock_post):
+        caches['coordination'].add(APP_TOKEN_LOCK_CACHE_KEY, True)
+        started = time.monotonic()
+        with deadline_budget(0.3):
+            self.assertIsNone(get_app_access_token())
+        self.assertLess(time.monotonic() - started, 1)
+        mock_post.assert_not_called()
+        self.assertTrue(caches['coordination'].get(APP_TOKEN_LOCK_CACHE_KEY))
+
+    @patch('playlistapp.spotifyService.util.time.sleep')
+    @patch('playlistapp.spotifyService.util.post')
+    def test_get_app_access_token_waiter_gets_token(self, mock_post, mock_sleep):
+        caches['coordination'].add(APP_TOKEN_LOCK_CACHE_KEY, True)
+        mock_sleep.side_effect = lambda seconds: cache.set(APP_TOKEN_CACHE_KEY, 'TestAppAccessToken')
+        with deadline_budget(2):
+            self.assertEqual(get_app_access_token(), 'TestAppAccessToken')
+        mock_post.assert_not_called()
+        self.assertTrue(caches['coordination'].get(APP_TOKEN_LOCK_CACHE_KEY))
+
+class ExecuteSpotifyCatalogRequestTestCase(BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.endpoint = 'test/catalog/endpoint'
+        self.params = {'q': 'test_query'}
+        self.mock_response = MagicMock()
+        self.mock_response.json.return_value = {'name': 'test_name_response'}
+
+    @patch('playlistapp.spotifyService.util.get_app_access_token')
+    @patch('playlistapp.spotifyService.util.get')
+    def test_execute_spotify_catalog_request(self, mock_get, mock_get_app_access_token):
+        mock_get_app_access_token.return_value = 'TestAppAccessToken'
+        mock_get.return_value = self.mock_response
+        response = execute_spotify_catalog_request(self.endpoint, params=self.params)
+        cached_response = execute_spotify_catalog_request(self.endpoint, params=self.params)
+        mock_get.assert_called_once_with(
+            'https://api.spotify.com/v1/test/catalog/endpoint',
+            params=self.params,
+            headers={'Content-Type': 'application/json',
+                     'Authorization': 'Bearer TestAppAccessToken'},
+            timeout=ANY
+        )
+        self.assertEqual(response, {'name': 'test_name_response'})
+        self.assertEqual(cached_response, response)
+
+    @patch('playlistapp.spotifyService.util.get_app_access_token')
+    @patch('playlistapp.spotifyService.util.get')
+    def test_execute_spotify_catalog_request_error_not_cached(self, mock_get, mock_get_app_access_token):
+        mock_get_app_access_token.return_value = 'TestAppAccessToken'
+        mock_get.return_value.json.return_value = {'error': {'status': 401, 'message': 'Invalid access token'}}
+        cache.set('spotify:app_token', 'TestAppAccessToken')
+        execute_spotify_catalog_request(self.endpoint, params=self.params)
+        execute_spotify_catalog_request(self.endpoint, params=self.params)
+        self.assertEqual(mock_get.call_count, 2)
+        self.assertIsNone(cache.get('spotify:app_token'))
+
+    @patch('playlistapp.spotifyService.util.get_app_access_token')
+    @patch('playlistapp.spotifyService.util.execute_spotify_api_request')
+    def test_execute_spotify_catalog_request_user_token_fallback(self, mock_execute_spotify_api_request,
+                                                                 mock_get_app_access_token):
+        mock_get_app_access_token.return_value = None
+        mock_execute_spotify_api_request.return_value = {'name': 'test_name_response'}
+        response = execute_spotify_catalog_request(self.endpoint, params=self.params, session_id=self.user_id)
+        mock_execute_spotify_api_request.assert_called_once_with(
+            self.user_id,
+            self.endpoint,
+            request_method='GET',
+            params=self.params
+        )
+        self.assertEqual(response, {'name': 'test_name_response'})
+
 class GetCurrentUserTestCase(BaseTestCase):
     
     @patch('playlistapp.spotifyService.util.is_spotify_authenticated')
@@ -286,7 +437,7 @@ class GetCurrentUserTestCase(BaseTestCase):
             endpoint,
             request_method='GET'
         )
-        self.assertIsInstance(current_user, dict)
+        self.assertIsInstance(current_user, User)
         self.assertEqual(current_user['display_name'],'test_display_name_response')
         self.assertEqual(current_user['external_url'],'test_external_url_response')
         self.assertEqual(current_user['image_url'],'test_image_url_response')
@@ -313,27 +464,62 @@ class GetCurrentUserTestCase(BaseTestCase):
             endpoint,
             request_method='GET'
         )
-        self.assertIsInstance(current_user, dict)
+        self.assertIsInstance(current_user, User)
         self.assertEqual(current_user['display_name'],'test_display_name_response')
         self.assertEqual(current_user['external_url'],'test_external_url_response')
         self.assertEqual(current_user['id'],'id_response')
-        self.assertNotIn('image_url', current_user)
+        self.assertIsNone(current_user['image_url'])
 
     @patch('playlistapp.spotifyService.util.is_spotify_authenticated')
     @patch('playlistapp.spotifyService.util.get')
     def test_get_current_user_valid_user_get_request(self,mock_get,mock_is_spotify_authenticated):
         session_id = self.user_id
         mock_is_spotify_authenticated.return_value = True
+        mock_get.return_value.json.return_value = {
+            'display_name': 'test_display_name_response',
+            'external_urls': {'spotify': 'test_external_url_response'},
+            'images': [],
+            'id': 'id_response'
+        }
         current_user = get_current_user(session_id)
         mock_get.assert_called_once_with(
             'https://api.spotify.com/v1/me/',
             params=None,
             data=None,
             headers = {'Content-Type': 'application/json',
-                    'Authorization': 'Bearer ' + self.token.access_token}
+                    'Authorization': 'Bearer ' + self.token.access_token},
+            timeout=ANY
         )
+        self.assertEqual(current_user['id'],'id_response')
 
 
+    @patch('playlistapp.spotifyService.util.is_spotify_authenticated')
+    @patch('playlistapp.spotifyService.util.execute_spotify_api_request')
+    def test_get_current_user_cached(self, mock_execute_spotify_api_request, mock_is_spotify_authenticated):
+        session_id = self.user_id
+        mock_is_spotify_authenticated.return_value = True
+        mock_execute_spotify_api_request.return_value = {
+            'display_name': 'test_display_name_response',
+            'external_urls': {'spotify': 'test_external_url_response'},
+            'images': [],
+            'id': 'id_response'
+        }
+        current_user = get_current_user(session_id)
+        self.assertEqual(get_current_user(session_id), current_user)
+        mock_execute_spotify_api_request.assert_called_once()
+        mock_is_spotify_authenticated.assert_called_once()
+
+        delete_session_cache(session_id)
+        get_current_user(session_id)
+        self.assertEqual(mock_execute_spotify_api_request.call_count, 2)
+
+    @patch('playlistapp.spotifyService.util.is_spotify_authenticated')
+    @patch('playlistapp.spotifyService.util.execute_spotify_api_request')
+    def test_get_current_user_request_error(self, mock_execute_spotify_api_request, mock_is_spotify_authenticated):
+        mock_is_spotify_authenticated.return_value = True
+        mock_execute_spotify_api_request.return_value = {'Error': 'Deadline exceeded'}
+        self.assertIsNone(get_current_user(self.user_id))
+
 class AddCustomImageToPlaylistTestCase(BaseTestCase):
 
     @patch('playlistapp.spotifyService.util.put')
@@ -355,7 +541,8 @@ class AddCustomImageToPlaylistTestCase(BaseTestCase):
             expected_endpoint,
             params=None,
             data=expected_data,
-            headers=expected_headers
+            headers=expected_headers,
+            timeout=ANY
         )
 
 class GetArtistsTestCase(BaseTestCase):
@@ -389,29 +576,29 @@ class GetArtistsTestCase(BaseTestCase):
             }
         ]
         self.expected_result = [
-            {
-                'name': 'Artist1',
-                'id': '123',
-                'external_url': 'https://open.spotify.com/artist/123',
-                'image_url': 'https://example.com/image.jpg',
-            },
-            {
-                'name': 'Artist2',
-                'id': '456',
-                'external_url': 'https://open.spotify.com/artist/456',
-                'image_url': 'https://example.com/image2.jpg',
-            },
+            Artist(
+                name='Artist1',
+                id='123',
+                external_url='https://open.spotify.com/artist/123',
+                image_url='https://example.com/image.jpg',
+            ),
+            Artist(
+                name='Artist2',
+                id='456',
+                external_url='https://open.spotify.com/artist/456',
+                image_url='https://example.com/image2.jpg',
+            ),
         ]
 
-    @patch('playlistapp.spotifyService.util.execute_spotify_api_request')
-    def test_get_artists(self, mock_execute_spotify_api_request):
+    @patch('playlistapp.spotifyService.util.execute_spotify_catalog_request')
+    def test_get_artists(self, mock_execute_spotify_catalog_request):
         session_id = self.user_id
         expected_endpoint = 'search/'
         artists_form = ['test_artist_1','test_artist_2']
-        mock_execute_spotify_api_request.side_effect = self.mock_responses
+        mock_execute_spotify_catalog_request.side_effect = self.mock_responses
         artist_data = get_artists(session_id, artists_form)
         self.assertEqual(artist_data, self.expected_result)
-        mock_execute_spotify_api_request.assert_called()
+        mock_execute_spotify_catalog_request.assert_called()
         expected_calls = []
         for artist in artists_form:
             expected_params = {
@@ -420,19 +607,20 @@ class GetArtistsTestCase(BaseTestCase):
                 'limit': 1,
             }
             expected_calls.append(call(
-                session_id,
                 expected_endpoint,
-                request_method='GET',
-                params=expected_params
+                params=expected_params,
+                session_id=session_id
             ))
-        mock_execute_spotify_api_request.assert_has_calls(expected_calls)
+        mock_execute_spotify_catalog_request.assert_has_calls(expected_calls)
 
+    @patch('playlistapp.spotifyService.util.get_app_access_token')
     @patch('playlistapp.spotifyService.util.get')
-    def test_get_artists_get_request(self, mock_get):
+    def test_get_artists_get_request(self, mock_get, mock_get_app_access_token):
         session_id = self.user_id
+        mock_get_app_access_token.return_value = 'TestAppAccessToken'
         expected_endpoint = 'https://api.spotify.com/v1/search/'
         expected_headers = {'Content-Type': 'application/json',
-                'Authorization': 'Bearer ' + self.token.access_token}
+                'Authorization': 'Bearer TestAppAccessToken'}
         artists_form = ['test_artist_1','test_artist_2']
         mock_http_responses = []
         for response_dict in self.mock_responses:
@@ -456,68 +644,101 @@ class GetArtistsTestCase(BaseTestCase):
             expected_calls.append(call(
                 expected_endpoint,
                 params=expected_params,
-                data=None,
-                headers=expected_headers
+                headers=expected_headers,
+                timeout=ANY
             ))
         mock_get.assert_has_calls(expected_calls)
 
-    @patch('playlistapp.spotifyService.util.execute_spotify_api_request')
-    def test_get_artists_index_error(self, mock_execute_spotify_api_request):
+    @patch('playlistapp.spotifyService.util.get_app_access_token')
+    @patch('playlistapp.spotifyService.util.get')
+    def test_get_artists_cached(self, mock_get, mock_get_app_access_token):
+        session_id = self.user_id
+        mock_get_app_access_token.return_value = 'TestAppAccessToken'
+        mock_get.return_value.json.return_value = self.mock_responses[0]
+        get_artists(session_id, ['test_artist_1'])
+        artist_data = get_artists('Other_Session_ID', ['test_artist_1'])
+        mock_get.assert_called_once()
+        self.assertEqual(artist_data, self.expected_result[:1])
+
+    @patch('playlistapp.spotifyService.util.execute_spotify_catalog_request')
+    def test_get_artists_index_error(self, mock_execute_spotify_catalog_request):
         session_id = self.user_id
         artists_form = ['test_artist_1','test_artist_2']
         mock_response = {'artists': {'items': []}}
-        mock_execute_spotify_api_request.return_value = mock_response
+        mock_execute_spotify_catalog_request.return_value = mock_response
         expected_data = []
         artist_data = get_artists(session_id, artists_form)
-        mock_execute_spotify_api_request.assert_called()
+        mock_execute_spotify_catalog_request.assert_called()
         self.assertEqual(artist_data, expected_data)
 
 class GetArtistsTopTracksUrisTestCase(BaseTestCase):
 
-    @patch('playlistapp.spotifyService.util.execute_spotify_api_request')
-    def test_get_artists_top_tracks_uris(self,mock_execute_spotify_api_request):
+    @patch('playlistapp.spotifyService.util.execute_spotify_catalog_request')
+    def test_get_artists_top_tracks_uris(self,mock_execute_spotify_catalog_request):
         session_id = self.user_id
         artists_data = [{'name': 'Artist1','id': '123'}, {'name': 'Artist2','id': '456'}]
         mock_responses = [
             {'tracks': [{'uri': 'track:1:Artist1'}, {'uri': 'track:2:Artist1'}]},
             {'tracks': [{'uri': 'track:1:Artist2'}, {'uri': 'track:2:Artist2'}]}
         ]
-        mock_execute_spotify_api_request.side_effect = mock_responses
+        mock_execute_spotify_catalog_request.side_effect = mock_responses
         result = get_artists_top_tracks_uris(session_id, artists_data)
         expected_calls = []
         for artist in artists_data:
             artist_id = artist.get('id')
             expected_endpoint = f'artists/{artist_id}/top-tracks?market=US'
             expected_calls.append(call(
-                session_id,
                 expected_endpoint,
-                request_method='GET'
+                session_id=session_id,
+                on_fetch=ANY
             ))
-        mock_execute_spotify_api_request.assert_has_calls(expected_calls)
+        mock_execute_spotify_catalog_request.assert_has_calls(expected_calls)
         self.assertEqual(result, 'track:1:Artist1,track:2:Artist1,track:1:Artist2,track:2:Artist2')
 
-    @patch('playlistapp.spotifyService.util.execute_spotify_api_request')
-    def test_get_artists_top_tracks_uris_empty_list(self,mock_execute_spotify_api_request):
+    @patch('playlistapp.spotifyService.util.execute_spotify_catalog_request')
+    def test_get_artists_top_tracks_uris_empty_list(self,mock_execute_spotify_catalog_request):
         session_id = self.user_id
         artists_data = [{'name': 'Artist1','id': '123'}, {'name': 'Artist2','id': '456'}]
         mock_responses = [
             {'tracks': [{'uri': 'track:1:Artist1'}, {'uri': 'track:2:Artist1'}]},
             {'tracks': []}
         ]
-        mock_execute_spotify_api_request.side_effect = mock_responses
+        mock_execute_spotify_catalog_request.side_effect = mock_responses
         result = get_artists_top_tracks_uris(session_id, artists_data)
         expected_calls = []
         for artist in artists_data:
             artist_id = artist.get('id')
             expected_endpoint = f'artists/{artist_id}/top-tracks?market=US'
             expected_calls.append(call(
-                session_id,
                 expected_endpoint,
-                request_method='GET'
+                session_id=session_id,
+                on_fetch=ANY
             ))
-        mock_execute_spotify_api_request.assert_has_calls(expected_calls)
+        mock_execute_spotify_catalog_request.assert_has_calls(expected_calls)
         self.assertEqual(result, 'track:1:Artist1,track:2:Artist1')
 
+    @patch('playlistapp.spotifyService.util.get_artist_top_tracks_uris')
+    def test_get_artists_top_tracks_uris_seeds_above_limit(self, mock_get_artist_top_tracks_uris):
+        artists_data = [{'name': f'Artist{number}', 'id': str(number)} for number in range(3)]
+        mock_get_artist_top_tracks_uris.side_effect = lambda session_id, artist_id: [
+            f'track:{number}:Artist{artist_id}' for number in range(10)
+        ]
+        result = get_artists_top_tracks_uris(self.user_id, artists_data, limit=15, seeds=2)
+        self.assertEqual(len(result.split(',')), 20)
+        self.assertNotIn('Artist2', result)
+        self.assertEqual(mock_get_artist_top_tracks_uris.call_count, 2)
+
+    @patch('playlistapp.spotifyService.util.get_artist_top_tracks_uris')
+    def test_get_artists_top_tracks_uris_expansion_up_to_limit(self, mock_get_artist_top_tracks_uris):
+        artists_data = [{'name': f'Artist{number}', 'id': str(number)} for number in range(4)]
+        mock_get_artist_top_tracks_uris.side_effect = lambda session_id, artist_id: [
+            f'track:{number}:Artist{artist_id}' for number in range(10)
+        ]
+        result = get_artists_top_tracks_uris(self.user_id, artists_data, limit=15, seeds=1).split(',')
+        self.assertEqual(len(result), 15)
+        self.assertEqual(result[-1], 'track:4:Artist1')
+        self.assertEqual(mock_get_artist_top_tracks_uris.call_count, 2)
+
 class AddTracksToPlaylistTestCase(BaseTestCase):
 
     @patch('playlistapp.spotifyService.util.execute_spotify_api_request')
@@ -555,7 +776,8 @@ class AddTracksToPlaylistTestCase(BaseTestCase):
             expected_endpoint,
             params=expected_params,
             data=None,
-            headers=expected_headers
+            headers=expected_headers,
+            timeout=ANY
         )
 
 class CreateAPlayListTestCase(TestCase):
@@ -579,17 +801,194 @@ class CreateAPlayListTestCase(TestCase):
         }
         mock_get_current_user.return_value = {'id': 'test_user_id'}
         mock_execute_spotify_api_request.return_value = {'id': 'my_playlist_id'}
+        mock_get_artists.return_value = [{'name': 'artist1', 'id': '1'}, {'name': 'artist2', 'id': '2'}]
         mock_get_artists_top_tracks_uris.return_value = 'uri1,uri2'
-        create_a_playlist(session_id,form_data)
+        result = create_a_playlist(session_id,form_data)
+        self.assertEqual(result['playlist_id'], 'my_playlist_id')
+        self.assertEqual(
+            set(result['timings']),
+            {'playlist', 'seeds', 'artists', 'tracks', 'image', 'add_tracks', 'total'}
+        )
         mock_get_current_user.assert_called_with(session_id)
         mock_execute_spotify_api_request.assert_called_with(session_id, 'users/test_user_id/playlists', request_method='POST', 
                                           data='{"name": "My playlist", "description": "This is my playlist", "public": true}')
         mock_get_artists.assert_called_with(session_id, ['artist1', 'artist2'])
-        mock_get_artists_top_tracks_uris.assert_called_with(session_id, mock_get_artists.return_value)
+        mock_get_artists_top_tracks_uris.assert_called_with(session_id, mock_get_artists.return_value, limit=None, seeds=2)
         mock_add_custom_image_to_playlist.assert_called_with(session_id, 'my_playlist_id', 'https://example.com/myimage.png')
         mock_add_tracks_to_playlist.assert_called_with(session_id, 'my_playlist_id', 'uri1,uri2')
 
 
+class CreatePlaylistsBatchTestCase(TestCase):
+
+    @patch('playlistapp.spotifyService.util.get_current_user')
+    @patch('playlistapp.spotifyService.util.search_artist')
+    @patch('playlistapp.spotifyService.util.get_artist_top_tracks_uris')
+    @patch('playlistapp.spotifyService.util.create_empty_playlist')
+    @patch('playlistapp.spotifyService.util.add_tracks_to_playlist')
+    def test_create_playlists_batch(self, mock_add_tracks_to_playlist, mock_create_empty_playlist,
+                                    mock_get_artist_top_tracks_uris, mock_search_artist, mock_get_current_user):
+        session_id = 'my_session_id'
+        found_artists = {
+            'artist1': {'name': 'Artist1', 'id': '123'},
+            'artist2': {'name': 'Artist2', 'id': '456'},
+        }
+        mock_search_artist.side_effect = lambda session_id, artist: found_artists.get(artist.strip().lower())
+        mock_get_artist_top_tracks_uris.side_effect = lambda session_id, artist_id: [f'uri:{artist_id}']
+        def create_empty_playlist(session_id, playlist_data):
+            if playlist_data['name'] == 'Failing':
+                raise SpotifyAPIError('Playlist could not be created')
+            return f'id:{playlist_data["name"]}'
+        mock_create_empty_playlist.side_effect = create_empty_playlist
+        playlists_data = [
+            {'name': 'First', 'description': '', 'public': False, 'artists': ['Artist1', 'artist2']},
+            {'name': 'Second', 'description': '', 'public': True, 'artists': [' ARTIST1 ', 'Unknown']},
+            {'name': 'Failing', 'description': '', 'public': True, 'artists': ['artist1']},
+        ]
+        results = create_playlists_batch(session_id, playlists_data)
+
+        self.assertEqual(mock_search_artist.call_count, 3)
+        self.assertEqual(mock_get_artist_top_tracks_uris.call_count, 2)
+        self.assertEqual(results[0], {
+            'name': 'First',
+            'artists_found': ['Artist1', 'Artist2'],
+            'artists_not_found': [],
+            'status': 'created',
+            'playlist_id': 'id:First',
+            'tracks': 2,
+        })
+        self.assertEqual(results[1]['artists_not_found'], ['Unknown'])
+        self.assertEqual(results[1]['tracks'], 1)
+        self.assertEqual(results[2]['status'], 'failed')
+        self.assertEqual(results[2]['error'], 'Playlist could not be created')
+        mock_add_tracks_to_playlist.assert_has_calls([
+            call(session_id, 'id:First', 'uri:123,uri:456'),
+            call(session_id, 'id:Second', 'uri:123'),
+        ], any_order=True)
+        self.assertEqual(mock_add_tracks_to_playlist.call_count, 2)
+
+class RefreshPlaylistTestCase(BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.playlist_id = 'playlist_id'
+        self.current_uris = [f'uri:{number}' for number in range(200)]
+        self.top_tracks = {
+            '1': self.current_uris[:100],
+            '2': self.current_uris[100:195] + [f'uri:new:{number}' for number in range(5)],
+        }
+        self.snapshots = ['snapshot_1']
+
+    def execute_spotify_api_request(self, session_id, endpoint, request_method=None, data=None, params=None):
+        if request_method == 'GET' and endpoint == f'playlists/{self.playlist_id}':
+            return {'snapshot_id': self.snapshots[-1]}
+        if request_method == 'GET':
+            offset = params['offset']
+            items = [{'track': {'uri': uri}} for uri in self.current_uris[offset:offset + params['limit']]]
+            return {'items': items, 'next': 'next' if offset + params['limit'] < len(self.current_uris) else None}
+        self.snapshots.append(f'snapshot_{len(self.snapshots) + 1}')
+        return {'snapshot_id': self.snapshots[-1]}
+
+    @patch('playlistapp.spotifyService.util.search_artist')
+    @patch('playlistapp.spotifyService.util.get_artist_top_tracks_uris')
+    @patch('playlistapp.spotifyService.util.execute_spotify_api_request')
+    def test_refresh_playlist(self, mock_execute_spotify_api_request, mock_get_artist_top_tracks_uris,
+                              mock_search_artist):
+        mock_execute_spotify_api_request.side_effect = self.execute_spotify_api_request
+        mock_search_artist.side_effect = lambda session_id, artist: {'name': artist, 'id': artist}
+        mock_get_artist_top_tracks_uris.side_effect = lambda session_id, artist_id: self.top_tracks[artist_id]
+
+        result = refresh_playlist(self.user_id, self.playlist_id, ['1', '2'])
+
+        self.assertEqual(result['added'], 5)
+        self.assertEqual(result['removed'], 5)
+        self.assertEqual(result['snapshot_id'], 'snapshot_3')
+        self.assertEqual(mock_execute_spotify_api_request.call_count, 5)
+        delete_call, post_call = mock_execute_spotify_api_request.call_args_list[-2:]
+        self.assertEqual(delete_call.kwargs['request_method'], 'DELETE')
+        self.assertEqual(json.loads(delete_call.kwargs['data']), {
+            'tracks': [{'uri': f'uri:{number}'} for number in range(195, 200)],
+            'snapshot_id': 'snapshot_1',
+        })
+        self.assertEqual(post_call.kwargs['request_method'], 'POST')
+        self.assertEqual(json.loads(post_call.kwargs['data']), {
+            'uris': [f'uri:new:{number}' for number in range(5)],
+        })
+
+        mock_execute_spotify_api_request.reset_mock()
+        result = refresh_playlist(self.user_id, self.playlist_id, ['1', '2'])
+
+        self.assertEqual((result['added'], result['removed']), (0, 0))
+        mock_execute_spotify_api_request.assert_called_once()
+
+    @patch('playlistapp.spotifyService.util.search_artist')
+    @patch('playlistapp.spotifyService.util.execute_spotify_api_request')
+    def test_refresh_playlist_not_found(self, mock_execute_spotify_api_request, mock_search_artist):
+        mock_execute_spotify_api_request.return_value = {'error': {'status': 404, 'message': 'Not found'}}
+        mock_search_artist.return_value = None
+        with self.assertRaises(SpotifyAPIError):
+            refresh_playlist(self.user_id, self.playlist_id, ['1'])
+
+class GetAudioFeaturesTestCase(BaseTestCase):
+
+    @patch('playlistapp.spotifyService.util.execute_spotify_catalog_request')
+    def test_get_audio_features(self, mock_execute_spotify_catalog_request):
+        def audio_features_response(endpoint, params=None, session_id=None):
+            return {'audio_features': [
+                {'id': track_id, 'tempo': 120.0, 'energy': 0.5} if track_id != 'no_features' else None
+                for track_id in params['ids'].split(',')
+            ]}
+        mock_execute_spotify_catalog_request.side_effect = audio_features_response
+        tracks_ids = [str(number) for number in range(150)] + ['no_features']
+
+        features = get_audio_features(self.user_id, tracks_ids)
+
+        self.assertEqual(mock_execute_spotify_catalog_request.call_count, 2)
+        self.assertEqual(len(features), 150)
+        self.assertEqual(features['0'], {'tempo': 120.0, 'energy': 0.5})
+
+        mock_execute_spotify_catalog_request.reset_mock()
+        features = get_audio_features(self.user_id, ['0', '1', 'new'])
+
+        mock_execute_spotify_catalog_request.assert_called_once_with(
+            'audio-features', params={'ids': 'new'}, session_id=self.user_id
+        )
+        self.assertEqual(set(features), {'0', '1', 'new'})
+
+class ExpandArtistsTestCase(TestCase):
+
+    def setUp(self):
+        self.graph = {
+            'seed': ['a', 'b', 'c'],
+            'a': ['seed', 'd', 'e'],
+            'b': ['f', 'a'],
+            'c': ['g'],
+        }
+        self.seeds = [{'name': 'seed', 'id': 'seed'}]
+
+    def get_related_artists(self, session_id, artist_id):
+        return [{'name': related_id, 'id': related_id} for related_id in self.graph.get(artist_id, [])]
+
+    @patch('playlistapp.spotifyService.util.get_related_artists')
+    def test_expand_artists(self, mock_get_related_artists):
+        mock_get_related_artists.side_effect = self.get_related_artists
+        artists = expand_artists('session_id', self.seeds, target_tracks=55)
+        self.assertEqual([artist['id'] for artist in artists], ['seed', 'a', 'b', 'c', 'd', 'e'])
+        self.assertEqual(mock_get_related_artists.call_count, 4)
+
+    @patch('playlistapp.spotifyService.util.get_related_artists')
+    def test_expand_artists_enough_tracks(self, mock_get_related_artists):
+        artists = expand_artists('session_id', self.seeds, target_tracks=10)
+        self.assertEqual(artists, self.seeds)
+        mock_get_related_artists.assert_not_called()
+
+    @patch('playlistapp.spotifyService.util.get_related_artists')
+    def test_expand_artists_request_limit(self, mock_get_related_artists):
+        mock_get_related_artists.side_effect = self.get_related_artists
+        with self.settings(SPOTIFY_EXPANSION_MAX_REQUESTS=2):
+            artists = expand_artists('session_id', self.seeds, target_tracks=100)
+        self.assertEqual([artist['id'] for artist in artists], ['seed', 'a', 'b', 'c', 'd', 'e'])
+        self.assertEqual(mock_get_related_artists.call_count, 2)
+
 class GetCurrendUsersPlaylistTestCase(BaseTestCase):
 
     @patch('playlistapp.spotifyService.util.is_spotify_authenticated')
@@ -667,3 +1066,56 @@ class GetCurrendUsersPlaylistTestCase(BaseTestCase):
         self.assertEqual(current_users_playlists[0]['external_url'], 'https://open.spotify.com/playlist/123')
         self.assertEqual(current_users_playlists[0]['id'], '123')
         self.assertNotIn('image_url', current_users_playlists)
+
+class PrefetchHomeDataTestCase(BaseTestCase):
+
+    @patch('playlistapp.spotifyService.util.get_current_users_playlists')
+    @patch('playlistapp.spotifyService.util.get_current_user')
+    def test_prefetch_home_data(self, mock_get_current_user, mock_get_current_users_playlists):
+        session_id = self.user_id
+        mock_get_current_user.return_value = {'display_name': 'test_display_name', 'id': 'test_id'}
+        mock_get_current_users_playlists.return_value = [{'name': 'My Playlist', 'id': '123'}]
+        prefetch_home_data(session_id)
+        home_data = get_prefetched_home_data(session_id)
+        mock_get_current_user.assert_called_once_with(session_id)
+        mock_get_current_users_playlists.assert_called_once_with(session_id)
+        self.assertEqual(home_data, {
+            'current_user': {'display_name': 'test_display_name', 'id': 'test_id'},
+            'users_playlists': [{'name': 'My Playlist', 'id': '123'}],
+        })
+        self.assertIsNone(get_prefetched_home_data(session_id))
+
+    def test_get_prefetched_home_data_missing(self):
+        self.assertIsNone(get_prefetched_home_data(self.user_id))
+        self.assertIsNone(get_prefetched_home_data(None))
+
+class GetCurrentUsersPlaylistsPageTestCase(BaseTestCase):
+
+    @patch('playlistapp.spotifyService.util.is_spotify_authenticated')
+    @patch('playlistapp.spotifyService.util.execute_spotify_api_request')
+    def test_get_current_users_playlists_page(self, mock_execute_spotify_api_request, mock_is_spotify_authenticated):
+        session_id = self.user_id
+        mock_is_spotify_authenticated.return_value = True
+        mock_execute_spotify_api_request.return_value = {
+            'items': [{
+                'name': 'My Playlist',
+                'external_urls': {'spotify': 'https://open.spotify.com/playlist/123'},
+                'images': [],
+                'id': '123'
+            }],
+            'total': 21
+        }
+        users_playlists_page = get_current_users_playlists_page(session_id, limit=20, offset=20)
+        mock_execute_spotify_api_request.assert_called_once_with(
+            session_id,
+            'me/playlists',
+            request_method='GET',
+            params={'limit': 20, 'offset': 20}
+        )
+        self.assertEqual(users_playlists_page['total'], 21)
+        self.assertEqual(users_playlists_page['items'][0]['id'], '123')
+
+    @patch('playlistapp.spotifyService.util.is_spotify_authenticated')
+    def test_get_current_users_playlists_page_not_authenticated(self, mock_is_spotify_authenticated):
+        mock_is_spotify_authenticated.return_value = False
+        self.assertIsNone(get_current_users_playlists_page('Invalid_ID'))
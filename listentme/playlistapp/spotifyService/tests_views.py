@@ -1,7 +1,7 @@
 import os
 import json
 from requests import Response
-from unittest.mock import patch
+from unittest.mock import patch, ANY
 from django.test import TestCase, Client
 from django.urls import reverse
 from rest_framework import status
@@ -36,9 +36,10 @@ class AuthURLViewTestCase(BaseViewTestCase):
 
 class SpotifyCallbackTestCase(BaseViewTestCase):
 
+    @patch('playlistapp.spotifyService.views.prefetch_home_data')
     @patch('playlistapp.spotifyService.views.post')
     @patch('playlistapp.spotifyService.views.update_or_create_user_tokens')
-    def test_spotify_callback(self, mock_update_or_create_user_tokens, mock_post):
+    def test_spotify_callback(self, mock_update_or_create_user_tokens, mock_post, mock_prefetch_home_data):
         expected_code = 'expected_code'
         test_access_token = 'test_access_token'
         test_token_type = 'Bearer'
@@ -70,13 +71,16 @@ class SpotifyCallbackTestCase(BaseViewTestCase):
         'client_secret': 'example_client_secret',
         }
         self.assertRedirects(response, reverse('playlistapp:home'))
-        mock_post.assert_called_once_with('https://accounts.spotify.com/api/token', data=expected_data)
+        mock_post.assert_called_once_with('https://accounts.spotify.com/api/token', data=expected_data, timeout=ANY)
         mock_update_or_create_user_tokens.assert_called_once_with(test_session_key, test_access_token, test_token_type, test_expires_in, test_refresh_token)
+        mock_prefetch_home_data.assert_called_once_with(test_session_key)
 
+    @patch('playlistapp.spotifyService.views.prefetch_home_data')
     @patch('playlistapp.spotifyService.views.post')
     @patch('django.contrib.sessions.backends.db.SessionStore.create')
     @patch('playlistapp.spotifyService.views.update_or_create_user_tokens')
-    def test_spotify_callback_no_session_key(self, mock_update_or_create_user_tokens, mock_create, mock_post):
+    def test_spotify_callback_no_session_key(self, mock_update_or_create_user_tokens, mock_create, mock_post,
+                                             mock_prefetch_home_data):
         expected_code = 'expected_code'
         response = self.client.get(reverse('playlistapp:spotify_callback'), {
             'code': expected_code,
@@ -89,9 +93,11 @@ class SpotifyCallbackTestCase(BaseViewTestCase):
 
 class SpotifyLogoutTestCase(BaseViewTestCase):
 
+    @patch('playlistapp.spotifyService.views.delete_session_cache')
     @patch('playlistapp.spotifyService.views.delete_spotify_token')
-    def test_spotify_log_out(self, mock_del_token):
+    def test_spotify_log_out(self, mock_del_token, mock_delete_session_cache):
         test_session_key=self.client.session._session_key
         response = self.client.get(reverse('playlistapp:spotify_logout'))
         mock_del_token.assert_called_once_with(test_session_key)
+        mock_delete_session_cache.assert_called_once_with(test_session_key)
         self.assertRedirects(response, reverse('playlistapp:home'))
\ No newline at end of file
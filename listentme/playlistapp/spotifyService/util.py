@@ -1,15 +1,70 @@
 """Utils for Spotify Service"""
 import base64
+import hashlib
 import json
 import os
+import time
 from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.db import connection
 from django.utils import timezone
-from requests import post, put, get
+from requests import post, put, get, delete
+from requests.exceptions import RequestException
+from . import autocomplete, background, replay
+from .catalog import (
+    normalize_artist_name,
+    find_artist,
+    store_artist,
+    store_artists,
+    store_simplified_artists,
+    get_stale_artists_ids
+)
+from .coalesce import coalesce, coalesce_across_workers
+from .deadline import SpotifyDeadlineExceeded, get_remaining_budget, get_request_timeout
+from .latency import measure_latency
 from .models import SpotifyToken
+from .ordering import order_by_features, track_id_from_uri
+from .payloads import Artist, PlaylistSummary, TrackRef, User, decode_json, project_catalog_response
+from .pipeline import Stage, run_pipeline, run_concurrently
+from .stale import get_or_revalidate
 
 
 BASE_URL = os.environ.get('BASE_URL')
 
+APP_TOKEN_CACHE_KEY = 'spotify:app_token'
+APP_TOKEN_LOCK_CACHE_KEY = 'spotify:app_token:lock'
+APP_TOKEN_LOCK_TIMEOUT = 10
+APP_TOKEN_POLL_INTERVAL = 0.1
+APP_TOKEN_FAILED_CACHE_KEY = 'spotify:app_token:failed'
+# Seconds for which a failed refresh of the app token is not repeated
+APP_TOKEN_FAILURE_TIMEOUT = 5
+CATALOG_CACHE_KEY_PREFIX = 'spotify:catalog'
+RATE_LIMITED_UNTIL_CACHE_KEY = 'spotify:rate_limited_until'
+# Seconds to wait after Spotify rate limited the app without sending Retry-After
+DEFAULT_RETRY_AFTER = 5
+HOME_PREFETCH_CACHE_KEY = 'spotify:prefetch:{session_id}'
+CURRENT_USER_CACHE_KEY = 'spotify:current_user:{session_id}'
+USERS_PLAYLISTS_CACHE_KEY = 'spotify:playlists:{session_id}:{generation}:{limit}:{offset}'
+USERS_PLAYLISTS_GENERATION_CACHE_KEY = 'spotify:playlists:{session_id}:generation'
+PLAYLIST_TRACKS_CACHE_KEY = 'spotify:playlist:{playlist_id}:{snapshot_id}'
+# Maximum number of tracks Spotify API accepts in a single request
+PLAYLIST_TRACKS_BATCH_SIZE = 100
+# Maximum number of artists loaded by Spotify API with a single request
+ARTISTS_BATCH_SIZE = 50
+AUDIO_FEATURES_BATCH_SIZE = 100
+# Number of top tracks Spotify returns for an artist
+ARTIST_TOP_TRACKS_COUNT = 10
+AUDIO_FEATURES_CACHE_KEY = 'spotify:audio_features:{track_id}'
+
+# Prefetches started by this worker process, by session id
+_home_prefetches = {}
+
+
+class SpotifyAPIError(Exception):
+    """Raised when Spotify API request needed to finish an operation failed"""
+
+
 def get_user_tokens(session_id):
     """Load and return user token stored in database"""
     user_tokens = SpotifyToken.objects.filter(user=session_id)
@@ -18,27 +73,37 @@ def get_user_tokens(session_id):
     return None
 
 def update_or_create_user_tokens(session_id, access_token, token_type, expires_in, refresh_token):
-    """Update user token if exists or create new one and save it
+    """Update user token if exists or create new one with a single INSERT ... ON CONFLICT statement
     variables required by Spotify API: access_token, token_type, expires_in, refresh_token
     """
-    tokens = get_user_tokens(session_id)
-    expires_in = timezone.now() + timedelta(seconds=expires_in)
-
-    if tokens:
-        tokens.access_token = access_token
-        tokens.refresh_token = refresh_token
-        tokens.expires_in = expires_in
-        tokens.token_type = token_type
-        tokens.save(update_fields=['access_token', 'refresh_token', 'expires_in', 'token_type'])
-    else:
-        tokens = SpotifyToken(
-            user=session_id,
-            access_token=access_token,
-            refresh_token=refresh_token,
-            token_type=token_type,
-            expires_in=expires_in
-        )
-        tokens.save()
+    now = timezone.now()
+    opts = SpotifyToken._meta
+    quote_name = connection.ops.quote_name
+    columns = [
+        quote_name(opts.get_field(name).column)
+        for name in ('user', 'created_at', 'refresh_token', 'access_token', 'expires_in', 'token_type')
+    ]
+    updated_columns = [
+        quote_name(opts.get_field(name).column)
+        for name in ('access_token', 'refresh_token', 'expires_in', 'token_type')
+    ]
+    placeholders = ', '.join(['%s'] * len(columns))
+    sql = (
+        f'INSERT INTO {quote_name(opts.db_table)} ({", ".join(columns)}) '
+        f'VALUES ({placeholders}) '
+        f'ON CONFLICT ({columns[0]}) DO UPDATE SET '
+        + ', '.join(f'{column} = EXCLUDED.{column}' for column in updated_columns)
+    )
+    params = [
+        session_id,
+        connection.ops.adapt_datetimefield_value(now),
+        refresh_token,
+        access_token,
+        connection.ops.adapt_datetimefield_value(now + timedelta(seconds=expires_in)),
+        token_type,
+    ]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
 
 def is_spotify_authenticated(session_id):
     """Check if user is authenticated with Spotify"""
@@ -54,16 +119,21 @@ def refresh_spotify_token(session_id):
     """Refresh user token using Spotify API"""
     refresh_token = get_user_tokens(session_id).refresh_token
 
-    response = post('https://accounts.spotify.com/api/token', data={
-        'grant_type': 'refresh_token',
-        'refresh_token': refresh_token,
-        'client_id': os.environ.get('CLIENT_ID'),
-        'client_secret': os.environ.get('CLIENT_SECRET'),
-    }).json()
+    try:
+        response = decode_json(replay.send(post, 'POST', 'https://accounts.spotify.com/api/token', data={
+            'grant_type': 'refresh_token',
+            'refresh_token': refresh_token,
+            'client_id': os.environ.get('CLIENT_ID'),
+            'client_secret': os.environ.get('CLIENT_SECRET'),
+        }, timeout=get_request_timeout()))
+    except (SpotifyDeadlineExceeded, RequestException, ValueError):
+        return
 
     access_token = response.get('access_token')
     token_type = response.get('token_type')
     expires_in = response.get('expires_in')
+    if not access_token:
+        return
 
     update_or_create_user_tokens(session_id, access_token, token_type, expires_in, refresh_token)
 
@@ -81,54 +151,318 @@ def execute_spotify_api_request(
         data=None,
         params=None
     ):
-    """Process every Spotify API request"""
+    """Process every Spotify API request
+    Every request gets timeout from the deadline budget of the current request,
+    when the budget is used up the request is not sent at all
+    """
     tokens = get_user_tokens(session_id)
     headers = {'Content-Type': 'application/json',
                'Authorization': 'Bearer ' + tokens.access_token}
 
-    match request_method:
-        case 'POST':
-            response = post(BASE_URL + endpoint, params=params, data=data, headers=headers)
-        case 'PUT':
-            response = put(BASE_URL + endpoint, params=params, data=data, headers=headers)
-        case 'GET':
-            response = get(BASE_URL + endpoint, params=params, data=data, headers=headers)
+    try:
+        timeout = get_request_timeout()
+        match request_method:
+            case 'POST':
+                request_func = post
+            case 'PUT':
+                request_func = put
+            case 'GET':
+                request_func = get
+            case 'DELETE':
+                request_func = delete
+        with measure_latency():
+            response = replay.send(
+                request_func, request_method, BASE_URL + endpoint,
+                params=params, data=data, headers=headers, timeout=timeout
+            )
+    except SpotifyDeadlineExceeded:
+        return {'Error': 'Deadline exceeded'}
+    except RequestException:
+        return {'Error': 'Issue with request'}
 
     try:
-        return response.json()
+        return decode_json(response)
     except:
         return {'Error': 'Issue with request'}
 
+def is_spotify_error(response):
+    """Check if response of Spotify API request is an error"""
+    return 'Error' in response or 'error' in response
+
+def get_app_access_token():
+    """Return app-wide access token (Spotify Client Credentials Flow), None when it is not available
+    The token is shared by all workers through the cache and refreshed only by the one holding
+    the lock, others wait for it within their deadline budget. A failed refresh is not repeated
+    for APP_TOKEN_FAILURE_TIMEOUT seconds, catalog requests use user tokens meanwhile
+    """
+    access_token = cache.get(APP_TOKEN_CACHE_KEY)
+    if access_token:
+        return access_token
+    coordination = caches['coordination']
+    if coordination.get(APP_TOKEN_FAILED_CACHE_KEY):
+        return None
+    if coordination.add(APP_TOKEN_LOCK_CACHE_KEY, True, timeout=APP_TOKEN_LOCK_TIMEOUT):
+        try:
+            access_token = refresh_app_access_token()
+            if not access_token:
+                coordination.set(APP_TOKEN_FAILED_CACHE_KEY, True, timeout=APP_TOKEN_FAILURE_TIMEOUT)
+            return access_token
+        finally:
+            coordination.delete(APP_TOKEN_LOCK_CACHE_KEY)
+
+    wait = APP_TOKEN_LOCK_TIMEOUT
+    remaining = get_remaining_budget()
+    if remaining is not None:
+        wait = min(wait, remaining)
+    deadline = time.monotonic() + wait
+    while time.monotonic() < deadline:
+        time.sleep(APP_TOKEN_POLL_INTERVAL)
+        access_token = cache.get(APP_TOKEN_CACHE_KEY)
+        if access_token:
+            return access_token
+        if coordination.get(APP_TOKEN_FAILED_CACHE_KEY) or coordination.get(APP_TOKEN_LOCK_CACHE_KEY) is None:
+            break
+    return cache.get(APP_TOKEN_CACHE_KEY)
+
+def refresh_app_access_token():
+    """Request new app-wide access token from Spotify API and store it in the cache"""
+    try:
+        response = decode_json(replay.send(post, 'POST', 'https://accounts.spotify.com/api/token', data={
+            'grant_type': 'client_credentials',
+            'client_id': os.environ.get('CLIENT_ID'),
+            'client_secret': os.environ.get('CLIENT_SECRET'),
+        }, timeout=get_request_timeout()))
+    except (SpotifyDeadlineExceeded, RequestException, ValueError):
+        return None
+
+    access_token = response.get('access_token')
+    if not access_token:
+        return None
+    expires_in = response.get('expires_in', 3600) - settings.SPOTIFY_APP_TOKEN_EXPIRY_MARGIN
+    cache.set(APP_TOKEN_CACHE_KEY, access_token, timeout=max(expires_in, 1))
+    return access_token
+
+def get_catalog_cache_key(endpoint, params=None):
+    """Return cache key of catalog response, the same for every user"""
+    request_hash = hashlib.sha1(
+        json.dumps([endpoint, params], sort_keys=True).encode('utf-8')
+    ).hexdigest()
+    return f'{CATALOG_CACHE_KEY_PREFIX}:{request_hash}'
+
+def execute_spotify_catalog_request(endpoint, params=None, session_id=None, on_fetch=None):
+    """Process Spotify API request for catalog data which doesn't need user scope
+    (search, artists, tracks). Requests are authorized with app-wide token and
+    responses are cached globally. User token of session_id is used only
+    when app-wide token is not available.
+    Identical requests in flight at the same time share one upstream call
+    on_fetch: called with the successful response only when it was loaded from Spotify,
+    not when it was served from the cache or shared by another request
+    """
+    cache_key = get_catalog_cache_key(endpoint, params)
+    response = cache.get(cache_key)
+    if response is not None:
+        return response
+
+    def fetch():
+        if settings.SPOTIFY_COALESCE_ACROSS_WORKERS:
+            return coalesce_across_workers(
+                cache_key,
+                lambda: fetch_catalog_response(cache_key, endpoint, params, session_id, on_fetch),
+                lock_timeout=settings.SPOTIFY_REQUEST_TIMEOUT
+            )
+        return fetch_catalog_response(cache_key, endpoint, params, session_id, on_fetch)
+
+    try:
+        return coalesce(cache_key, fetch)
+    except SpotifyDeadlineExceeded:
+        return {'Error': 'Deadline exceeded'}
+
+def fetch_catalog_response(cache_key, endpoint, params=None, session_id=None, on_fetch=None):
+    """Request catalog data from Spotify API and cache successful response under cache_key,
+    on_fetch is called with the successful response
+    """
+    access_token = get_app_access_token()
+    if access_token:
+        headers = {'Content-Type': 'application/json',
+                   'Authorization': 'Bearer ' + access_token}
+        try:
+            timeout = get_request_timeout()
+            with measure_latency():
+                http_response = replay.send(
+                    get, 'GET', BASE_URL + endpoint, params=params, headers=headers, timeout=timeout
+                )
+            if http_response.status_code == 429:
+                set_rate_limited(http_response.headers.get('Retry-After'))
+            response = decode_json(http_response)
+        except SpotifyDeadlineExceeded:
+            response = {'Error': 'Deadline exceeded'}
+        except:
+            response = {'Error': 'Issue with request'}
+    elif session_id:
+        response = execute_spotify_api_request(session_id, endpoint, request_method='GET', params=params)
+    else:
+        return {'Error': 'Issue with request'}
+
+    error = response.get('error')
+    if isinstance(error, dict) and error.get('status') == 401:
+        cache.delete(APP_TOKEN_CACHE_KEY)
+    if not is_spotify_error(response):
+        response = project_catalog_response(endpoint, response)
+        cache.set(cache_key, response, timeout=settings.SPOTIFY_CATALOG_CACHE_TIMEOUT)
+        if on_fetch is not None:
+            on_fetch(response)
+    return response
+
+def set_rate_limited(retry_after):
+    """Remember for all workers that Spotify rate limited the app for retry_after seconds"""
+    try:
+        seconds = max(int(retry_after), 1)
+    except (TypeError, ValueError):
+        seconds = DEFAULT_RETRY_AFTER
+    caches['coordination'].set(RATE_LIMITED_UNTIL_CACHE_KEY, time.time() + seconds, timeout=seconds)
+
+def get_rate_limit_wait():
+    """Return seconds left until Spotify accepts catalog requests of the app again"""
+    rate_limited_until = caches['coordination'].get(RATE_LIMITED_UNTIL_CACHE_KEY)
+    if rate_limited_until is None:
+        return 0
+    return max(rate_limited_until - time.time(), 0)
+
 def get_current_user(session_id):
-    """Get data of user authenticated with Spotify"""
+    """Get data of user authenticated with Spotify
+    Profile is cached for the session, so me/ is requested only after logging in
+    or when the cached one expires. Expired profile is still served when Spotify
+    is slow or down, while the new one is loaded in background
+    """
+    if not session_id:
+        return None
+    return get_or_revalidate(
+        CURRENT_USER_CACHE_KEY.format(session_id=session_id),
+        lambda: fetch_current_user(session_id),
+        fresh_timeout=settings.SPOTIFY_PROFILE_CACHE_TIMEOUT,
+        stale_timeout=settings.SPOTIFY_STALE_TIMEOUT,
+        latency_threshold=settings.SPOTIFY_STALE_LATENCY_THRESHOLD
+    )
+
+def fetch_current_user(session_id):
+    """Request data of user authenticated with Spotify"""
     endpoint='me/'
     if not is_spotify_authenticated(session_id):
         return None
-    if is_spotify_authenticated(session_id):
-        response = execute_spotify_api_request(session_id, endpoint, request_method='GET')
-        try:
-            current_user = {
-                'display_name': response.get('display_name'),
-                'external_url': response.get('external_urls').get('spotify'),
-                'image_url': response.get('images')[0].get('url'),
-                'id': response.get('id'),
-            }
-        except IndexError:
-            current_user = {
-                'display_name': response.get('display_name'),
-                'external_url': response.get('external_urls').get('spotify'),
-                'id': response.get('id'),
-            }
-        return current_user
+    response = execute_spotify_api_request(session_id, endpoint, request_method='GET')
+    if is_spotify_error(response):
+        return None
+    return User.from_spotify(response)
+
+def delete_session_cache(session_id):
+    """Forget everything cached for the session, e.g. when the user logs out"""
+    cache.delete_many([
+        CURRENT_USER_CACHE_KEY.format(session_id=session_id),
+        HOME_PREFETCH_CACHE_KEY.format(session_id=session_id),
+    ])
+    forget_current_users_playlists(session_id)
 
 
 def create_a_playlist(session_id, form_data):
     """
     Creating a playlist in authenticated Spotify user account
-    according to preferences
+    according to preferences.
+    Independent steps run concurrently, so the whole creation takes
+    as long as its critical path: search artists -> top tracks -> add tracks
+    Returns id of the new playlist and timings of every step
+    """
+    img = form_data.get('img')
+    expand_to_tracks = form_data.get('expand_to_tracks')
+    stages = {
+        'playlist': Stage(lambda: create_empty_playlist(session_id, form_data)),
+        'seeds': Stage(lambda: get_artists(session_id, form_data.get('artists'))),
+        'artists': Stage(
+            lambda seeds: expand_artists(session_id, seeds, expand_to_tracks) if expand_to_tracks else seeds,
+            requires=['seeds']
+        ),
+        'tracks': Stage(
+            lambda seeds, artists_data: (
+                get_ordered_tracks_uris if form_data.get('order_tracks') else get_artists_top_tracks_uris
+            )(session_id, artists_data, limit=expand_to_tracks, seeds=len({artist['id'] for artist in seeds})),
+            requires=['seeds', 'artists']
+        ),
+        'image': Stage(
+            lambda playlist_id: add_custom_image_to_playlist(session_id, playlist_id, img),
+            requires=['playlist']
+        ),
+        'add_tracks': Stage(
+            lambda playlist_id, tracks_uris_str: add_tracks_to_playlist(session_id, playlist_id, tracks_uris_str),
+            requires=['playlist', 'tracks']
+        ),
+    }
+    results, timings = run_pipeline(stages)
+    forget_current_users_playlists(session_id)
+    if settings.SPOTIFY_ARTIST_CATALOG:
+        background.submit(refresh_stale_artists, [artist['id'] for artist in results['artists']], session_id)
+    return {
+        'playlist_id': results['playlist'],
+        'timings': timings,
+    }
+
+def create_playlists_batch(session_id, playlists_data):
+    """
+    Create many playlists in authenticated Spotify user account.
+    Every distinct artist of the whole batch is searched once
+    and top tracks of every found artist are loaded once.
+    Returns result of every playlist in order of playlists_data
     """
+    artists_names = {}
+    for playlist_data in playlists_data:
+        for artist in playlist_data.get('artists'):
+            artists_names.setdefault(normalize_artist_name(artist), artist)
+    found_artists = dict(zip(
+        artists_names,
+        run_concurrently(lambda artist: search_artist(session_id, artist), artists_names.values())
+    ))
+    artists_ids = list({artist['id']: None for artist in found_artists.values() if artist})
+    top_tracks_uris = dict(zip(
+        artists_ids,
+        run_concurrently(lambda artist_id: get_artist_top_tracks_uris(session_id, artist_id), artists_ids)
+    ))
+    get_current_user(session_id)
 
+    def create_batch_playlist(playlist_data):
+        artists = [found_artists[normalize_artist_name(artist)] for artist in playlist_data.get('artists')]
+        result = {
+            'name': playlist_data.get('name'),
+            'artists_found': [artist['name'] for artist in artists if artist],
+            'artists_not_found': [
+                name for name, artist in zip(playlist_data.get('artists'), artists) if not artist
+            ],
+        }
+        artists_tracks_uris = [top_tracks_uris[artist['id']] for artist in artists if artist]
+        if playlist_data.get('order_tracks'):
+            tracks_uris_list = order_tracks_uris(session_id, artists_tracks_uris)
+        else:
+            tracks_uris_list = list(dict.fromkeys(
+                uri for artist_tracks_uris in artists_tracks_uris for uri in artist_tracks_uris
+            ))
+        try:
+            playlist_id = create_empty_playlist(session_id, playlist_data)
+            if tracks_uris_list:
+                add_tracks_to_playlist(session_id, playlist_id, ','.join(tracks_uris_list))
+        except Exception as error:
+            result.update({'status': 'failed', 'error': str(error)})
+            return result
+        result.update({'status': 'created', 'playlist_id': playlist_id, 'tracks': len(tracks_uris_list)})
+        return result
+
+    results = run_concurrently(create_batch_playlist, playlists_data)
+    forget_current_users_playlists(session_id)
+    if settings.SPOTIFY_ARTIST_CATALOG:
+        background.submit(refresh_stale_artists, artists_ids, session_id)
+    return results
+
+def create_empty_playlist(session_id, form_data):
+    """Create a new playlist without tracks and return its id"""
     current_user = get_current_user(session_id)
+    if current_user is None:
+        raise SpotifyAPIError('Spotify profile unavailable')
     user_id = current_user.get('id')
     endpoint = f'users/{user_id}/playlists'
     new_playlist_data = json.dumps({
@@ -142,13 +476,9 @@ def create_a_playlist(session_id, form_data):
         request_method='POST',
         data=new_playlist_data
     )
-    new_palylist_id = new_playlist.get('id')
-    artists_form = form_data.get('artists')
-    img = form_data.get('img')
-    artists_data = get_artists(session_id, artists_form)
-    tracks_uris_str = get_artists_top_tracks_uris(session_id, artists_data)
-    add_custom_image_to_playlist(session_id, new_palylist_id, img)
-    add_tracks_to_playlist(session_id, new_palylist_id, tracks_uris_str)
+    if is_spotify_error(new_playlist) or not new_playlist.get('id'):
+        raise SpotifyAPIError('Playlist could not be created')
+    return new_playlist.get('id')
 
 def add_custom_image_to_playlist(session_id, playlist_id, img):
     endpoint = f'playlists/{playlist_id}/images'
@@ -157,39 +487,214 @@ def add_custom_image_to_playlist(session_id, playlist_id, img):
         execute_spotify_api_request(session_id, endpoint, request_method='PUT', data=img_data)
 
 def get_artists(session_id, artists_form):
-    """Search and return an Artist from Spotify"""
-    endpoint = 'search/'
+    """Search and return Artists from Spotify"""
     artists_data = []
     for artist in artists_form:
-        params = {
-            'q': artist,
-            'type': 'artist',
-            'limit': 1,
-        }
-        try:
-            response = execute_spotify_api_request(session_id, endpoint, request_method='GET', params=params).get('artists').get('items')[0]
-            artists_data.append({
-                'name': response.get('name'),
-                'id': response.get('id'),
-                'external_url': response.get('external_urls').get('spotify'),
-                'image_url': response.get('images')[0].get('url'),
-            })
-        except IndexError:
-            continue
+        artist_data = search_artist(session_id, artist)
+        if artist_data:
+            artists_data.append(artist_data)
     return artists_data
 
-def get_artists_top_tracks_uris(session_id, artists_data):
-    """Return top tracks of artists chosen in form"""
+def expand_artists(session_id, artists_data, target_tracks):
+    """Walk the related-artists graph breadth first from artists_data and return them
+    followed by related artists, until their top tracks are enough for target_tracks.
+    The walk is bounded: at most SPOTIFY_EXPANSION_MAX_DEPTH levels,
+    SPOTIFY_EXPANSION_RELATED_PER_ARTIST artists taken from each one,
+    SPOTIFY_EXPANSION_MAX_REQUESTS requests in total and the deadline budget of the request.
+    Related artists of every artist are cached like other catalog responses
+    """
+    needed_artists = -(-target_tracks // ARTIST_TOP_TRACKS_COUNT)
+    expanded = list({artist['id']: artist for artist in artists_data}.values())
+    seen = {artist['id'] for artist in expanded}
+    level = expanded
+    requests_left = settings.SPOTIFY_EXPANSION_MAX_REQUESTS
+    for _ in range(settings.SPOTIFY_EXPANSION_MAX_DEPTH):
+        if len(expanded) >= needed_artists or not level or requests_left <= 0:
+            break
+        remaining_budget = get_remaining_budget()
+        if remaining_budget is not None and remaining_budget < settings.SPOTIFY_REQUEST_TIMEOUT:
+            break
+        level = level[:requests_left]
+        requests_left -= len(level)
+        related = run_concurrently(lambda artist: get_related_artists(session_id, artist['id']), level)
+        next_level = []
+        for related_artists in related:
+            for artist in related_artists[:settings.SPOTIFY_EXPANSION_RELATED_PER_ARTIST]:
+                if artist['id'] not in seen:
+                    seen.add(artist['id'])
+                    next_level.append(artist)
+        expanded.extend(next_level[:needed_artists - len(expanded)])
+        level = next_level
+    return expanded
+
+def get_related_artists(session_id, artist_id):
+    """Return Artists related to the artist, the most similar first"""
+    response = execute_spotify_catalog_request(f'artists/{artist_id}/related-artists', session_id=session_id)
+    if is_spotify_error(response):
+        return []
+    return [get_artist_data(artist) for artist in response.get('artists', []) if artist.get('id')]
+
+def search_artist(session_id, artist, record=True):
+    """Return an Artist from the local catalog or search it in Spotify,
+    None if nothing was found
+    record: count the lookup in the catalog stats and popularity of artists,
+    False for lookups not made by users (e.g. warming caches)
+    """
+    if not settings.SPOTIFY_ARTIST_CATALOG:
+        return search_spotify_artist(session_id, artist)
+    artist_data = find_artist(artist, record=record)
+    if artist_data is None:
+        artist_data = search_spotify_artist(session_id, artist)
+        if artist_data is not None:
+            store_artist(artist_data, query=artist)
+    if artist_data is not None and record:
+        autocomplete.remember_artist(artist_data)
+    return artist_data
+
+def search_spotify_artist(session_id, artist):
+    """Search and return an Artist from Spotify or None if nothing was found"""
+    endpoint = 'search/'
+    params = {
+        'q': artist,
+        'type': 'artist',
+        'limit': 1,
+    }
+    response = execute_spotify_catalog_request(endpoint, params=params, session_id=session_id)
+    if is_spotify_error(response):
+        return None
+    try:
+        response = response.get('artists').get('items')[0]
+    except IndexError:
+        return None
+    return get_artist_data(response)
+
+def get_artist_data(artist):
+    """Return Artist from artist object of Spotify API"""
+    return Artist.from_spotify(artist)
+
+def hydrate_artists(artists_ids, session_id=None):
+    """Load names and images of artists from Spotify with one request per
+    ARTISTS_BATCH_SIZE artists and store them in the catalog
+    Returns loaded Artists by id
+    """
+    artists_ids = list(dict.fromkeys(artists_ids))
+    batches = [
+        artists_ids[start:start + ARTISTS_BATCH_SIZE]
+        for start in range(0, len(artists_ids), ARTISTS_BATCH_SIZE)
+    ]
+    responses = run_concurrently(
+        lambda batch: execute_spotify_catalog_request(
+            'artists', params={'ids': ','.join(batch)}, session_id=session_id
+        ),
+        batches
+    )
+    artists_data = [
+        get_artist_data(artist)
+        for response in responses if not is_spotify_error(response)
+        for artist in response.get('artists', []) if artist
+    ]
+    if artists_data:
+        store_artists(artists_data)
+    return {artist_data['id']: artist_data for artist_data in artists_data}
+
+def refresh_stale_artists(artists_ids=None, session_id=None, limit=None):
+    """Hydrate stored artists whose data is old or incomplete
+    artists_ids: refresh only these artists, all stale ones by default
+    """
+    return hydrate_artists(get_stale_artists_ids(artists_ids, limit=limit), session_id=session_id)
+
+def get_artists_top_tracks_uris(session_id, artists_data, limit=None, seeds=0):
+    """Return top tracks of artists chosen in form
+    limit and seeds: see get_expanded_tracks_uris
+    """
     tracks_uris_list = []
-    for artist in artists_data:
-        artist_id = artist.get('id')
-        endpoint = f'artists/{artist_id}/top-tracks?market=US'
-        response = execute_spotify_api_request(session_id, endpoint, request_method='GET').get('tracks')
-        for track in response:
-            tracks_uris_list.append(track.get('uri'))
+    for artist_tracks_uris in get_expanded_tracks_uris(session_id, artists_data, limit, seeds):
+        tracks_uris_list.extend(artist_tracks_uris)
     tracks_uris_str = ','.join(tracks_uris_list)
     return tracks_uris_str
 
+def get_ordered_tracks_uris(session_id, artists_data, limit=None, seeds=0):
+    """Return top tracks of artists chosen in form, interleaving artists
+    and following each other by similar tempo and energy
+    limit and seeds: see get_expanded_tracks_uris
+    """
+    return ','.join(order_tracks_uris(
+        session_id, get_expanded_tracks_uris(session_id, artists_data, limit, seeds)
+    ))
+
+def get_expanded_tracks_uris(session_id, artists_data, limit=None, seeds=0):
+    """Return top tracks of artists, one list of uris per artist
+    Tracks of the first `seeds` artists are all kept, tracks of the artists added by expansion
+    after them are taken only until there are limit tracks, the rest is not even requested
+    """
+    artists_tracks_uris = []
+    tracks_count = 0
+    for position, artist in enumerate(artists_data):
+        expansion = limit is not None and position >= seeds
+        if expansion and tracks_count >= limit:
+            break
+        tracks_uris = get_artist_top_tracks_uris(session_id, artist.get('id'))
+        if expansion:
+            tracks_uris = tracks_uris[:limit - tracks_count]
+        artists_tracks_uris.append(tracks_uris)
+        tracks_count += len(tracks_uris)
+    return artists_tracks_uris
+
+def order_tracks_uris(session_id, artists_tracks_uris):
+    """Order tracks (one list of uris per artist) by their audio features"""
+    tracks_uris = [uri for artist_tracks_uris in artists_tracks_uris for uri in artist_tracks_uris]
+    features = get_audio_features(session_id, [track_id_from_uri(uri) for uri in tracks_uris])
+    return order_by_features(artists_tracks_uris, {
+        uri: features.get(track_id_from_uri(uri)) for uri in tracks_uris
+    })
+
+def get_audio_features(session_id, tracks_ids):
+    """Return tempo and energy of tracks by track id, missing for tracks without features
+    Features are cached per track, the rest is requested in batches of AUDIO_FEATURES_BATCH_SIZE
+    """
+    tracks_ids = list(dict.fromkeys(tracks_ids))
+    cache_keys = {AUDIO_FEATURES_CACHE_KEY.format(track_id=track_id): track_id for track_id in tracks_ids}
+    features = {cache_keys[cache_key]: value for cache_key, value in cache.get_many(cache_keys).items()}
+    missing = [track_id for track_id in tracks_ids if track_id not in features]
+    batches = [
+        missing[start:start + AUDIO_FEATURES_BATCH_SIZE]
+        for start in range(0, len(missing), AUDIO_FEATURES_BATCH_SIZE)
+    ]
+    responses = run_concurrently(
+        lambda batch: execute_spotify_catalog_request(
+            'audio-features', params={'ids': ','.join(batch)}, session_id=session_id
+        ),
+        batches
+    )
+    loaded = {}
+    for response in responses:
+        if is_spotify_error(response):
+            continue
+        for track_features in response.get('audio_features', []):
+            if track_features and track_features.get('tempo') is not None:
+                loaded[track_features['id']] = {
+                    'tempo': track_features['tempo'],
+                    'energy': track_features.get('energy', 0),
+                }
+    cache.set_many(
+        {AUDIO_FEATURES_CACHE_KEY.format(track_id=track_id): value for track_id, value in loaded.items()},
+        timeout=settings.SPOTIFY_CATALOG_CACHE_TIMEOUT
+    )
+    features.update(loaded)
+    return features
+
+def get_artist_top_tracks_uris(session_id, artist_id):
+    """Return list of uris of the artist's top tracks"""
+    endpoint = f'artists/{artist_id}/top-tracks?market=US'
+    on_fetch = store_tracks_artists if settings.SPOTIFY_ARTIST_CATALOG else None
+    response = execute_spotify_catalog_request(endpoint, session_id=session_id, on_fetch=on_fetch)
+    return [track.get('uri') for track in response.get('tracks', [])]
+
+def store_tracks_artists(response):
+    """Store artists of tracks loaded from Spotify in the catalog"""
+    tracks = [TrackRef.from_spotify(track) for track in response.get('tracks', [])]
+    store_simplified_artists(artist for track in tracks for artist in track.artists)
+
 def add_tracks_to_playlist(session_id, playlist_id, tracks_uris_str):
     """Add tracks to playlist using tracks uris"""
     endpoint = f'playlists/{playlist_id}/tracks'
@@ -199,33 +704,229 @@ def add_tracks_to_playlist(session_id, playlist_id, tracks_uris_str):
     }
     execute_spotify_api_request(session_id, endpoint, request_method='POST', params=params)
 
+def refresh_playlist(session_id, playlist_id, artists):
+    """
+    Update existing playlist to contain top tracks of artists,
+    sending only tracks which changed instead of creating the playlist again.
+    Artists and their top tracks come from the catalog cache and contents of the playlist
+    are cached by its snapshot_id, so an unchanged playlist is loaded with one request.
+    Returns id and new snapshot_id of the playlist and numbers of added and removed tracks
+    """
+    stages = {
+        'tracks': Stage(lambda: get_artists_tracks_uris(session_id, artists)),
+        'current': Stage(lambda: get_playlist_tracks_uris(session_id, playlist_id)),
+    }
+    results, timings = run_pipeline(stages)
+    snapshot_id, current_uris = results['current']
+    desired_uris = results['tracks']
+
+    desired = set(desired_uris)
+    current = set(current_uris)
+    removed_uris = [uri for uri in dict.fromkeys(current_uris) if uri not in desired]
+    added_uris = [uri for uri in desired_uris if uri not in current]
+    if removed_uris:
+        snapshot_id = remove_tracks_from_playlist(session_id, playlist_id, removed_uris, snapshot_id)
+    if added_uris:
+        snapshot_id = add_tracks_uris_to_playlist(session_id, playlist_id, added_uris)
+    if removed_uris or added_uris:
+        cache.set(
+            PLAYLIST_TRACKS_CACHE_KEY.format(playlist_id=playlist_id, snapshot_id=snapshot_id),
+            [uri for uri in current_uris if uri in desired] + added_uris,
+            timeout=settings.SPOTIFY_PLAYLIST_TRACKS_CACHE_TIMEOUT
+        )
+        forget_current_users_playlists(session_id)
+    return {
+        'playlist_id': playlist_id,
+        'snapshot_id': snapshot_id,
+        'added': len(added_uris),
+        'removed': len(removed_uris),
+        'timings': timings,
+    }
+
+def get_artists_tracks_uris(session_id, artists):
+    """Return uris of top tracks of artists found by name, without duplicates"""
+    found_artists = run_concurrently(lambda artist: search_artist(session_id, artist), artists)
+    artists_ids = list(dict.fromkeys(artist['id'] for artist in found_artists if artist))
+    top_tracks_uris = run_concurrently(
+        lambda artist_id: get_artist_top_tracks_uris(session_id, artist_id),
+        artists_ids
+    )
+    return list(dict.fromkeys(uri for uris in top_tracks_uris for uri in uris))
+
+def get_playlist_tracks_uris(session_id, playlist_id):
+    """Return current snapshot_id of the playlist and uris of its tracks
+    Tracks are requested only when they aren't cached for the snapshot yet
+    """
+    response = execute_spotify_api_request(
+        session_id,
+        f'playlists/{playlist_id}',
+        request_method='GET',
+        params={'fields': 'snapshot_id'}
+    )
+    if is_spotify_error(response) or not response.get('snapshot_id'):
+        raise SpotifyAPIError('Playlist could not be loaded')
+    snapshot_id = response.get('snapshot_id')
+    cache_key = PLAYLIST_TRACKS_CACHE_KEY.format(playlist_id=playlist_id, snapshot_id=snapshot_id)
+    tracks_uris = cache.get(cache_key)
+    if tracks_uris is not None:
+        return snapshot_id, tracks_uris
+
+    tracks_uris = []
+    offset = 0
+    while True:
+        response = execute_spotify_api_request(
+            session_id,
+            f'playlists/{playlist_id}/tracks',
+            request_method='GET',
+            params={
+                'fields': 'items(track(uri)),next',
+                'limit': PLAYLIST_TRACKS_BATCH_SIZE,
+                'offset': offset,
+            }
+        )
+        if is_spotify_error(response):
+            raise SpotifyAPIError('Playlist tracks could not be loaded')
+        tracks_uris.extend(
+            item['track']['uri'] for item in response.get('items', []) if item.get('track')
+        )
+        if not response.get('next'):
+            break
+        offset += PLAYLIST_TRACKS_BATCH_SIZE
+    cache.set(cache_key, tracks_uris, timeout=settings.SPOTIFY_PLAYLIST_TRACKS_CACHE_TIMEOUT)
+    return snapshot_id, tracks_uris
+
+def remove_tracks_from_playlist(session_id, playlist_id, tracks_uris, snapshot_id):
+    """Remove every occurrence of tracks from the playlist, in batches accepted by Spotify API
+    Returns snapshot_id of the playlist after the last batch
+    """
+    endpoint = f'playlists/{playlist_id}/tracks'
+    for start in range(0, len(tracks_uris), PLAYLIST_TRACKS_BATCH_SIZE):
+        batch = tracks_uris[start:start + PLAYLIST_TRACKS_BATCH_SIZE]
+        response = execute_spotify_api_request(session_id, endpoint, request_method='DELETE', data=json.dumps({
+            'tracks': [{'uri': uri} for uri in batch],
+            'snapshot_id': snapshot_id,
+        }))
+        if is_spotify_error(response) or not response.get('snapshot_id'):
+            raise SpotifyAPIError('Tracks could not be removed from the playlist')
+        snapshot_id = response.get('snapshot_id')
+    return snapshot_id
+
+def add_tracks_uris_to_playlist(session_id, playlist_id, tracks_uris):
+    """Append tracks to the playlist, in batches accepted by Spotify API
+    Returns snapshot_id of the playlist after the last batch
+    """
+    endpoint = f'playlists/{playlist_id}/tracks'
+    snapshot_id = None
+    for start in range(0, len(tracks_uris), PLAYLIST_TRACKS_BATCH_SIZE):
+        response = execute_spotify_api_request(session_id, endpoint, request_method='POST', data=json.dumps({
+            'uris': tracks_uris[start:start + PLAYLIST_TRACKS_BATCH_SIZE],
+        }))
+        if is_spotify_error(response) or not response.get('snapshot_id'):
+            raise SpotifyAPIError('Tracks could not be added to the playlist')
+        snapshot_id = response.get('snapshot_id')
+    return snapshot_id
+
 def get_current_users_playlists(session_id):
     """Load all playlists of the currently logged user"""
+    users_playlists_page = get_current_users_playlists_page(session_id)
+    if users_playlists_page is None:
+        return None
+    return users_playlists_page['items']
+
+def get_current_users_playlists_page(session_id, limit=20, offset=0):
+    """Load a page of playlists of the currently logged user
+    Returns playlists of the page and total number of user's playlists.
+    Pages are cached like the profile in get_current_user
+    """
+    if not session_id:
+        return None
+    generation = caches['coordination'].get(USERS_PLAYLISTS_GENERATION_CACHE_KEY.format(session_id=session_id), 0)
+    return get_or_revalidate(
+        USERS_PLAYLISTS_CACHE_KEY.format(
+            session_id=session_id,
+            generation=generation,
+            limit=limit,
+            offset=offset
+        ),
+        lambda: fetch_current_users_playlists_page(session_id, limit, offset),
+        fresh_timeout=settings.SPOTIFY_PLAYLISTS_CACHE_TIMEOUT,
+        stale_timeout=settings.SPOTIFY_STALE_TIMEOUT,
+        latency_threshold=settings.SPOTIFY_STALE_LATENCY_THRESHOLD
+    )
+
+def fetch_current_users_playlists_page(session_id, limit, offset):
+    """Request a page of playlists of the currently logged user"""
     endpoint = 'me/playlists'
     params = {
-        'limit': 20
+        'limit': limit
     }
-    users_playlists = []
+    if offset:
+        params['offset'] = offset
     if is_spotify_authenticated(session_id):
         response = execute_spotify_api_request(
             session_id,
             endpoint,
             request_method='GET',
             params=params
-        ).get('items')
-        for playlist in response:
-            try:
-                users_playlists.append({
-                    'name': playlist.get('name'),
-                    'external_url': playlist.get('external_urls').get('spotify'),
-                    'image_url': playlist.get('images')[0].get('url'),
-                    'id': playlist.get('id'),
-                })
-            except IndexError:
-                users_playlists.append({
-                    'name': playlist.get('name'),
-                    'external_url': playlist.get('external_urls').get('spotify'),
-                    'id': playlist.get('id'),
-                })
-        return users_playlists
+        )
+        if is_spotify_error(response):
+            return None
+        users_playlists = [PlaylistSummary.from_spotify(playlist) for playlist in response.get('items')]
+        return {
+            'items': users_playlists,
+            'total': response.get('total', offset + len(users_playlists)),
+        }
     return None
+
+def forget_current_users_playlists(session_id):
+    """Make cached playlists of the session outdated, e.g. after creating a new one
+    The generation is kept in the coordination cache, culling it would bring outdated pages back
+    """
+    generations = caches['coordination']
+    cache_key = USERS_PLAYLISTS_GENERATION_CACHE_KEY.format(session_id=session_id)
+    generations.set(cache_key, generations.get(cache_key, 0) + 1, timeout=None)
+
+def prefetch_home_data(session_id):
+    """Start fetching data shown on the home page in background,
+    so it is already cached when the user lands on it after logging in
+    """
+    future = background.submit(_prefetch_home_data, session_id)
+    _home_prefetches[session_id] = future
+    future.add_done_callback(
+        lambda done: _home_prefetches.pop(session_id, None) if _home_prefetches.get(session_id) is done else None
+    )
+    return future
+
+def _prefetch_home_data(session_id):
+    """Fetch current user and their playlists concurrently and cache them"""
+    stages = {
+        'current_user': Stage(lambda: get_current_user(session_id)),
+        'users_playlists': Stage(lambda: get_current_users_playlists(session_id)),
+    }
+    home_data, _ = run_pipeline(stages)
+    cache.set(
+        HOME_PREFETCH_CACHE_KEY.format(session_id=session_id),
+        home_data,
+        timeout=settings.SPOTIFY_HOME_PREFETCH_TIMEOUT
+    )
+    return home_data
+
+def get_prefetched_home_data(session_id, wait=None):
+    """Return and forget home page data prefetched for the session or None.
+    Waits up to `wait` seconds for prefetch still running in this process
+    """
+    if not session_id:
+        return None
+    if wait is None:
+        wait = settings.SPOTIFY_HOME_PREFETCH_WAIT
+    future = _home_prefetches.get(session_id)
+    if future is not None:
+        try:
+            future.result(timeout=wait)
+        except Exception:
+            pass
+    cache_key = HOME_PREFETCH_CACHE_KEY.format(session_id=session_id)
+    home_data = cache.get(cache_key)
+    if home_data is not None:
+        cache.delete(cache_key)
+    return home_data
@@ -3,9 +3,13 @@ import os
 from django.shortcuts import redirect
 from rest_framework.views import APIView
 from requests import Request, post
+from requests.exceptions import RequestException
+from .deadline import SpotifyDeadlineExceeded, get_request_timeout
 from .util import (
     update_or_create_user_tokens,
-    delete_spotify_token
+    delete_spotify_token,
+    delete_session_cache,
+    prefetch_home_data
 )
 
 class AuthURL(APIView):
@@ -30,13 +34,16 @@ def spotify_callback(request, format=None):
     code = request.GET.get('code')
     error = request.GET.get('error')
 
-    response = post('https://accounts.spotify.com/api/token', data={
-        'grant_type': 'authorization_code',
-        'code': code,
-        'redirect_uri': os.environ.get('REDIRECT_URI'),
-        'client_id': os.environ.get('CLIENT_ID'),
-        'client_secret': os.environ.get('CLIENT_SECRET'),
-    }).json()
+    try:
+        response = post('https://accounts.spotify.com/api/token', data={
+            'grant_type': 'authorization_code',
+            'code': code,
+            'redirect_uri': os.environ.get('REDIRECT_URI'),
+            'client_id': os.environ.get('CLIENT_ID'),
+            'client_secret': os.environ.get('CLIENT_SECRET'),
+        }, timeout=get_request_timeout()).json()
+    except (SpotifyDeadlineExceeded, RequestException):
+        return redirect('playlistapp:home')
 
     access_token = response.get('access_token')
     token_type = response.get('token_type')
@@ -52,9 +59,12 @@ def spotify_callback(request, format=None):
         access_token, token_type,
         expires_in, refresh_token
     )
+    delete_session_cache(request.session.session_key)
+    prefetch_home_data(request.session.session_key)
     return redirect('playlistapp:home')
 
 def spotify_log_out(request, format=None):
     """Logout for the user"""
     delete_spotify_token(request.session.session_key)
+    delete_session_cache(request.session.session_key)
     return redirect('playlistapp:home')
@@ -0,0 +1,63 @@
+"""Storage of static files collected for the proxy
+
+collectstatic gives files names with hash of their content (style.6f1d2e3a9b4c.css),
+so the proxy can let browsers cache them forever, and writes gzip and brotli
+compressed copies next to them (style.6f1d2e3a9b4c.css.gz, .br) served by the proxy
+to browsers accepting them without compressing files on every request.
+"""
+import gzip
+import os
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Extensions of files worth compressing, images and woff fonts are compressed already
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.map', '.svg', '.txt', '.html', '.json', '.ttf', '.otf', '.eot', '.ico'}
+# Files smaller than this are sent faster as they are
+COMPRESS_MIN_SIZE = 256
+# Compressed copy is written only when it is smaller than this part of the file
+COMPRESS_MAX_RATIO = 0.95
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Manifest storage writing precompressed copies of collected files
+    Until collectstatic writes the manifest (development, tests) files keep their plain names
+    """
+
+    def stored_name(self, name):
+        if not self.hashed_files:
+            return name
+        return super().stored_name(name)
+
+    def post_process(self, paths, dry_run=False, **options):
+        compressible = set()
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            if hashed_name and not isinstance(processed, Exception):
+                compressible.update((name, hashed_name))
+            yield name, hashed_name, processed
+        if dry_run:
+            return
+        for name in sorted(compressible):
+            if os.path.splitext(name)[1].lower() in COMPRESSIBLE_EXTENSIONS:
+                self.compress(name)
+
+    def compress(self, name):
+        """Write gzip and brotli (when the brotli package is installed) copies of the file"""
+        with self.open(name) as original:
+            content = original.read()
+        if len(content) < COMPRESS_MIN_SIZE:
+            return
+        self.save_compressed(name + '.gz', content, gzip.compress(content, compresslevel=9, mtime=0))
+        if brotli is not None:
+            self.save_compressed(name + '.br', content, brotli.compress(content))
+
+    def save_compressed(self, name, content, compressed):
+        if len(compressed) > len(content) * COMPRESS_MAX_RATIO:
+            return
+        if self.exists(name):
+            self.delete(name)
+        self._save(name, ContentFile(compressed))
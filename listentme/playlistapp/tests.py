@@ -1,3 +1,594 @@
-from django.test import TestCase
+"""Tests for playlistapp views"""
+import gzip
+import os
+import pstats
+import signal
+import tempfile
+import time
+import tracemalloc
+from unittest.mock import patch, MagicMock
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.http import HttpResponse
+from django.test import SimpleTestCase, TestCase, Client, override_settings
+from django.urls import reverse
+from .memory import MB, check_memory, get_workers_memory, reset_memory, start_tracing
+from .middleware import ADMISSION_SLOT_CACHE_KEY, ProfilingMiddleware
+from .spotifyService.autocomplete import reset_index
+from .storage import CompressedManifestStaticFilesStorage
+from .spotifyService.latency import record_latency, reset_latency
+from .spotifyService.models import Artist
+from .spotifyService.pipeline import run_concurrently
+from .spotifyService.util import SpotifyAPIError
 
-# Create your tests here.
+
+class BaseViewTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        caches['local'].clear()
+        caches['coordination'].clear()
+        reset_latency()
+        self.client = Client()
+        self.client.cookies[settings.SESSION_COOKIE_NAME] = 'test_session_key'
+        self.current_user = {
+            'display_name': 'test_display_name',
+            'external_url': 'https://open.spotify.com/user/test_id',
+            'id': 'test_id',
+        }
+        self.users_playlists = [{
+            'name': 'My Playlist',
+            'external_url': 'https://open.spotify.com/playlist/123',
+            'id': '123',
+        }]
+
+class HomeViewTestCase(BaseViewTestCase):
+
+    @patch('playlistapp.views.get_current_user')
+    @patch('playlistapp.views.get_prefetched_home_data')
+    def test_home_prefetched(self, mock_get_prefetched_home_data, mock_get_current_user):
+        mock_get_prefetched_home_data.return_value = {
+            'current_user': self.current_user,
+            'users_playlists': self.users_playlists,
+        }
+        response = self.client.get(reverse('playlistapp:home'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'My Playlist')
+        self.assertNotContains(response, reverse('playlistapp:api_playlists'))
+        mock_get_current_user.assert_not_called()
+
+    @patch('playlistapp.spotifyService.util.get_current_users_playlists')
+    @patch('playlistapp.views.get_current_user')
+    @patch('playlistapp.views.get_prefetched_home_data')
+    def test_home_not_prefetched(self, mock_get_prefetched_home_data, mock_get_current_user,
+                                 mock_get_current_users_playlists):
+        mock_get_prefetched_home_data.return_value = None
+        mock_get_current_user.return_value = self.current_user
+        response = self.client.get(reverse('playlistapp:home'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, reverse('playlistapp:api_playlists'))
+        mock_get_current_user.assert_called_once()
+        mock_get_current_users_playlists.assert_not_called()
+
+class AnonymousViewTestCase(BaseViewTestCase):
+
+    def setUp(self):
+        super().setUp()
+        del self.client.cookies[settings.SESSION_COOKIE_NAME]
+
+    @patch('playlistapp.spotifyService.util.get_user_tokens')
+    def test_pages_without_database(self, mock_get_user_tokens):
+        for url_name in ('home', 'create', 'view'):
+            with self.assertNumQueries(0):
+                response = self.client.get(reverse(f'playlistapp:{url_name}'))
+            self.assertEqual(response.status_code, 200)
+            self.assertContains(response, 'We Need Spotify!')
+            self.assertEqual(response['X-Accel-Expires'], str(settings.ANONYMOUS_PAGE_CACHE_TIMEOUT))
+        mock_get_user_tokens.assert_not_called()
+
+    @patch('playlistapp.views.get_current_user')
+    def test_page_cached(self, mock_get_current_user):
+        first_response = self.client.get(reverse('playlistapp:view'))
+        second_response = self.client.get(reverse('playlistapp:view'))
+        self.assertEqual(first_response.content, second_response.content)
+        mock_get_current_user.assert_called_once()
+
+    @patch('playlistapp.views.get_current_user')
+    def test_session_not_cached(self, mock_get_current_user):
+        mock_get_current_user.return_value = self.current_user
+        self.client.cookies[settings.SESSION_COOKIE_NAME] = 'test_session_key'
+        for _ in range(2):
+            response = self.client.get(reverse('playlistapp:view'))
+            self.assertContains(response, 'test_display_name')
+            self.assertNotIn('X-Accel-Expires', response)
+        self.assertEqual(mock_get_current_user.call_count, 2)
+
+class CreateViewTestCase(BaseViewTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.form_data = {
+            'name': 'My playlist',
+            'description': 'This is my playlist',
+            'form-TOTAL_FORMS': '1',
+            'form-INITIAL_FORMS': '0',
+            'form-0-artist': 'Artist1',
+        }
+
+    @patch('playlistapp.views.create_a_playlist')
+    @patch('playlistapp.views.get_current_user')
+    def test_create(self, mock_get_current_user, mock_create_a_playlist):
+        mock_get_current_user.return_value = self.current_user
+        mock_create_a_playlist.return_value = {'playlist_id': '123', 'timings': {}}
+        response = self.client.post(reverse('playlistapp:create'), self.form_data)
+        self.assertRedirects(response, reverse('playlistapp:create'), fetch_redirect_response=False)
+        mock_create_a_playlist.assert_called_once()
+
+    @patch('playlistapp.views.create_a_playlist')
+    @patch('playlistapp.views.get_current_user')
+    def test_create_double_submit(self, mock_get_current_user, mock_create_a_playlist):
+        mock_get_current_user.return_value = self.current_user
+        mock_create_a_playlist.return_value = {'playlist_id': '123', 'timings': {}}
+        form_data = dict(self.form_data, idempotency_key='test_key')
+        for _ in range(2):
+            response = self.client.post(reverse('playlistapp:create'), form_data)
+            self.assertRedirects(response, reverse('playlistapp:create'), fetch_redirect_response=False)
+        mock_create_a_playlist.assert_called_once()
+        response = self.client.post(reverse('playlistapp:create'), dict(form_data, idempotency_key='other_key'))
+        self.assertEqual(mock_create_a_playlist.call_count, 2)
+
+    @patch('playlistapp.views.create_a_playlist')
+    @patch('playlistapp.views.get_current_user')
+    def test_create_same_key_edited_form(self, mock_get_current_user, mock_create_a_playlist):
+        mock_get_current_user.return_value = self.current_user
+        mock_create_a_playlist.return_value = {'playlist_id': '123', 'timings': {}}
+        form_data = dict(self.form_data, idempotency_key='test_key')
+        self.client.post(reverse('playlistapp:create'), form_data)
+        self.client.post(reverse('playlistapp:create'), dict(form_data, name='Edited playlist'))
+        self.assertEqual(mock_create_a_playlist.call_count, 2)
+        self.assertEqual(mock_create_a_playlist.call_args.args[1]['name'], 'Edited playlist')
+
+    @patch('playlistapp.views.create_a_playlist')
+    @patch('playlistapp.views.get_current_user')
+    def test_create_double_submit_default_cache_culled(self, mock_get_current_user, mock_create_a_playlist):
+        mock_get_current_user.return_value = self.current_user
+        mock_create_a_playlist.return_value = {'playlist_id': '123', 'timings': {}}
+        form_data = dict(self.form_data, idempotency_key='test_key')
+        self.client.post(reverse('playlistapp:create'), form_data)
+        cache.clear()
+        self.client.post(reverse('playlistapp:create'), form_data)
+        mock_create_a_playlist.assert_called_once()
+
+    @patch('playlistapp.views.create_a_playlist')
+    @patch('playlistapp.views.get_current_user')
+    def test_create_retry_after_error(self, mock_get_current_user, mock_create_a_playlist):
+        mock_get_current_user.return_value = self.current_user
+        mock_create_a_playlist.side_effect = [
+            SpotifyAPIError('Playlist could not be created'),
+            {'playlist_id': '123', 'timings': {}},
+        ]
+        self.assertEqual(self.client.post(reverse('playlistapp:create'), self.form_data).status_code, 200)
+        self.assertEqual(self.client.post(reverse('playlistapp:create'), self.form_data).status_code, 302)
+        self.assertEqual(mock_create_a_playlist.call_count, 2)
+
+    @patch('playlistapp.views.create_a_playlist')
+    @patch('playlistapp.views.get_current_user')
+    def test_create_spotify_error(self, mock_get_current_user, mock_create_a_playlist):
+        mock_get_current_user.return_value = self.current_user
+        mock_create_a_playlist.side_effect = SpotifyAPIError('Playlist could not be created')
+        response = self.client.post(reverse('playlistapp:create'), self.form_data)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'the playlist could not be created')
+
+ADMISSION_CONTROL_LIMITS = {
+    'create': {'methods': ('POST',), 'max_in_flight': 1, 'queue_timeout': 0, 'max_spotify_latency': 3},
+}
+
+@override_settings(ADMISSION_CONTROL_LIMITS=ADMISSION_CONTROL_LIMITS, ADMISSION_CONTROL_RETRY_AFTER=10)
+class AdmissionControlTestCase(CreateViewTestCase):
+
+    def take_slot(self):
+        caches['coordination'].add(ADMISSION_SLOT_CACHE_KEY.format(url_name='create', number=0), True)
+
+    @patch('playlistapp.views.create_a_playlist')
+    @patch('playlistapp.views.get_current_user')
+    def test_slot_released(self, mock_get_current_user, mock_create_a_playlist):
+        mock_get_current_user.return_value = self.current_user
+        mock_create_a_playlist.return_value = {'playlist_id': '123', 'timings': {}}
+        for name in ('First', 'Second'):
+            response = self.client.post(reverse('playlistapp:create'), dict(self.form_data, name=name))
+            self.assertEqual(response.status_code, 302)
+        self.assertEqual(mock_create_a_playlist.call_count, 2)
+
+    @patch('playlistapp.views.create_a_playlist')
+    @patch('playlistapp.views.get_current_user')
+    def test_too_many_in_flight(self, mock_get_current_user, mock_create_a_playlist):
+        mock_get_current_user.return_value = self.current_user
+        self.take_slot()
+        response = self.client.post(reverse('playlistapp:create'), self.form_data)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '10')
+        mock_create_a_playlist.assert_not_called()
+
+    @patch('playlistapp.views.create_a_playlist')
+    @patch('playlistapp.views.get_current_user')
+    def test_spotify_slow(self, mock_get_current_user, mock_create_a_playlist):
+        mock_get_current_user.return_value = self.current_user
+        record_latency(5)
+        response = self.client.post(
+            reverse('playlistapp:create'), self.form_data, HTTP_ACCEPT='application/json'
+        )
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('Spotify is responding slowly', response.json()['detail'])
+        mock_create_a_playlist.assert_not_called()
+
+    @patch('playlistapp.views.get_current_user')
+    def test_cheap_request_not_limited(self, mock_get_current_user):
+        mock_get_current_user.return_value = self.current_user
+        self.take_slot()
+        record_latency(5)
+        response = self.client.get(reverse('playlistapp:create'))
+        self.assertEqual(response.status_code, 200)
+
+def create_profiled_playlist(playlist_data):
+    """Stage of the batch of playlists, run in threads of run_concurrently"""
+    time.sleep(0.05)
+    return {'name': playlist_data['name'], 'status': 'created'}
+
+@override_settings(PROFILING_TOKEN='test_profiling_token', PROFILING_SAMPLE_RATE=0, PROFILING_MAX_FILES=2)
+class ProfilingTestCase(BaseViewTestCase):
+
+    def setUp(self):
+        profiles_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(profiles_dir.cleanup)
+        self.profiles_dir = profiles_dir.name
+        settings_override = override_settings(PROFILING_DIR=self.profiles_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        super().setUp()
+        patcher = patch('playlistapp.views.get_current_user')
+        patcher.start().return_value = self.current_user
+        self.addCleanup(patcher.stop)
+
+    def get_create(self, **extra):
+        response = self.client.get(reverse('playlistapp:create'), **extra)
+        self.assertEqual(response.status_code, 200)
+        return sorted(os.listdir(self.profiles_dir))
+
+    @patch('playlistapp.api.is_spotify_authenticated')
+    @patch('playlistapp.api.create_playlists_batch')
+    def post_playlists_batch(self, mock_create_playlists_batch, mock_is_spotify_authenticated):
+        """Create playlists with stages run concurrently and return path of the profile"""
+        mock_is_spotify_authenticated.return_value = True
+        mock_create_playlists_batch.side_effect = lambda session_id, playlists_data: run_concurrently(
+            create_profiled_playlist, playlists_data
+        )
+        response = self.client.post(
+            reverse('playlistapp:api_playlists_batch'),
+            {'playlists': [{'name': 'First', 'artists': ['Artist1']}, {'name': 'Second', 'artists': ['Artist2']}]},
+            content_type='application/json',
+            HTTP_AUTHORIZATION='Session test_session_key',
+            HTTP_X_PROFILE_TOKEN='test_profiling_token'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 2)
+        profiles = os.listdir(self.profiles_dir)
+        self.assertEqual(len(profiles), 1)
+        return os.path.join(self.profiles_dir, profiles[0])
+
+    @override_settings(PROFILING_TOKEN='', PROFILING_SAMPLE_RATE=0)
+    def test_not_used_when_off(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            ProfilingMiddleware(lambda request: HttpResponse())
+
+    def test_profiled_with_token(self):
+        profiles = self.get_create(HTTP_X_PROFILE_TOKEN='test_profiling_token')
+        self.assertEqual(len(profiles), 1)
+        self.assertIn('playlistapp_create', profiles[0])
+        self.assertTrue(profiles[0].endswith('.prof'))
+        self.assertNotIn('test_session_key', profiles[0])
+
+    def test_not_profiled_with_wrong_token(self):
+        self.assertEqual(self.get_create(HTTP_X_PROFILE_TOKEN='wrong_token'), [])
+        self.assertEqual(self.get_create(), [])
+
+    @override_settings(PROFILING_SAMPLE_RATE=1)
+    def test_profiled_by_sampling(self):
+        self.assertEqual(len(self.get_create()), 1)
+
+    @override_settings(PROFILING_SAMPLE_RATE=1)
+    def test_only_newest_profiles_kept(self):
+        first_profile = self.get_create()[0]
+        self.get_create()
+        profiles = self.get_create()
+        self.assertEqual(len(profiles), 2)
+        self.assertNotIn(first_profile, profiles)
+
+    @override_settings(PROFILING_FORMAT='collapsed', PROFILING_SAMPLE_INTERVAL=0.001)
+    def test_collapsed_stacks(self):
+        profiles = self.get_create(HTTP_X_PROFILE_TOKEN='test_profiling_token')
+        self.assertTrue(profiles[0].endswith('.collapsed'))
+        with open(os.path.join(self.profiles_dir, profiles[0]), encoding='utf-8') as profile_file:
+            for line in profile_file:
+                stack, count = line.rsplit(' ', 1)
+                self.assertTrue(int(count) > 0)
+
+    def test_stages_profiled(self):
+        stats = pstats.Stats(self.post_playlists_batch())
+        calls = {
+            function_name: stat[0] for (_, _, function_name), stat in stats.stats.items()
+        }
+        self.assertEqual(calls.get('create_profiled_playlist'), 2)
+
+    @override_settings(PROFILING_FORMAT='collapsed', PROFILING_SAMPLE_INTERVAL=0.001)
+    def test_stages_sampled(self):
+        with open(self.post_playlists_batch(), encoding='utf-8') as profile_file:
+            self.assertIn('create_profiled_playlist', profile_file.read())
+
+@override_settings(
+    MEMORY_CHECK_INTERVAL=1, MEMORY_GROWTH_ALARM=100, MEMORY_RECYCLE_GROWTH=0, MEMORY_TRACEMALLOC_FRAMES=0
+)
+class MemoryTestCase(BaseViewTestCase):
+
+    def setUp(self):
+        super().setUp()
+        reset_memory()
+        self.addCleanup(reset_memory)
+
+    @patch('playlistapp.views.get_current_user')
+    def test_report_published(self, mock_get_current_user):
+        mock_get_current_user.return_value = self.current_user
+        self.client.get(reverse('playlistapp:create'))
+        report = get_workers_memory()[os.getpid()]
+        self.assertGreater(report['rss'], 0)
+        self.assertEqual(report['growth'], 0)
+        self.assertEqual(report['requests'], 1)
+
+    @patch('playlistapp.memory.get_rss')
+    def test_growth_alarm(self, mock_get_rss):
+        mock_get_rss.side_effect = [100 * MB, 150 * MB, 250 * MB]
+        check_memory(100)
+        check_memory(200)
+        with self.assertLogs('playlistapp.memory', level='WARNING') as logs:
+            report = check_memory(300)
+        self.assertEqual(report['growth'], 150 * MB)
+        self.assertIn('grew by 150.0 MB', logs.output[0])
+
+    @override_settings(MEMORY_RECYCLE_GROWTH=200)
+    @patch('playlistapp.memory.os.kill')
+    @patch('playlistapp.memory.uwsgi', new_callable=MagicMock)
+    @patch('playlistapp.memory.get_rss')
+    def test_worker_recycled_once(self, mock_get_rss, mock_uwsgi, mock_kill):
+        mock_uwsgi.worker_id.return_value = 1
+        mock_get_rss.side_effect = [100 * MB, 250 * MB, 350 * MB, 400 * MB]
+        with self.assertLogs('playlistapp.memory', level='WARNING'):
+            for requests in (100, 200, 300, 400):
+                check_memory(requests)
+        mock_kill.assert_called_once_with(os.getpid(), signal.SIGHUP)
+
+    @override_settings(MEMORY_TRACEMALLOC_FRAMES=1)
+    def test_top_allocators(self):
+        start_tracing()
+        self.addCleanup(tracemalloc.stop)
+        check_memory(100)
+        allocated = [bytearray(1024) for _ in range(100)]
+        report = check_memory(200)
+        self.assertTrue(report['top_allocators'])
+        self.assertTrue(any(site['size_diff'] >= 100 * 1024 for site in report['top_growth']))
+        self.assertEqual(len(allocated), 100)
+
+    def test_report_view_for_staff_only(self):
+        check_memory(100)
+        response = self.client.get(reverse('playlistapp:api_memory'))
+        self.assertEqual(response.status_code, 403)
+        self.client.force_login(User.objects.create_user('staff', is_staff=True))
+        response = self.client.get(reverse('playlistapp:api_memory'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([report['pid'] for report in response.json()['workers']], [os.getpid()])
+
+class StaticFilesStorageTestCase(SimpleTestCase):
+
+    def setUp(self):
+        source_dir = tempfile.TemporaryDirectory()
+        static_root = tempfile.TemporaryDirectory()
+        self.addCleanup(source_dir.cleanup)
+        self.addCleanup(static_root.cleanup)
+        source = FileSystemStorage(location=source_dir.name)
+        source.save('app/style.css', ContentFile('.note { background-image: url("note.png"); }\n' * 50))
+        source.save('app/note.png', ContentFile(b'\x89PNG' * 100))
+        source.save('app/small.js', ContentFile('var a = 1;'))
+        self.storage = CompressedManifestStaticFilesStorage(location=static_root.name, base_url='/static/')
+        self.paths = {}
+        for path in ('app/style.css', 'app/note.png', 'app/small.js'):
+            with source.open(path) as source_file:
+                self.storage.save(path, source_file)
+            self.paths[path] = (source, path)
+
+    def test_plain_names_without_manifest(self):
+        self.assertEqual(self.storage.url('app/style.css'), '/static/app/style.css')
+
+    def test_hashed_and_compressed(self):
+        list(self.storage.post_process(self.paths))
+        storage = CompressedManifestStaticFilesStorage(location=self.storage.location, base_url='/static/')
+        hashed_name = storage.stored_name('app/style.css')
+        self.assertRegex(hashed_name, r'^app/style\.[0-9a-f]{12}\.css$')
+        self.assertTrue(storage.exists(hashed_name + '.gz'))
+        with storage.open(hashed_name + '.gz') as compressed:
+            self.assertIn(os.path.basename(storage.stored_name('app/note.png')).encode(), gzip.decompress(compressed.read()))
+        self.assertFalse(storage.exists(storage.stored_name('app/note.png') + '.gz'))
+        self.assertFalse(storage.exists(storage.stored_name('app/small.js') + '.gz'))
+
+class BaseApiTestCase(BaseViewTestCase):
+
+    def setUp(self):
+        super().setUp()
+        del self.client.cookies[settings.SESSION_COOKIE_NAME]
+        self.session_key = 'test_session_key'
+        self.auth_header = {'HTTP_AUTHORIZATION': f'Session {self.session_key}'}
+        patcher = patch('playlistapp.api.is_spotify_authenticated')
+        self.mock_is_spotify_authenticated = patcher.start()
+        self.mock_is_spotify_authenticated.side_effect = lambda session_key: session_key == self.session_key
+        self.addCleanup(patcher.stop)
+
+class CurrentUserApiTestCase(BaseApiTestCase):
+
+    def test_current_user_not_authenticated(self):
+        response = self.client.get(reverse('playlistapp:api_current_user'))
+        self.assertEqual(response.status_code, 401)
+
+    @patch('playlistapp.api.get_current_user')
+    def test_current_user(self, mock_get_current_user):
+        mock_get_current_user.return_value = self.current_user
+        response = self.client.get(reverse('playlistapp:api_current_user'), **self.auth_header)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), self.current_user)
+        self.assertIn('private', response['Cache-Control'])
+        self.assertIn('max-age=60', response['Cache-Control'])
+        mock_get_current_user.assert_called_once_with(self.session_key)
+
+        response = self.client.get(
+            reverse('playlistapp:api_current_user'),
+            HTTP_IF_NONE_MATCH=response['ETag'],
+            **self.auth_header
+        )
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+class UsersPlaylistsApiTestCase(BaseApiTestCase):
+
+    @patch('playlistapp.api.get_current_users_playlists_page')
+    def test_users_playlists(self, mock_get_current_users_playlists_page):
+        mock_get_current_users_playlists_page.return_value = {'items': self.users_playlists, 'total': 3}
+        response = self.client.get(
+            reverse('playlistapp:api_playlists'),
+            {'limit': 1, 'offset': 1},
+            **self.auth_header
+        )
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['count'], 3)
+        self.assertEqual(data['results'], self.users_playlists)
+        self.assertIn('offset=2', data['next'])
+        self.assertIsNotNone(data['previous'])
+        mock_get_current_users_playlists_page.assert_called_once_with(self.session_key, limit=1, offset=1)
+
+    @patch('playlistapp.api.get_current_users_playlists_page')
+    def test_users_playlists_max_limit(self, mock_get_current_users_playlists_page):
+        mock_get_current_users_playlists_page.return_value = {'items': [], 'total': 0}
+        self.client.get(reverse('playlistapp:api_playlists'), {'limit': 500}, **self.auth_header)
+        mock_get_current_users_playlists_page.assert_called_once_with(self.session_key, limit=50, offset=0)
+
+    @patch('playlistapp.api.get_current_users_playlists_page')
+    def test_users_playlists_unavailable(self, mock_get_current_users_playlists_page):
+        mock_get_current_users_playlists_page.return_value = None
+        response = self.client.get(reverse('playlistapp:api_playlists'), **self.auth_header)
+        self.assertEqual(response.status_code, 502)
+
+class PlaylistsBatchApiTestCase(BaseApiTestCase):
+
+    @patch('playlistapp.api.create_playlists_batch')
+    def test_playlists_batch(self, mock_create_playlists_batch):
+        mock_create_playlists_batch.return_value = [{'name': 'First', 'status': 'created'}]
+        response = self.client.post(
+            reverse('playlistapp:api_playlists_batch'),
+            {'playlists': [{'name': 'First', 'artists': ['Artist1']}]},
+            content_type='application/json',
+            **self.auth_header
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'results': [{'name': 'First', 'status': 'created'}]})
+        response = self.client.post(
+            reverse('playlistapp:api_playlists_batch'),
+            {'playlists': [{'name': 'First', 'artists': ['Artist1']}]},
+            content_type='application/json',
+            **self.auth_header
+        )
+        self.assertEqual(response.json(), {'results': [{'name': 'First', 'status': 'created'}]})
+        mock_create_playlists_batch.assert_called_once_with(
+            self.session_key,
+            [{'name': 'First', 'description': '', 'public': False, 'order_tracks': False, 'artists': ['Artist1']}]
+        )
+
+    @patch('playlistapp.api.create_playlists_batch')
+    def test_playlists_batch_same_key_other_payload(self, mock_create_playlists_batch):
+        mock_create_playlists_batch.return_value = [{'name': 'First', 'status': 'created'}]
+        for name in ('First', 'Second'):
+            response = self.client.post(
+                reverse('playlistapp:api_playlists_batch'),
+                {'playlists': [{'name': name, 'artists': ['Artist1']}]},
+                content_type='application/json',
+                HTTP_IDEMPOTENCY_KEY='test_key',
+                **self.auth_header
+            )
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(mock_create_playlists_batch.call_count, 2)
+        self.assertEqual(mock_create_playlists_batch.call_args.args[1][0]['name'], 'Second')
+
+    @patch('playlistapp.api.create_playlists_batch')
+    def test_playlists_batch_invalid(self, mock_create_playlists_batch):
+        response = self.client.post(
+            reverse('playlistapp:api_playlists_batch'),
+            {'playlists': [{'name': 'First', 'artists': []}]},
+            content_type='application/json',
+            **self.auth_header
+        )
+        self.assertEqual(response.status_code, 400)
+        mock_create_playlists_batch.assert_not_called()
+
+    def test_playlists_batch_not_authenticated(self):
+        response = self.client.post(
+            reverse('playlistapp:api_playlists_batch'),
+            {'playlists': []},
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 401)
+
+class PlaylistRefreshApiTestCase(BaseApiTestCase):
+
+    @patch('playlistapp.api.refresh_playlist')
+    def test_playlist_refresh(self, mock_refresh_playlist):
+        mock_refresh_playlist.return_value = {
+            'playlist_id': '123', 'snapshot_id': 'snapshot', 'added': 5, 'removed': 5, 'timings': {},
+        }
+        response = self.client.post(
+            reverse('playlistapp:api_playlist_refresh', args=['123']),
+            {'artists': ['Artist1']},
+            content_type='application/json',
+            **self.auth_header
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'playlist_id': '123', 'snapshot_id': 'snapshot', 'added': 5, 'removed': 5})
+        mock_refresh_playlist.assert_called_once_with(self.session_key, '123', ['Artist1'])
+
+    @patch('playlistapp.api.refresh_playlist')
+    def test_playlist_refresh_spotify_error(self, mock_refresh_playlist):
+        mock_refresh_playlist.side_effect = SpotifyAPIError('Playlist could not be loaded')
+        response = self.client.post(
+            reverse('playlistapp:api_playlist_refresh', args=['123']),
+            {'artists': ['Artist1']},
+            content_type='application/json',
+            **self.auth_header
+        )
+        self.assertEqual(response.status_code, 502)
+
+class ArtistAutocompleteApiTestCase(BaseViewTestCase):
+
+    def setUp(self):
+        super().setUp()
+        reset_index()
+        self.addCleanup(reset_index)
+        Artist.objects.create(spotify_id='1', name='Radiohead', normalized_name='radiohead')
+
+    def test_artist_autocomplete(self):
+        response = self.client.get(reverse('playlistapp:api_artist_autocomplete'), {'q': 'radio'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([artist['name'] for artist in response.json()['results']], ['Radiohead'])
+
+    def test_artist_autocomplete_empty_query(self):
+        response = self.client.get(reverse('playlistapp:api_artist_autocomplete'), {'limit': 'x'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'results': []})
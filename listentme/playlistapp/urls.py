@@ -1,6 +1,14 @@
 """playlistapp URLS"""
 from django.urls import path
 from .views import home, create, view
+from .api import (
+    ArtistAutocompleteView,
+    CurrentUserView,
+    MemoryReportView,
+    UsersPlaylistsView,
+    PlaylistsBatchView,
+    PlaylistRefreshView
+)
 from .spotifyService.views import AuthURL, spotify_callback, spotify_log_out
 
 app_name = 'playlistapp'
@@ -12,4 +20,10 @@ urlpatterns = [
     path('spotify/get-auth-url', AuthURL.as_view(), name='get_auth_url'),
     path('spotify/redirect', spotify_callback, name='spotify_callback'),
     path('logout', spotify_log_out, name='spotify_logout'),
+    path('api/artists/autocomplete', ArtistAutocompleteView.as_view(), name='api_artist_autocomplete'),
+    path('api/me', CurrentUserView.as_view(), name='api_current_user'),
+    path('api/memory', MemoryReportView.as_view(), name='api_memory'),
+    path('api/playlists', UsersPlaylistsView.as_view(), name='api_playlists'),
+    path('api/playlists/batch', PlaylistsBatchView.as_view(), name='api_playlists_batch'),
+    path('api/playlists/<str:playlist_id>/refresh', PlaylistRefreshView.as_view(), name='api_playlist_refresh'),
 ]
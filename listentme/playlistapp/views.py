@@ -1,20 +1,34 @@
 """Views for playlistapp apllication"""
+from django.conf import settings
 from django.shortcuts import render
 from django.forms import formset_factory
 from django.http import HttpResponseRedirect
-from .spotifyService.util import get_current_user, create_a_playlist, get_current_users_playlists
+from .spotifyService.util import (
+    get_current_user,
+    create_a_playlist,
+    get_prefetched_home_data,
+    SpotifyAPIError
+)
+from .spotifyService.deadline import spotify_budget
+from .anonymous import anonymous_page_cache
+from .idempotency import make_idempotency_key, run_once
 from .forms import NewPlaylistDataForm, ArtistForm
 
+@anonymous_page_cache
 def home(request):
-    """Homepage view"""
-    current_user = get_current_user(request.session.session_key)
-    users_playlists = get_current_users_playlists(request.session.session_key)
-    context = {
-        'current_user': current_user,
-        'users_playlists': users_playlists
-    }
+    """Homepage view
+    Playlists not prefetched after logging in are loaded by the page from the JSON API
+    """
+    context = get_prefetched_home_data(request.session.session_key)
+    if context is None:
+        context = {
+            'current_user': get_current_user(request.session.session_key),
+            'users_playlists': None
+        }
     return render(request, 'playlistapp/home.html', context)
 
+@anonymous_page_cache
+@spotify_budget(settings.SPOTIFY_CREATE_BUDGET)
 def create(request):
     """Create page View"""
     current_user = get_current_user(request.session.session_key)
@@ -28,10 +42,29 @@ def create(request):
                 'name': new_playlist_data_form.cleaned_data['name'],
                 'description': new_playlist_data_form.cleaned_data['description'],
                 'public': new_playlist_data_form.cleaned_data['public'],
+                'order_tracks': new_playlist_data_form.cleaned_data['order_tracks'],
+                'expand_to_tracks': new_playlist_data_form.cleaned_data['expand_to_tracks'],
                 'artists': [form.cleaned_data['artist'] for form in artist_formset]
             }
-            create_a_playlist(request.session.session_key, form_data)
-            return HttpResponseRedirect('/create')
+            img = form_data['img']
+            idempotency_key = make_idempotency_key(
+                request.session.session_key,
+                new_playlist_data_form.cleaned_data['idempotency_key'],
+                dict(form_data, img=(img.name, img.size) if img else None)
+            )
+            try:
+                run_once(
+                    idempotency_key,
+                    lambda: create_a_playlist(request.session.session_key, form_data),
+                    lock_timeout=settings.SPOTIFY_CREATE_BUDGET
+                )
+            except SpotifyAPIError:
+                new_playlist_data_form.add_error(
+                    None,
+                    'Spotify is not responding, the playlist could not be created. Try again later.'
+                )
+            else:
+                return HttpResponseRedirect('/create')
     else:
         new_playlist_data_form = NewPlaylistDataForm(request.POST)
         artist_formset = ArtistFormSet(request.POST or None)
@@ -42,6 +75,7 @@ def create(request):
     }
     return render(request, 'playlistapp/create.html', context)
 
+@anonymous_page_cache
 def view(request):
     """View page View"""
     current_user = get_current_user(request.session.session_key)
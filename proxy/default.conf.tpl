@@ -1,13 +1,35 @@
+uwsgi_cache_path /tmp/nginx-cache levels=1:2 keys_zone=microcache:10m max_size=100m inactive=10m use_temp_path=off;
+
 server {
     listen ${LISTEN_PORT};
 
     location /static {
-        alias /vol/static;
+        root /vol;
+
+        # Compressed copies written by collectstatic next to the files
+        # (.br ones are served by nginx built with ngx_brotli: brotli_static on;)
+        gzip_static on;
+        gzip_vary   on;
+
+        # Names of collected files contain hash of their content, so they never change
+        location ~ "^/static/static/.+\.[0-9a-f]{12}\.\w+$" {
+            add_header Cache-Control "public, max-age=31536000, immutable";
+        }
     }
 
     location / {
         uwsgi_pass              ${APP_HOST}:${APP_PORT};
         include                 /etc/nginx/uwsgi_params;
         client_max_body_size    10M;
+
+        # Microcache of pages rendered for visitors without a session,
+        # their lifetime is set by the X-Accel-Expires header of the app
+        uwsgi_cache             ${UWSGI_CACHE};
+        uwsgi_cache_key         $scheme$host$request_uri;
+        uwsgi_cache_methods     GET HEAD;
+        uwsgi_cache_bypass      $cookie_sessionid;
+        uwsgi_no_cache          $cookie_sessionid;
+        uwsgi_cache_lock        on;
+        uwsgi_cache_use_stale   updating error timeout;
     }
 }
\ No newline at end of file
@@ -10,5 +10,7 @@ whoami
 python manage.py wait_for_db
 python manage.py collectstatic --noinput
 python manage.py migrate
+python manage.py createcachetable
+python manage.py warm_artist_cache &
 
 uwsgi --socket :9000 --workers 4 --master --enable-threads --module listentme.wsgi
\ No newline at end of file